@@ -9,6 +9,9 @@ import psutil
 from discord.ext import commands, tasks
 from dotenv import load_dotenv
 
+from src.misc import get_data_manager
+from src.terminal import get_docker_service
+
 load_dotenv()
 
 intents = discord.Intents.default()
@@ -27,7 +30,7 @@ def get_status():
     system = platform.system()
     release = platform.release()
 
-    return [
+    statuses = [
         f"using {cpu_usage}% cpu",
         f"using {memory_usage}% memory",
         f"kernel: {system} {release}",
@@ -38,6 +41,12 @@ def get_status():
         "the very best discord server",
     ]
 
+    sample = get_docker_service().telemetry.latest()
+    if sample:
+        statuses.append(f"hzsh at {sample.cpu_percent:.1f}% cpu, {sample.pids} procs")
+
+    return statuses
+
 
 @tasks.loop(minutes=10)
 async def rotate_status():
@@ -61,6 +70,7 @@ async def load_cogs():
         "src.terminal.connect",
         "src.terminal.fetch",
         "src.terminal.utils",
+        "src.terminal.watchdog",
         "src.commands.guides",
         "src.commands.alias",
         "src.commands.help",
@@ -71,6 +81,7 @@ async def load_cogs():
         "src.moderation.commands",
         "src.moderation.tickets",
         "src.moderation.userinfo",
+        "src.misc.roles",
         "src.misc.limits",
         "src.misc.logging",
     ]
@@ -85,6 +96,7 @@ async def load_cogs():
 
 async def main():
     async with bot:
+        get_data_manager().start()
         await load_cogs()
         rotate_status.start()
 
@@ -93,7 +105,10 @@ async def main():
             logging.error("DISCORD_TOKEN not found")
             exit(1)
 
-        await bot.start(token)
+        try:
+            await bot.start(token)
+        finally:
+            get_data_manager().stop()
 
 
 if __name__ == "__main__":
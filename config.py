@@ -6,6 +6,15 @@ NEO_POLITA = 1395939916189405325
 SHELL_ACCESS_ROLE = "> connected..."
 ACHIEVEMENTS_CHANNEL = 1429897092226351244
 
+HZSH_DAEMON_SOCKET = "data/hzshd.sock"
+HZSH_AUTO_RESTART = False
+HZSH_PER_USER_CONTAINERS = False
+HZSH_MAX_CONTAINERS = 8
+HZSH_BACKUP_HOURS = 6
+
+# "json", "sqlite" or "journal", see `python -m src.misc.kvstore import`
+DATA_ENGINE = "json"
+
 VERSION = "2.5.1"
 
 USERMOD_MAPPINGS = {
@@ -523,6 +532,11 @@ RARITY_XP = {
     "master": 100,
 }
 
+# scale achievement cookie rewards by how few members hold them, up to
+# RARITY_BONUS_MAX times the RARITY_XP value
+RARITY_BONUS = False
+RARITY_BONUS_MAX = 3
+
 ACHIEVEMENT_MILESTONES = {
     5: "$ navigating... [5]",
     10: "$ mastering... [10]",
@@ -0,0 +1,87 @@
+"""moderation tables
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "infractions",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("user_id", sa.BigInteger(), nullable=False),
+        sa.Column("moderator_id", sa.BigInteger(), nullable=False),
+        sa.Column("guild_id", sa.BigInteger(), nullable=False),
+        sa.Column("type", sa.String(length=20), nullable=False),
+        sa.Column("reason", sa.Text(), nullable=False),
+        sa.Column("duration", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("expires_at", sa.DateTime(), nullable=True),
+        sa.Column("active", sa.Boolean(), nullable=True),
+        sa.Column("message_id", sa.BigInteger(), nullable=True),
+        sa.Column("dm_sent", sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_infractions_user_id", "infractions", ["user_id"])
+
+    op.create_table(
+        "tickets",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("channel_id", sa.BigInteger(), nullable=False),
+        sa.Column("guild_id", sa.BigInteger(), nullable=False),
+        sa.Column("creator_id", sa.BigInteger(), nullable=False),
+        sa.Column("name", sa.String(length=100), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("closed_at", sa.DateTime(), nullable=True),
+        sa.Column("archived", sa.Boolean(), nullable=True),
+        sa.Column("allowed_users", sa.Text(), nullable=True),
+        sa.Column("mods_removed", sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_tickets_channel_id", "tickets", ["channel_id"], unique=True)
+
+    op.create_table(
+        "mod_sessions",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("user_id", sa.BigInteger(), nullable=False),
+        sa.Column("guild_id", sa.BigInteger(), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("expires_at", sa.DateTime(), nullable=True),
+        sa.Column("permanent", sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_mod_sessions_user_id", "mod_sessions", ["user_id"], unique=True
+    )
+
+    op.create_table(
+        "moderation_config",
+        sa.Column("guild_id", sa.BigInteger(), nullable=False),
+        sa.Column("log_channel_id", sa.BigInteger(), nullable=True),
+        sa.Column("mute_channel_id", sa.BigInteger(), nullable=True),
+        sa.Column("ticket_category_id", sa.BigInteger(), nullable=True),
+        sa.Column("archive_category_id", sa.BigInteger(), nullable=True),
+        sa.Column("muted_role_id", sa.BigInteger(), nullable=True),
+        sa.Column("mod_role_id", sa.BigInteger(), nullable=True),
+        sa.Column("op_role_id", sa.BigInteger(), nullable=True),
+        sa.PrimaryKeyConstraint("guild_id"),
+    )
+
+
+def downgrade():
+    op.drop_table("moderation_config")
+    op.drop_index("ix_mod_sessions_user_id", table_name="mod_sessions")
+    op.drop_table("mod_sessions")
+    op.drop_index("ix_tickets_channel_id", table_name="tickets")
+    op.drop_table("tickets")
+    op.drop_index("ix_infractions_user_id", table_name="infractions")
+    op.drop_table("infractions")
@@ -0,0 +1,73 @@
+"""cookies, achievements, counters and profiles
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "cookie_balances",
+        sa.Column("user_id", sa.BigInteger(), nullable=False),
+        sa.Column("cookies", sa.Integer(), nullable=False),
+        sa.Column("cakes", sa.Integer(), nullable=False),
+        sa.Column("given", sa.Integer(), nullable=False),
+        sa.Column("received", sa.Integer(), nullable=False),
+        sa.Column("factories", sa.Integer(), nullable=False),
+        sa.Column("last_collect", sa.DateTime(), nullable=True),
+        sa.Column("last_bake", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+    op.create_index("ix_cookie_balances_cookies", "cookie_balances", ["cookies"])
+
+    op.create_table(
+        "user_achievements",
+        sa.Column("user_id", sa.BigInteger(), nullable=False),
+        sa.Column("achievement_id", sa.String(length=64), nullable=False),
+        sa.Column("position", sa.Integer(), nullable=False),
+        sa.Column("unlocked_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("user_id", "achievement_id"),
+    )
+    op.create_index(
+        "ix_user_achievements_achievement_id", "user_achievements", ["achievement_id"]
+    )
+
+    op.create_table(
+        "user_counters",
+        sa.Column("user_id", sa.BigInteger(), nullable=False),
+        sa.Column("counter", sa.String(length=100), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("user_id", "counter"),
+    )
+    op.create_index(
+        "ix_user_counters_counter_count", "user_counters", ["counter", "count"]
+    )
+
+    op.create_table(
+        "profiles",
+        sa.Column("user_id", sa.BigInteger(), nullable=False),
+        sa.Column("bio", sa.String(length=200), nullable=True),
+        sa.Column("last_message_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+
+
+def downgrade():
+    op.drop_table("profiles")
+    op.drop_index("ix_user_counters_counter_count", table_name="user_counters")
+    op.drop_table("user_counters")
+    op.drop_index(
+        "ix_user_achievements_achievement_id", table_name="user_achievements"
+    )
+    op.drop_table("user_achievements")
+    op.drop_index("ix_cookie_balances_cookies", table_name="cookie_balances")
+    op.drop_table("cookie_balances")
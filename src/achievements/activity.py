@@ -0,0 +1,157 @@
+"""in-memory activity counters for achievements
+
+event handlers only update the dicts here and mark the file dirty, no
+DataManager call happens per message or reaction. `persist` hands every
+changed file over in one batch and is run periodically by the Achievements
+cog. last-seen times are unix seconds instead of iso strings.
+`merge_history` folds in counts read back from channel history. counters
+and last-seen times are mirrored into `user_counters` and `profiles` on
+the same schedule.
+"""
+
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from src.misc.db import Profile, TableMirror, UserCounter, counter_rows, profile_row
+
+MESSAGE_COUNTS = "message_counts"
+REACTION_COUNTS = "reaction_counts"
+LAST_SEEN = "last_message"
+# stored in each counter file with the token of the last history merge, so
+# the merge and its marker are written together
+MERGED = "_merged"
+
+
+class ActivityTracker:
+    def __init__(self, dm):
+        self.dm = dm
+        self.message_counts = dm.load(MESSAGE_COUNTS, {})
+        self.reaction_counts = dm.load(REACTION_COUNTS, {})
+        self.last_seen = dm.load(LAST_SEEN, {})
+        self._dirty = set()
+        self.counters = TableMirror(UserCounter, self._counter_rows)
+        self.profiles = TableMirror(Profile, self._profile_rows)
+
+        self._convert_timestamps()
+
+    def _convert_timestamps(self):
+        """rewrite iso timestamps from older versions as unix seconds"""
+        for user_id, value in list(self.last_seen.items()):
+            if not isinstance(value, str):
+                continue
+            try:
+                parsed = datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+                self.last_seen[user_id] = int(parsed.timestamp())
+            except ValueError:
+                del self.last_seen[user_id]
+            self._dirty.add(LAST_SEEN)
+
+    def _counter_rows(self, user_id: str) -> list:
+        counts = dict(self.message_counts.get(user_id, {}))
+        if user_id in self.reaction_counts:
+            counts["reactions"] = self.reaction_counts[user_id]
+        return counter_rows(user_id, counts)
+
+    def _profile_rows(self, user_id: str) -> list:
+        bio = self.dm.load("profiles", {}).get(user_id, {}).get("bio")
+        last = self.last_seen.get(user_id)
+        if bio is None and last is None:
+            return []
+        return [profile_row(user_id, bio, last)]
+
+    async def seed_tables(self):
+        await self.counters.seed(set(self.message_counts) | set(self.reaction_counts))
+        await self.profiles.seed(
+            set(self.last_seen) | set(self.dm.load("profiles", {}))
+        )
+
+    def word_count(self, user_id: str, key: str) -> int:
+        return self.message_counts.get(user_id, {}).get(key, 0)
+
+    def add_word(self, user_id: str, key: str) -> int:
+        counts = self.message_counts.get(user_id)
+        if counts is None:
+            counts = self.message_counts[user_id] = {}
+        counts[key] = counts.get(key, 0) + 1
+        self._dirty.add(MESSAGE_COUNTS)
+        self.counters.mark(user_id)
+        return counts[key]
+
+    def reactions(self, user_id: str) -> int:
+        return self.reaction_counts.get(user_id, 0)
+
+    def add_reaction(self, user_id: str) -> int:
+        count = self.reaction_counts.get(user_id, 0) + 1
+        self.reaction_counts[user_id] = count
+        self._dirty.add(REACTION_COUNTS)
+        self.counters.mark(user_id)
+        return count
+
+    def seen_at(self, user_id: str) -> Optional[int]:
+        return self.last_seen.get(user_id)
+
+    def touch(self, user_id: str) -> Optional[int]:
+        """record activity now, returns the previous last-seen time"""
+        previous = self.last_seen.get(user_id)
+        self.last_seen[user_id] = int(time.time())
+        self._dirty.add(LAST_SEEN)
+        self.profiles.mark(user_id)
+        return previous
+
+    def snapshot(self) -> dict:
+        """a copy of the counters, taken when a history backfill starts"""
+        return {
+            MESSAGE_COUNTS: {
+                u: dict(c) for u, c in self.message_counts.items() if u != MERGED
+            },
+            REACTION_COUNTS: {
+                u: c for u, c in self.reaction_counts.items() if u != MERGED
+            },
+        }
+
+    def merge_history(
+        self, messages: dict, reactions: dict, snapshot: dict, token: str
+    ):
+        """add counts read from history on top of the live ones
+
+        history up to the snapshot overlaps what was already counted live
+        then, so only the part above the snapshot is added. a file already
+        carrying `token` was merged before a restart and is left alone.
+        """
+        if self.message_counts.get(MERGED) != token:
+            before = snapshot[MESSAGE_COUNTS]
+            for user_id, counts in messages.items():
+                merged = dict(self.message_counts.get(user_id, {}))
+                seen = before.get(user_id, {})
+                for key, count in counts.items():
+                    merged[key] = merged.get(key, 0) + max(0, count - seen.get(key, 0))
+                self.message_counts[user_id] = merged
+            self.message_counts[MERGED] = token
+            self._dirty.add(MESSAGE_COUNTS)
+            self.counters.mark(*messages)
+
+        if self.reaction_counts.get(MERGED) != token:
+            before = snapshot[REACTION_COUNTS]
+            for user_id, count in reactions.items():
+                extra = max(0, count - before.get(user_id, 0))
+                self.reaction_counts[user_id] = (
+                    self.reaction_counts.get(user_id, 0) + extra
+                )
+            self.reaction_counts[MERGED] = token
+            self._dirty.add(REACTION_COUNTS)
+            self.counters.mark(*reactions)
+
+    async def persist(self):
+        dirty, self._dirty = self._dirty, set()
+        for filename in dirty:
+            await self.dm.asave(filename)
+        await self.counters.write()
+        await self.profiles.write()
+
+    def flush(self):
+        dirty, self._dirty = self._dirty, set()
+        for filename in dirty:
+            self.dm.save(filename)
+        self.counters.write_now()
+        self.profiles.write_now()
@@ -0,0 +1,228 @@
+"""rebuild activity counters from channel history
+
+message_counts and reaction_counts only start when the bot was deployed.
+`HistoryBackfill` reads the history of every channel from before the run
+started, a few channels at a time, and puts each message through the same
+trigger matcher as live messages. counts go into a separate tally, and the
+achievements they earn are granted once at the end through `grant_many`,
+in batches, instead of per message.
+
+the tally and each channel's position are kept in `activity_backfill` and
+saved every few pages, so a run cut short resumes where every channel
+stopped. the live counters are snapshotted when a run starts and only
+history above that snapshot is added, so nothing is counted twice. the
+counter files remember which run was merged into them, so a run resumed
+after a crash mid-merge doesn't add its tally again.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import discord
+
+from src.achievements.grants import GrantIntent, with_retries
+from src.achievements.triggers import reached
+
+log = logging.getLogger("discord_bot")
+
+BACKFILL = "activity_backfill"
+PAGE_SIZE = 100
+# pages read from a channel between checkpoints
+SAVE_EVERY = 10
+
+
+class HistoryBackfill:
+    def __init__(
+        self,
+        ach_system,
+        guild: discord.Guild,
+        concurrency: int = 3,
+        batch_size: int = 25,
+        delay: float = 2.0,
+    ):
+        self.ach_system = ach_system
+        self.guild = guild
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.delay = delay
+        self.dm = ach_system.dm
+        self.state = self.dm.load(BACKFILL, {})
+        self.granted = 0
+
+    @property
+    def started(self) -> bool:
+        return "cutoff" in self.state
+
+    def progress(self) -> dict:
+        channels = self.state.get("channels", {})
+        return {
+            "channels": len(channels),
+            "done": sum(1 for c in channels.values() if c["done"]),
+            "messages": sum(c["messages"] for c in channels.values()),
+        }
+
+    def _channels(self) -> list:
+        me = self.guild.me
+        channels = [*self.guild.text_channels, *self.guild.threads]
+        return [
+            channel
+            for channel in channels
+            if channel.permissions_for(me).read_message_history
+        ]
+
+    async def _start(self):
+        tracker = self.ach_system.activity
+        self.state["cutoff"] = int(time.time())
+        self.state["snapshot"] = tracker.snapshot()
+        self.state["channels"] = {
+            str(channel.id): {"before": None, "done": False, "messages": 0}
+            for channel in self._channels()
+        }
+        self.state["messages"] = {}
+        self.state["reactions"] = {}
+        await self._save()
+
+    async def _save(self):
+        await self.dm.asave(BACKFILL)
+
+    def _progress(self, channel_id: str) -> dict:
+        # read through the state each time, a reference held across a flush
+        # would not be written again
+        return self.state["channels"][channel_id]
+
+    async def run(self) -> int:
+        """read every channel, merge the tally and grant, returns grants made"""
+        if not self.started:
+            await self._start()
+
+        if not self.state.get("merged"):
+            semaphore = asyncio.Semaphore(self.concurrency)
+            await asyncio.gather(
+                *(
+                    self._scan(channel_id, semaphore)
+                    for channel_id, progress in self.state["channels"].items()
+                    if not progress["done"]
+                )
+            )
+
+            # the token goes into the counter files with the merged counts,
+            # a restart before `merged` is saved can't add the history twice
+            self.ach_system.activity.merge_history(
+                self.state["messages"],
+                self.state["reactions"],
+                self.state["snapshot"],
+                token=str(self.state["cutoff"]),
+            )
+            await self.ach_system.activity.persist()
+            self.state["merged"] = True
+            await self._save()
+
+        await self._grant()
+
+        await self.dm.asave(BACKFILL, {})
+        return self.granted
+
+    async def _scan(self, channel_id: str, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            channel = self.guild.get_channel_or_thread(int(channel_id))
+            if channel is None:
+                self._progress(channel_id)["done"] = True
+                return
+
+            pages = 0
+            while not self._progress(channel_id)["done"]:
+                before = self._progress(channel_id)["before"]
+                try:
+                    page = await with_retries(self._fetch, channel, before)
+                except discord.HTTPException as e:
+                    log.warning(f"backfill skipping #{channel}: {e}")
+                    self._progress(channel_id)["done"] = True
+                    break
+
+                messages, reactions = await self._count(page)
+
+                # tally and position change together, with no await between,
+                # so any checkpoint has each page either fully in or not at all
+                progress = self._progress(channel_id)
+                for user_id, counts in messages.items():
+                    tally = self.state["messages"].setdefault(user_id, {})
+                    for key, count in counts.items():
+                        tally[key] = tally.get(key, 0) + count
+                tally = self.state["reactions"]
+                for user_id, count in reactions.items():
+                    tally[user_id] = tally.get(user_id, 0) + count
+
+                progress["messages"] += len(page)
+                if page:
+                    progress["before"] = page[-1].id
+                progress["done"] = len(page) < PAGE_SIZE
+
+                pages += 1
+                if pages % SAVE_EVERY == 0:
+                    await self._save()
+
+            await self._save()
+            messages = self._progress(channel_id)["messages"]
+            log.info(f"backfill finished #{channel}: {messages} messages")
+
+    async def _fetch(self, channel, before: Optional[int]) -> list:
+        if before is None:
+            before = datetime.fromtimestamp(self.state["cutoff"], timezone.utc)
+        else:
+            before = discord.Object(id=before)
+        return [m async for m in channel.history(limit=PAGE_SIZE, before=before)]
+
+    async def _count(self, page: list) -> tuple:
+        """word counts and reactions added in one page, per user"""
+        messages, reactions = {}, {}
+        for message in page:
+            if not message.author.bot:
+                found = self.ach_system.triggers.message_triggers(message.content)
+                if found:
+                    counts = messages.setdefault(str(message.author.id), {})
+                    for key, _ in found:
+                        key = f"word_{key}"
+                        counts[key] = counts.get(key, 0) + 1
+
+            for reaction in message.reactions:
+                try:
+                    users = await with_retries(self._reactors, reaction)
+                except discord.HTTPException as e:
+                    log.warning(f"backfill skipping a reaction on {message.id}: {e}")
+                    continue
+                for user in users:
+                    if not user.bot:
+                        user_id = str(user.id)
+                        reactions[user_id] = reactions.get(user_id, 0) + 1
+        return messages, reactions
+
+    async def _reactors(self, reaction: discord.Reaction) -> list:
+        return [user async for user in reaction.users()]
+
+    async def _grant(self):
+        """message_count and reaction_count achievements the merged counts reach"""
+        ach_system = self.ach_system
+        triggers = ach_system.triggers
+        users = set(self.state["messages"]) | set(self.state["reactions"])
+
+        intents = []
+        for user_id in sorted(users):
+            owned = ach_system.owned_achievements(user_id)
+            earned = reached(
+                triggers.reaction_count, ach_system.get_reaction_count(user_id), owned
+            )
+            for key, trigger in triggers.words.items():
+                count = ach_system.get_message_count(user_id, key)
+                earned += reached(trigger.thresholds, count, owned)
+            intents += [
+                GrantIntent(user_id, ach_id, self.guild, None) for ach_id in earned
+            ]
+
+        for i in range(0, len(intents), self.batch_size):
+            granted = await ach_system.grant_many(intents[i : i + self.batch_size])
+            self.granted += len(granted)
+            if i + self.batch_size < len(intents):
+                await asyncio.sleep(self.delay)
@@ -1,11 +1,29 @@
+import asyncio
+
 import discord
 from discord import MediaGalleryItem, SeparatorSpacing
 from discord.ext import commands
 from discord.ui import Container, LayoutView, MediaGallery, Separator, TextDisplay
 
 import config
+from src.achievements.backfill import HistoryBackfill
 from src.achievements.utils import get_achievement_system
-from src.misc import CogHelper, get_data_manager, is_staff
+from src.misc import (
+    CogHelper,
+    find_role,
+    get_data_manager,
+    get_role_index,
+    has_role,
+    is_staff,
+)
+from src.misc.db import (
+    achievement_holders,
+    achievement_population,
+    cookie_leaderboard,
+    cookie_rank,
+    cookie_ranked_users,
+    get_session,
+)
 
 
 class ProfileView(LayoutView):
@@ -46,7 +64,7 @@ class ProfileView(LayoutView):
 
         level, current, needed = self.ach_sys.get_level_from_cookies(cookies)
 
-        user_achs = self.ach_sys.get_user_achievements(str(self.member.id))
+        ach_count = self.ach_sys.count_achievements(str(self.member.id))
         recent_achs = self.ach_sys.get_recent_achievements(str(self.member.id), 3)
 
         profile_data = self.dm.load("profiles", {})
@@ -55,7 +73,7 @@ class ProfileView(LayoutView):
 
         text = f"# {self.member.display_name}\n"
         text += f"**level {level}** | {current}/{needed} cookies\n"
-        text += f"**achievements:** {len(user_achs)}\n\n"
+        text += f"**achievements:** {ach_count}\n\n"
         text += f"**bio**\n{bio}\n\n"
 
         if recent_achs:
@@ -141,9 +159,10 @@ class ProfileView(LayoutView):
                 if ach_id in config.ACHIEVEMENTS:
                     ach = config.ACHIEVEMENTS[ach_id]
                     cookies = config.RARITY_XP.get(ach["rarity"], 25)
+                    share = self.ach_sys.rarity(ach_id, self.member.guild)
                     text += f"☆ **{ach['name']}** ({ach['rarity']})\n"
                     text += f"  {ach['description']}\n"
-                    text += f"  +{cookies} cookies\n\n"
+                    text += f"  +{cookies} cookies · held by {share:.1%}\n\n"
         else:
             text += "no achievements unlocked yet"
 
@@ -266,7 +285,10 @@ class ProfileView(LayoutView):
                 profile_data[str(self.author.id)] = {}
 
             profile_data[str(self.author.id)]["bio"] = msg.content[:200]
-            self.dm.save("profiles", profile_data)
+            await self.dm.asave("profiles", profile_data)
+            profiles = self.ach_sys.activity.profiles
+            profiles.mark(str(self.author.id))
+            await profiles.write()
 
             try:
                 await msg.delete()
@@ -314,7 +336,7 @@ class ProfileView(LayoutView):
                     await role.delete(reason="replacing with new color")
 
             # find marker position
-            marker = discord.utils.get(guild.roles, name="colors:")
+            marker = find_role(guild, "colors:")
             if not marker:
                 await modal_interaction.response.send_message(
                     "colors marker role not found", ephemeral=True
@@ -379,13 +401,13 @@ class ProfileView(LayoutView):
         member = interaction.user
 
         # remove existing roles in this category
+        held = get_role_index().role_names(member)
         existing_roles = [
-            role
-            for role in member.roles
-            if role.name in config.USERMOD_MAPPINGS[category].values()
+            find_role(guild, name)
+            for name in set(config.USERMOD_MAPPINGS[category].values()) & held
         ]
 
-        target_role = discord.utils.get(guild.roles, name=role_name)
+        target_role = find_role(guild, role_name)
 
         if not target_role:
             await interaction.response.send_message(
@@ -393,7 +415,7 @@ class ProfileView(LayoutView):
             )
             return
 
-        if target_role in member.roles:
+        if has_role(member, role_name):
             await interaction.response.send_message(
                 f"you already have {role_name}", ephemeral=True
             )
@@ -431,8 +453,15 @@ class AchCommands(CogHelper, commands.Cog):
         super().__init__(bot)
         self.ach_system = get_achievement_system()
         self.dm = get_data_manager()
+        self.backfill = None
+        self.backfill_task = None
+
+    def cog_unload(self):
+        # progress is checkpointed, `>achievements backfill` picks it back up
+        if self.backfill_task:
+            self.backfill_task.cancel()
 
-    @commands.command(aliases=["achs", "achievement", "ach", "quests"])
+    @commands.command(aliases=["achievements", "achs", "achievement", "ach", "quests"])
     async def profile(self, ctx, *args):
         if args and args[0] in ["-a", "--all"]:
             user_id = str(ctx.author.id)
@@ -453,6 +482,24 @@ class AchCommands(CogHelper, commands.Cog):
             await ctx.send(msg)
             return
 
+        if args and args[0] in ["stats", "-s", "--stats"]:
+            if "--recount" in args:
+                if not is_staff(ctx.author):
+                    await ctx.send("you lack the required permissions")
+                    return
+                self.ach_system.store.recount()
+
+            await self.send_stats(ctx)
+            return
+
+        if args and args[0] == "backfill":
+            if not is_staff(ctx.author):
+                await ctx.send("you lack the required permissions")
+                return
+
+            await self.start_backfill(ctx, "status" in args)
+            return
+
         if args and args[0] in ["-g", "--grant"]:
             if not is_staff(ctx.author):
                 await ctx.send("you lack the required permissions")
@@ -557,35 +604,121 @@ class AchCommands(CogHelper, commands.Cog):
         msg = await ctx.send(view=view)
         view.message = msg
 
+    def _holder_stats(self):
+        """holders per achievement and users holding any, from the indexed table"""
+        session = get_session()
+        try:
+            return achievement_holders(session), achievement_population(session)
+        finally:
+            session.close()
+
+    async def send_stats(self, ctx):
+        """every achievement by how many members hold it, rarest first"""
+        holders, population = await asyncio.to_thread(self._holder_stats)
+        if ctx.guild and ctx.guild.member_count:
+            population = ctx.guild.member_count
+        rows = sorted(
+            (holders.get(ach_id, 0), ach_id) for ach_id in config.ACHIEVEMENTS
+        )
+
+        lines = [f"**achievement stats** ({population} members)\n"]
+        for holders, ach_id in rows:
+            ach = config.ACHIEVEMENTS[ach_id]
+            share = holders / population if population else 0
+            lines.append(
+                f"`{share:6.1%}` **{ach['name']}** ({ach['rarity']}) · {holders} held"
+            )
+
+        msg = ""
+        for line in lines:
+            if len(msg) + len(line) + 1 > 2000:
+                await ctx.send(msg)
+                msg = ""
+            msg += line + "\n"
+        if msg:
+            await ctx.send(msg)
+
+    async def start_backfill(self, ctx, status_only: bool = False):
+        """count channel history into activity counters, resuming a stopped run"""
+        running = self.backfill_task is not None and not self.backfill_task.done()
+        if running or status_only:
+            backfill = self.backfill or HistoryBackfill(self.ach_system, ctx.guild)
+            if not backfill.started:
+                await ctx.send("no history backfill in progress")
+                return
+
+            progress = backfill.progress()
+            state = "running" if running else "stopped, run it again to resume"
+            await ctx.send(
+                f"history backfill {state}: {progress['done']}/{progress['channels']} "
+                f"channels, {progress['messages']} messages read"
+            )
+            return
+
+        guild = self.bot.get_guild(config.GUILD_ID)
+        if not guild:
+            await ctx.send("guild not found")
+            return
+
+        self.backfill = HistoryBackfill(self.ach_system, guild)
+        resumed = self.backfill.started
+        self.backfill_task = asyncio.create_task(self.run_backfill(ctx, self.backfill))
+        await ctx.send(
+            "resuming history backfill" if resumed else "started history backfill"
+        )
+
+    async def run_backfill(self, ctx, backfill: HistoryBackfill):
+        try:
+            granted = await backfill.run()
+        except Exception as e:
+            self.log_error(f"history backfill failed: {e}", exc_info=True)
+            await ctx.send("history backfill failed, run it again to resume")
+            return
+        finally:
+            # status reads the checkpoint again, empty once a run has finished
+            self.backfill = None
+            self.backfill_task = None
+
+        progress = backfill.progress()
+        self.log_info(
+            f"history backfill read {progress['messages']} messages, "
+            f"granted {granted} achievements"
+        )
+        await ctx.send(
+            f"history backfill done: {progress['messages']} messages in "
+            f"{progress['channels']} channels, {granted} achievements granted"
+        )
+
+    def _leaderboard_page(self, user_id: int, page: int, per_page: int):
+        """(ranked users, rows of the page, the user's rank) from the indexed table"""
+        session = get_session()
+        try:
+            total = cookie_ranked_users(session)
+            page = max(1, min(page, (total + per_page - 1) // per_page))
+            rows = cookie_leaderboard(session, per_page, (page - 1) * per_page)
+            return total, rows, cookie_rank(session, user_id)
+        finally:
+            session.close()
+
     @commands.command()
     async def leaderboard(self, ctx, page: int = 1):
         from src.commands.cookies import get_cookie_system
 
         cookie_sys = get_cookie_system()
+        user_cookies = cookie_sys.get_user_data(ctx.author.id).get("cookies", 0)
 
-        all_cookies = {}
-        for user_id, data in cookie_sys.data.items():
-            all_cookies[user_id] = data.get("cookies", 0)
-
-        sorted_users = sorted(all_cookies.items(), key=lambda x: x[1], reverse=True)
+        per_page = 10
+        total, rows, user_rank = await asyncio.to_thread(
+            self._leaderboard_page, ctx.author.id, page, per_page
+        )
 
-        if not sorted_users:
+        if not total:
             await ctx.send("no users on the leaderboard yet")
             return
 
-        user_rank = None
-        user_cookies = cookie_sys.get_user_data(ctx.author.id).get("cookies", 0)
-        for i, (uid, cookies) in enumerate(sorted_users, 1):
-            if uid == str(ctx.author.id):
-                user_rank = i
-                break
-
-        per_page = 10
-        total_pages = (len(sorted_users) + per_page - 1) // per_page
+        total_pages = (total + per_page - 1) // per_page
         page = max(1, min(page, total_pages))
-
         start_idx = (page - 1) * per_page
-        end_idx = start_idx + per_page
 
         msg = f"**cookie leaderboard** (page {page}/{total_pages})\n"
         if user_rank:
@@ -594,9 +727,7 @@ class AchCommands(CogHelper, commands.Cog):
         else:
             msg += "\n"
 
-        for i, (user_id, cookies) in enumerate(
-            sorted_users[start_idx:end_idx], start_idx + 1
-        ):
+        for i, (user_id, cookies) in enumerate(rows, start_idx + 1):
             level, current, needed = self.ach_system.get_level_from_cookies(cookies)
             member = ctx.guild.get_member(int(user_id))
             username = member.display_name if member else f"user {user_id}"
@@ -0,0 +1,101 @@
+"""queued achievement grants
+
+triggers call `GrantQueue.put`, which only records the intent and returns,
+so message, reaction and shell handlers never wait on discord. a single
+worker drains the queue in batches and hands each batch to the grant
+handler, which does one storage write, one role update per member and one
+announcement per channel. discord calls go through `with_retries`.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional
+
+import discord
+
+log = logging.getLogger("discord_bot")
+
+# seconds to wait before each retry of a transient discord failure
+RETRY_DELAYS = (1, 5, 15)
+
+
+@dataclass
+class GrantIntent:
+    user_id: str
+    achievement_id: str
+    guild: Optional[discord.Guild]
+    channel: Optional[discord.abc.Messageable]
+    cookies: int = 0
+
+
+async def with_retries(call, *args, **kwargs):
+    """await call(*args, **kwargs), retrying server errors, rate limits and timeouts"""
+    for delay in (*RETRY_DELAYS, None):
+        try:
+            return await call(*args, **kwargs)
+        except discord.HTTPException as e:
+            if delay is None or (e.status < 500 and e.status != 429):
+                raise
+        except (OSError, asyncio.TimeoutError):
+            if delay is None:
+                raise
+        await asyncio.sleep(delay)
+
+
+class GrantQueue:
+    def __init__(
+        self,
+        handler: Callable[[List[GrantIntent]], Awaitable],
+        batch_size: int = 25,
+    ):
+        self.handler = handler
+        self.batch_size = batch_size
+        self._queue = None
+        self._pending = set()
+        self._worker = None
+
+    def put(self, intent: GrantIntent) -> bool:
+        """queue a grant, returns False if the same one is already queued"""
+        key = (intent.user_id, intent.achievement_id)
+        if key in self._pending:
+            return False
+        self._pending.add(key)
+
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        self._queue.put_nowait(intent)
+
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        return True
+
+    def is_pending(self, user_id: str, achievement_id: str) -> bool:
+        return (user_id, achievement_id) in self._pending
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            try:
+                await self.handler(batch)
+            except Exception:
+                log.exception(f"achievement grant batch of {len(batch)} failed")
+            finally:
+                for intent in batch:
+                    self._pending.discard((intent.user_id, intent.achievement_id))
+                    self._queue.task_done()
+
+    async def stop(self, timeout: float = 10.0):
+        """let the worker finish what's queued, then stop it"""
+        if self._queue is not None and self._worker and not self._worker.done():
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                log.warning(f"dropping {self._queue.qsize()} queued achievement grants")
+
+        if self._worker:
+            self._worker.cancel()
+            self._worker = None
@@ -1,6 +1,9 @@
-from discord.ext import commands
+import asyncio
+
+from discord.ext import commands, tasks
 
 import config
+from src.achievements.grants import GrantIntent
 from src.achievements.utils import get_achievement_system
 from src.misc import CogHelper
 
@@ -9,6 +12,28 @@ class Achievements(CogHelper, commands.Cog):
     def __init__(self, bot):
         super().__init__(bot)
         self.ach_system = get_achievement_system()
+        self.mutual_scan = None
+        self.persist_activity.start()
+
+    async def cog_load(self):
+        await self.ach_system.seed_tables()
+
+    async def cog_unload(self):
+        self.persist_activity.cancel()
+        if self.mutual_scan:
+            self.mutual_scan.cancel()
+        await self.ach_system.grants.stop()
+        self.ach_system.store.flush()
+        self.ach_system.activity.flush()
+        self.ach_system.dm.flush()
+
+    @tasks.loop(seconds=30)
+    async def persist_activity(self):
+        await self.ach_system.activity.persist()
+
+    @persist_activity.before_loop
+    async def before_persist_activity(self):
+        await self.bot.wait_until_ready()
 
     @commands.Cog.listener()
     async def on_message(self, message):
@@ -76,32 +101,72 @@ class Achievements(CogHelper, commands.Cog):
         if not self.ach_system.has_achievement(str(member.id), "neopolita"):
             other_guild = self.bot.get_guild(config.NEO_POLITA)
             if other_guild and other_guild.get_member(member.id):
-                await self.ach_system.grant_achievement(
+                self.ach_system.queue_grant(
                     str(member.id), "neopolita", member.guild, None
                 )
-                self.log_info(f"neopolita achievement granted to {member.id}")
+                self.log_info(f"neopolita achievement queued for {member.id}")
 
     @commands.Cog.listener()
     async def on_ready(self):
-        guild = self.bot.get_guild(config.GUILD_ID)
-        if not guild:
+        # on_ready fires again after every reconnect
+        if self.mutual_scan and not self.mutual_scan.done():
             return
+        self.mutual_scan = asyncio.create_task(self.scan_mutual_servers())
 
+    async def scan_mutual_servers(self, batch_size: int = 20, delay: float = 2.0):
+        """grant neopolita to existing members of both guilds, in paced batches
+
+        grants are saved batch by batch and members who already own it are
+        skipped, so a scan cut short by a restart picks up where it stopped.
+        """
+        guild = self.bot.get_guild(config.GUILD_ID)
         other_guild = self.bot.get_guild(config.NEO_POLITA)
-        if not other_guild:
+        if not guild or not other_guild:
             return
 
-        for member in guild.members:
-            if not member.bot and not self.ach_system.has_achievement(
-                str(member.id), "neopolita"
-            ):
-                if other_guild.get_member(member.id):
-                    await self.ach_system.grant_achievement(
-                        str(member.id), "neopolita", guild, None
-                    )
-                    self.log_info(
-                        f"neopolita achievement granted to {member.id} (existing member)"
-                    )
+        mutual = {m.id for m in guild.members if not m.bot} & {
+            m.id for m in other_guild.members
+        }
+        missing = sorted(
+            member_id
+            for member_id in mutual
+            if not self.ach_system.has_achievement(str(member_id), "neopolita")
+        )
+
+        dm = self.ach_system.dm
+        checkpoint = dm.load("neopolita_scan", {})
+        if checkpoint.get("remaining"):
+            self.log_info(
+                f"resuming neopolita scan: {len(missing)} left, "
+                f"{checkpoint.get('granted', 0)} granted before restart"
+            )
+        elif not missing:
+            return
+
+        checkpoint["remaining"] = len(missing)
+        checkpoint.setdefault("granted", 0)
+        await dm.asave("neopolita_scan", checkpoint)
+
+        for i in range(0, len(missing), batch_size):
+            batch = [
+                GrantIntent(str(member_id), "neopolita", guild, None)
+                for member_id in missing[i : i + batch_size]
+            ]
+            granted = await self.ach_system.grant_many(batch)
+
+            checkpoint["granted"] += len(granted)
+            checkpoint["remaining"] = max(0, len(missing) - i - batch_size)
+            await dm.asave("neopolita_scan", checkpoint)
+            self.log_info(
+                f"neopolita scan: {checkpoint['granted']} granted, "
+                f"{checkpoint['remaining']} left"
+            )
+
+            if checkpoint["remaining"]:
+                await asyncio.sleep(delay)
+
+        checkpoint["granted"] = 0
+        await dm.asave("neopolita_scan", checkpoint)
 
 
 async def setup(bot):
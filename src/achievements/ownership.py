@@ -0,0 +1,174 @@
+"""achievement ownership as per-user integer bitsets
+
+every achievement id gets a bit position the first time it is seen, stored
+in `achievement_bits` and never reused or reordered, so editing config
+can't shift anyone's achievements. `achievement_owned` maps a user to one
+int, making ownership checks a shift and counts a popcount. unlock order
+and time live separately in `achievement_unlocks` as [bit, unix time] pairs.
+holder counts per achievement are kept in memory, updated on every change
+and rebuilt from the bitsets on load or by `recount`. unlocks are mirrored
+into the `user_achievements` table for indexed rarity queries.
+older `achievements.json` lists are converted the first time this loads.
+"""
+
+import time
+from typing import Iterable, List, Optional
+
+from src.misc.db import TableMirror, UserAchievement, achievement_rows
+
+BITS = "achievement_bits"
+OWNED = "achievement_owned"
+UNLOCKS = "achievement_unlocks"
+LEGACY = "achievements"
+
+
+class OwnedView:
+    """read-only view of one user's bitset, usable where a list of ids was"""
+
+    def __init__(self, store: "AchievementStore", bits: int):
+        self._store = store
+        self._bits = bits
+
+    def __contains__(self, achievement_id) -> bool:
+        bit = self._store.positions.get(achievement_id)
+        return bit is not None and self._bits >> bit & 1 == 1
+
+    def __len__(self) -> int:
+        return self._bits.bit_count()
+
+    def __iter__(self):
+        bits = self._bits
+        while bits:
+            low = bits & -bits
+            yield self._store.ids[low.bit_length() - 1]
+            bits ^= low
+
+
+class AchievementStore:
+    def __init__(self, dm, achievement_ids: Iterable[str] = ()):
+        self.dm = dm
+        self.positions = dm.load(BITS, {})
+        self.owned = dm.load(OWNED, {})
+        self.unlocks = dm.load(UNLOCKS, {})
+        self.ids = {bit: ach_id for ach_id, bit in self.positions.items()}
+        self.holder_counts = {}
+        self._dirty = set()
+        self.table = TableMirror(UserAchievement, self._unlock_rows)
+
+        for ach_id in achievement_ids:
+            self.bit(ach_id)
+
+        if not self.owned and not self.unlocks:
+            self._import_legacy()
+
+        self.recount()
+
+    def _import_legacy(self):
+        legacy = self.dm.load(LEGACY, {})
+        for user_id, ach_ids in legacy.items():
+            for ach_id in ach_ids or []:
+                self.add(str(user_id), ach_id, unlocked_at=None)
+        self.dm.clear_cache(LEGACY)
+
+    def _unlock_rows(self, user_id: str) -> list:
+        unlocks = self.unlocks.get(user_id, [])
+        return achievement_rows(user_id, [(self.ids[bit], at) for bit, at in unlocks])
+
+    def bit(self, achievement_id: str) -> int:
+        """the bit position of an achievement, assigning the next free one"""
+        bit = self.positions.get(achievement_id)
+        if bit is None:
+            bit = max(self.ids, default=-1) + 1
+            self.positions[achievement_id] = bit
+            self.ids[bit] = achievement_id
+            self._dirty.add(BITS)
+        return bit
+
+    def recount(self) -> dict:
+        """rebuild holder counts from every bitset, {bit: holders}"""
+        counts = {}
+        for bits in self.owned.values():
+            while bits:
+                low = bits & -bits
+                bit = low.bit_length() - 1
+                counts[bit] = counts.get(bit, 0) + 1
+                bits ^= low
+        self.holder_counts = counts
+        return counts
+
+    def holders(self, achievement_id: str) -> int:
+        bit = self.positions.get(achievement_id)
+        return self.holder_counts.get(bit, 0) if bit is not None else 0
+
+    def population(self) -> int:
+        """users with at least one achievement"""
+        return sum(1 for bits in self.owned.values() if bits)
+
+    def bits(self, user_id: str) -> int:
+        return self.owned.get(user_id, 0)
+
+    def view(self, user_id: str) -> OwnedView:
+        return OwnedView(self, self.bits(user_id))
+
+    def has(self, user_id: str, achievement_id: str) -> bool:
+        bit = self.positions.get(achievement_id)
+        return bit is not None and self.bits(user_id) >> bit & 1 == 1
+
+    def count(self, user_id: str) -> int:
+        return self.bits(user_id).bit_count()
+
+    def unlocked(self, user_id: str) -> List[str]:
+        """achievement ids in the order they were unlocked"""
+        return [self.ids[bit] for bit, _ in self.unlocks.get(user_id, [])]
+
+    def unlocked_at(self, user_id: str, achievement_id: str) -> Optional[int]:
+        bit = self.positions.get(achievement_id)
+        for unlocked_bit, at in self.unlocks.get(user_id, []):
+            if unlocked_bit == bit:
+                return at
+        return None
+
+    def add(self, user_id: str, achievement_id: str, unlocked_at=0) -> bool:
+        """unlocked_at: unix time, 0 for now, None if unknown"""
+        bit = self.bit(achievement_id)
+        bits = self.bits(user_id)
+        if bits >> bit & 1:
+            return False
+
+        self.owned[user_id] = bits | 1 << bit
+        self.holder_counts[bit] = self.holder_counts.get(bit, 0) + 1
+        if user_id not in self.unlocks:
+            self.unlocks[user_id] = []
+        self.unlocks[user_id].append(
+            [bit, int(time.time()) if unlocked_at == 0 else unlocked_at]
+        )
+        self._dirty.update((OWNED, UNLOCKS))
+        self.table.mark(user_id)
+        return True
+
+    def remove(self, user_id: str, achievement_id: str) -> bool:
+        bit = self.positions.get(achievement_id)
+        bits = self.bits(user_id)
+        if bit is None or not bits >> bit & 1:
+            return False
+
+        self.owned[user_id] = bits & ~(1 << bit)
+        self.holder_counts[bit] = max(0, self.holder_counts.get(bit, 0) - 1)
+        self.unlocks[user_id] = [
+            u for u in self.unlocks.get(user_id, []) if u[0] != bit
+        ]
+        self._dirty.update((OWNED, UNLOCKS))
+        self.table.mark(user_id)
+        return True
+
+    async def save(self):
+        dirty, self._dirty = self._dirty, set()
+        for filename in dirty:
+            await self.dm.asave(filename)
+        await self.table.write()
+
+    def flush(self):
+        dirty, self._dirty = self._dirty, set()
+        for filename in dirty:
+            self.dm.save(filename)
+        self.table.write_now()
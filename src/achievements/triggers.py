@@ -0,0 +1,186 @@
+"""config.ACHIEVEMENTS compiled into per-trigger lookup tables
+
+built once at startup so each event only looks at the achievements that
+can fire for it. thresholds are sorted ascending, which lets a check stop
+at the first one the user hasn't reached.
+"""
+
+from bisect import bisect_right
+from collections import defaultdict
+from typing import Iterable, List, Optional
+
+import config
+from src.misc.matcher import MultiMatcher
+
+# trigger types granted elsewhere (cookies, moderation, hzsh, manual grants)
+EXTERNAL_TRIGGERS = {"manual", "first_hzsh", "mutual_servers", "steam_games", "infraction"}
+
+
+def _counter_key(word) -> str:
+    if isinstance(word, (tuple, list)):
+        return "+".join(w.lower() for w in word)
+    return word.lower()
+
+
+class WordTrigger:
+    """message_count achievements sharing the same word (or words)"""
+
+    def __init__(self, words: tuple):
+        self.words = words
+        self.thresholds = []
+
+    def matches(self, found: set) -> bool:
+        # multi-word triggers need all of their words in the message
+        return all(word in found for word in self.words)
+
+
+class TriggerTable:
+    def __init__(self, achievements: dict, rarities: Optional[dict] = None):
+        self.command_prefixes = []
+        self.command_words = []
+        self.file_reads = []
+        self.nonzero_exit = []
+        self.words = {}
+        self.presence = defaultdict(list)
+        self.forum = defaultdict(list)
+        self.achievement_count = []
+        self.inactivity = []
+        self.reaction_count = []
+        self.specific_reaction = []
+
+        for ach_id, ach_data in achievements.items():
+            self._validate(ach_id, ach_data, rarities)
+            self._add(ach_id, ach_data["trigger_type"], ach_data.get("trigger_value"))
+
+        for trigger in self.words.values():
+            trigger.thresholds.sort()
+        self.achievement_count.sort()
+        self.inactivity.sort()
+        self.reaction_count.sort()
+        self.presence = dict(self.presence)
+        self.forum = dict(self.forum)
+
+        # message words match anywhere ("meowww" counts), command names only
+        # as whole words so `su` doesn't fire on `users`
+        self.message_matcher = MultiMatcher(
+            word for trigger in self.words.values() for word in trigger.words
+        )
+        self.command_matcher = MultiMatcher(
+            (word for words, _ in self.command_words for word in words), words=True
+        )
+        self.file_matcher = MultiMatcher(path for path, _ in self.file_reads)
+
+    def message_triggers(self, content: str) -> List[tuple]:
+        """(counter key, trigger) for every word trigger the message hits"""
+        found = self.message_matcher.find(content)
+        if not found:
+            return []
+        return [(key, t) for key, t in self.words.items() if t.matches(found)]
+
+    def command_achievements(self, command: str) -> List[str]:
+        """command and file_read achievements a command triggers"""
+        earned = [
+            ach_id
+            for trigger, ach_id in self.command_prefixes
+            if command.startswith(trigger)
+        ]
+
+        found = self.command_matcher.find(command)
+        if found:
+            earned += [
+                ach_id
+                for words, ach_id in self.command_words
+                if any(word.lower() in found for word in words)
+            ]
+
+        if "cat" in command:
+            found = self.file_matcher.find(command)
+            earned += [ach_id for path, ach_id in self.file_reads if path.lower() in found]
+        return earned
+
+    def _validate(self, ach_id: str, ach_data: dict, rarities: Optional[dict]):
+        for field in ("name", "rarity", "trigger_type"):
+            if field not in ach_data:
+                raise ValueError(f"achievement {ach_id} has no {field}")
+        if rarities is not None and ach_data["rarity"] not in rarities:
+            raise ValueError(f"achievement {ach_id} has unknown rarity {ach_data['rarity']}")
+
+        trigger_type = ach_data["trigger_type"]
+        value = ach_data.get("trigger_value")
+
+        if trigger_type in EXTERNAL_TRIGGERS or trigger_type == "nonzero_exit":
+            return
+
+        valid = {
+            "command": isinstance(value, str)
+            or (isinstance(value, list) and all(isinstance(v, str) for v in value)),
+            "file_read": isinstance(value, str),
+            "message_count": isinstance(value, (tuple, list))
+            and len(value) == 2
+            and isinstance(value[1], int)
+            and (
+                isinstance(value[0], str)
+                or (
+                    isinstance(value[0], (tuple, list))
+                    and value[0]
+                    and all(isinstance(v, str) for v in value[0])
+                )
+            ),
+            "presence": isinstance(value, list) and all(isinstance(v, str) for v in value),
+            "forum_post": isinstance(value, int),
+            "achievement_count": isinstance(value, int),
+            "inactivity": isinstance(value, (int, float)),
+            "reaction_count": isinstance(value, int),
+            "specific_reaction": isinstance(value, str),
+        }
+        if trigger_type not in valid:
+            raise ValueError(f"achievement {ach_id} has unknown trigger type {trigger_type}")
+        if not valid[trigger_type]:
+            raise ValueError(f"achievement {ach_id} has a bad {trigger_type} trigger: {value!r}")
+
+    def _add(self, ach_id: str, trigger_type: str, value):
+        if trigger_type == "command":
+            if isinstance(value, list):
+                self.command_words.append((tuple(value), ach_id))
+            else:
+                self.command_prefixes.append((value, ach_id))
+        elif trigger_type == "nonzero_exit":
+            self.nonzero_exit.append(ach_id)
+        elif trigger_type == "file_read":
+            self.file_reads.append((value, ach_id))
+        elif trigger_type == "message_count":
+            word, count = value
+            key = _counter_key(word)
+            if key not in self.words:
+                words = word if isinstance(word, (tuple, list)) else (word,)
+                self.words[key] = WordTrigger(tuple(w.lower() for w in words))
+            self.words[key].thresholds.append((count, ach_id))
+        elif trigger_type == "presence":
+            for name in value:
+                self.presence[name].append(ach_id)
+        elif trigger_type == "forum_post":
+            self.forum[value].append(ach_id)
+        elif trigger_type == "achievement_count":
+            self.achievement_count.append((value, ach_id))
+        elif trigger_type == "inactivity":
+            self.inactivity.append((value, ach_id))
+        elif trigger_type == "reaction_count":
+            self.reaction_count.append((value, ach_id))
+        elif trigger_type == "specific_reaction":
+            self.specific_reaction.append((value, ach_id))
+
+
+def reached(thresholds: list, value, owned: Iterable[str]) -> List[str]:
+    """ids of sorted (threshold, id) pairs that value reaches, minus owned ones"""
+    end = bisect_right(thresholds, value, key=lambda t: t[0])
+    return [ach_id for _, ach_id in thresholds[:end] if ach_id not in owned]
+
+
+_trigger_table = None
+
+
+def get_trigger_table() -> TriggerTable:
+    global _trigger_table
+    if _trigger_table is None:
+        _trigger_table = TriggerTable(config.ACHIEVEMENTS, config.RARITY_XP)
+    return _trigger_table
@@ -1,19 +1,34 @@
+import logging
+import math
+import time
+from collections import deque
 from datetime import datetime
 from typing import Optional, Tuple
 
 import discord
 
 import config
-from src.misc import get_data_manager, get_or_create_role, safe_send
+from src.achievements.activity import ActivityTracker
+from src.achievements.grants import GrantIntent, GrantQueue, with_retries
+from src.achievements.ownership import AchievementStore, OwnedView
+from src.achievements.triggers import get_trigger_table, reached
+from src.misc import get_data_manager, get_or_create_role, has_role
+
+log = logging.getLogger("discord_bot")
 
 
 class AchievementSystem:
     def __init__(self):
         self.dm = get_data_manager()
-        self.achievements = self.dm.load("achievements", {})
-        self.message_counts = self.dm.load("message_counts", {})
-        self.reaction_counts = self.dm.load("reaction_counts", {})
-        self.last_message = self.dm.load("last_message", {})
+        self.store = AchievementStore(self.dm, config.ACHIEVEMENTS)
+        self.activity = ActivityTracker(self.dm)
+        self.triggers = get_trigger_table()
+        self.grants = GrantQueue(self.grant_many)
+
+    async def seed_tables(self):
+        """fill the user tables on the first start after they were added"""
+        await self.store.table.seed(list(self.store.unlocks))
+        await self.activity.seed_tables()
 
     def get_level_from_cookies(self, cookies: int) -> Tuple[int, int, int]:
         level = 1
@@ -28,108 +43,208 @@ class AchievementSystem:
         return level, current_cookies, cookies_needed
 
     def has_achievement(self, user_id: str, achievement_id: str) -> bool:
-        user_id = str(user_id)
-        return achievement_id in self.achievements.get(user_id, [])
+        return self.store.has(str(user_id), achievement_id)
 
     def get_user_achievements(self, user_id: str) -> list:
-        return self.achievements.get(str(user_id), [])
+        """achievement ids in unlock order"""
+        return self.store.unlocked(str(user_id))
+
+    def owned_achievements(self, user_id: str) -> OwnedView:
+        """constant time membership and count, for checks"""
+        return self.store.view(str(user_id))
+
+    def count_achievements(self, user_id: str) -> int:
+        return self.store.count(str(user_id))
 
     def get_recent_achievements(self, user_id: str, limit: int = 3) -> list:
         user_achs = self.get_user_achievements(user_id)
         return user_achs[-limit:] if user_achs else []
 
     def get_message_count(self, user_id: str, word: str) -> int:
-        user_id = str(user_id)
-        count_key = f"word_{word}"
-        return self.message_counts.get(user_id, {}).get(count_key, 0)
+        return self.activity.word_count(str(user_id), f"word_{word}")
 
     def increment_message_count(self, user_id: str, word: str) -> int:
-        user_id = str(user_id)
-        count_key = f"word_{word}"
-
-        if user_id not in self.message_counts:
-            self.message_counts[user_id] = {}
-
-        if count_key not in self.message_counts[user_id]:
-            self.message_counts[user_id][count_key] = 0
-
-        self.message_counts[user_id][count_key] += 1
-        self.dm.save("message_counts", self.message_counts)
-
-        return self.message_counts[user_id][count_key]
+        return self.activity.add_word(str(user_id), f"word_{word}")
 
     def get_reaction_count(self, user_id: str) -> int:
-        user_id = str(user_id)
-        return self.reaction_counts.get(user_id, 0)
+        return self.activity.reactions(str(user_id))
 
     def increment_reaction_count(self, user_id: str) -> int:
-        user_id = str(user_id)
-        if user_id not in self.reaction_counts:
-            self.reaction_counts[user_id] = 0
-        self.reaction_counts[user_id] += 1
-        self.dm.save("reaction_counts", self.reaction_counts)
-        return self.reaction_counts[user_id]
+        return self.activity.add_reaction(str(user_id))
 
     def get_last_message(self, user_id: str) -> Optional[datetime]:
-        user_id = str(user_id)
-        last = self.last_message.get(user_id)
+        last = self.activity.seen_at(str(user_id))
         if last:
-            return datetime.fromisoformat(last)
+            return datetime.utcfromtimestamp(last)
         return None
 
-    def update_last_message(self, user_id: str):
-        user_id = str(user_id)
-        self.last_message[user_id] = datetime.utcnow().isoformat()
-        self.dm.save("last_message", self.last_message)
-
-    async def grant_achievement(
+    def update_last_message(self, user_id: str) -> Optional[int]:
+        return self.activity.touch(str(user_id))
+
+    def population(self, guild: Optional[discord.Guild] = None) -> int:
+        """members an achievement could be held by, for rarity percentages"""
+        if guild and guild.member_count:
+            return guild.member_count
+        return self.store.population()
+
+    def rarity(
+        self, achievement_id: str, guild: Optional[discord.Guild] = None
+    ) -> float:
+        """share of members holding an achievement, 0 to 1"""
+        population = self.population(guild)
+        if not population:
+            return 0.0
+        return min(1.0, self.store.holders(achievement_id) / population)
+
+    def achievement_cookies(
+        self, achievement_id: str, guild: Optional[discord.Guild] = None
+    ) -> int:
+        base = config.RARITY_XP.get(config.ACHIEVEMENTS[achievement_id]["rarity"], 25)
+        if not config.RARITY_BONUS:
+            return base
+
+        # 10% of members holding it or more earns the base, 1% double,
+        # 0.1% triple, capped at RARITY_BONUS_MAX
+        share = self.rarity(achievement_id, guild)
+        bonus = math.log10(1 / share) if share > 0 else config.RARITY_BONUS_MAX
+        return round(base * min(config.RARITY_BONUS_MAX, max(1.0, bonus)))
+
+    def queue_grant(
         self,
         user_id: str,
         achievement_id: str,
         guild: Optional[discord.Guild],
         channel: Optional[discord.abc.Messageable],
     ) -> bool:
+        """grant from a trigger without waiting, the grant worker does the rest"""
         user_id = str(user_id)
-
-        if self.has_achievement(user_id, achievement_id):
-            return False
-
         if achievement_id not in config.ACHIEVEMENTS:
             return False
+        if self.has_achievement(user_id, achievement_id):
+            return False
+        return self.grants.put(GrantIntent(user_id, achievement_id, guild, channel))
 
-        if user_id not in self.achievements:
-            self.achievements[user_id] = []
-
-        self.achievements[user_id].append(achievement_id)
-        self.dm.save("achievements", self.achievements)
-
-        ach_data = config.ACHIEVEMENTS[achievement_id]
-        cookies = config.RARITY_XP.get(ach_data["rarity"], 25)
-
+    async def grant_achievement(
+        self,
+        user_id: str,
+        achievement_id: str,
+        guild: Optional[discord.Guild],
+        channel: Optional[discord.abc.Messageable],
+    ) -> bool:
+        """grant right away, for callers that need to know if it happened"""
+        intent = GrantIntent(str(user_id), achievement_id, guild, channel)
+        return bool(await self.grant_many([intent]))
+
+    async def grant_many(self, intents: list) -> list:
+        """grant a batch as one transaction, returns the intents that were new
+
+        cascades (cookie rewards unlocking receive achievements, unlock
+        counts reaching achievement_count triggers) are resolved here, so
+        they share the single achievements and cookies write, role update
+        and announcement instead of each doing their own.
+        """
         from src.commands.cookies import get_cookie_system
 
         cookie_sys = get_cookie_system()
-        await cookie_sys.reward_cookie(user_id, cookies, guild, channel)
-
-        if guild and ach_data.get("role"):
-            role = await get_or_create_role(guild, ach_data["role"])
-            if role:
-                member = guild.get_member(int(user_id))
-                if member:
-                    await member.add_roles(role)
-
-        if channel:
-            name = ach_data["name"]
-            rarity = ach_data["rarity"]
+
+        granted = []
+        pending = deque(intents)
+        while pending:
+            intent = pending.popleft()
+            user_id = intent.user_id
+            if intent.achievement_id not in config.ACHIEVEMENTS:
+                continue
+            if self.has_achievement(user_id, intent.achievement_id):
+                continue
+
+            # priced before it counts as held, so the first holder gets the most
+            intent.cookies = self.achievement_cookies(
+                intent.achievement_id, intent.guild
+            )
+            self.store.add(user_id, intent.achievement_id)
+            granted.append(intent)
+
+            owned = self.owned_achievements(user_id)
+            follow = reached(self.triggers.achievement_count, len(owned), owned)
+            if cookie_sys:
+                cookie_sys.add_reward(user_id, intent.cookies)
+                follow += cookie_sys.receive_achievements(user_id)
+
+            pending.extend(
+                GrantIntent(user_id, ach_id, intent.guild, intent.channel)
+                for ach_id in follow
+                if ach_id not in owned
+            )
+
+        if not granted:
+            return []
+
+        await self.store.save()
+        if cookie_sys:
+            await cookie_sys.save()
+
+        await self._add_roles(granted)
+        await self._announce(granted)
+
+        return granted
+
+    async def _add_roles(self, granted: list):
+        """one add_roles call per member for everything they unlocked"""
+        wanted = {}
+        for intent in granted:
+            role_name = config.ACHIEVEMENTS[intent.achievement_id].get("role")
+            if intent.guild and role_name:
+                wanted.setdefault((intent.guild, intent.user_id), []).append(role_name)
+
+        for (guild, user_id), names in wanted.items():
+            member = guild.get_member(int(user_id))
+            if not member:
+                continue
+
+            names = [name for name in names if not has_role(member, name)]
+            roles = [await get_or_create_role(guild, name) for name in names]
+            roles = [role for role in roles if role]
+            if not roles:
+                continue
+
+            try:
+                await with_retries(member.add_roles, *roles)
+            except discord.HTTPException as e:
+                log.warning(f"could not add achievement roles to {user_id}: {e}")
+
+    async def _announce(self, granted: list):
+        """one message per channel, one line per user with all their unlocks"""
+        unlocks = {}
+        for intent in granted:
+            if intent.channel:
+                key = (intent.channel, intent.guild, intent.user_id)
+                unlocks.setdefault(key, []).append(intent)
+
+        lines = {}
+        for (channel, guild, user_id), intents in unlocks.items():
             member = guild.get_member(int(user_id)) if guild else None
             mention = member.mention if member else f"user {user_id}"
-
-            msg = f"🏆 {mention} unlocked **{name}** ({rarity}) +{cookies} cookies"
-            await safe_send(channel, msg)
-
-        await self.check_achievement_count(user_id, guild)
-
-        return True
+            achievements = [config.ACHIEVEMENTS[i.achievement_id] for i in intents]
+            names = ", ".join(f"**{a['name']}** ({a['rarity']})" for a in achievements)
+            cookies = sum(i.cookies for i in intents)
+            lines.setdefault(channel, []).append(
+                f"🏆 {mention} unlocked {names} +{cookies} cookies"
+            )
+
+        for channel, messages in lines.items():
+            chunk = ""
+            for line in messages:
+                if chunk and len(chunk) + len(line) + 1 > 2000:
+                    await self._send(channel, chunk)
+                    chunk = ""
+                chunk = f"{chunk}\n{line}" if chunk else line
+            await self._send(channel, chunk)
+
+    async def _send(self, channel: discord.abc.Messageable, content: str):
+        try:
+            await with_retries(channel.send, content)
+        except discord.HTTPException as e:
+            log.warning(f"could not announce achievements: {e}")
 
     async def revoke_achievement(
         self, user_id: str, achievement_id: str, guild: Optional[discord.Guild]
@@ -139,8 +254,8 @@ class AchievementSystem:
         if not self.has_achievement(user_id, achievement_id):
             return False
 
-        self.achievements[user_id].remove(achievement_id)
-        self.dm.save("achievements", self.achievements)
+        self.store.remove(user_id, achievement_id)
+        await self.store.save()
 
         return True
 
@@ -153,26 +268,17 @@ class AchievementSystem:
         channel: Optional[discord.abc.Messageable],
     ):
         """check if command triggers any achievements"""
-        for ach_id, ach_data in config.ACHIEVEMENTS.items():
-            if ach_data["trigger_type"] == "command":
-                trigger = ach_data["trigger_value"]
-
-                triggered = False
-                if isinstance(trigger, list):
-                    triggered = any(t in command for t in trigger)
-                else:
-                    triggered = command.startswith(trigger)
-
-                if triggered:
-                    await self.grant_achievement(user_id, ach_id, guild, channel)
+        user_id = str(user_id)
+        owned = self.owned_achievements(user_id)
+        triggers = self.triggers
 
-            elif ach_data["trigger_type"] == "nonzero_exit":
-                if exit_code != 0 and exit_code is not None:
-                    await self.grant_achievement(user_id, ach_id, guild, channel)
+        earned = triggers.command_achievements(command)
+        if exit_code != 0 and exit_code is not None:
+            earned += triggers.nonzero_exit
 
-            elif ach_data["trigger_type"] == "file_read":
-                if "cat" in command and ach_data["trigger_value"] in command:
-                    await self.grant_achievement(user_id, ach_id, guild, channel)
+        for ach_id in earned:
+            if ach_id not in owned:
+                self.queue_grant(user_id, ach_id, guild, channel)
 
     async def check_message_achievements(
         self,
@@ -181,77 +287,68 @@ class AchievementSystem:
         guild: discord.Guild,
         channel: discord.abc.Messageable,
     ):
-        for ach_id, ach_data in config.ACHIEVEMENTS.items():
-            if ach_data["trigger_type"] == "message_count":
-                trigger_word, count = ach_data["trigger_value"]
-                if trigger_word.lower() in content.lower():
-                    current = self.increment_message_count(user_id, trigger_word)
-                    if current >= count:
-                        await self.grant_achievement(user_id, ach_id, guild, channel)
+        user_id = str(user_id)
+
+        for key, trigger in self.triggers.message_triggers(content):
+            current = self.increment_message_count(user_id, key)
+            owned = self.owned_achievements(user_id)
+            for ach_id in reached(trigger.thresholds, current, owned):
+                self.queue_grant(user_id, ach_id, guild, channel)
 
     async def check_presence_achievements(
         self, user_id: str, presence: discord.Member, guild: discord.Guild
     ):
+        user_id = str(user_id)
         for activity in presence.activities:
             if isinstance(activity, (discord.Game, discord.Activity)):
-                name = activity.name
-                for ach_id, ach_data in config.ACHIEVEMENTS.items():
-                    if ach_data["trigger_type"] == "presence":
-                        if name in ach_data["trigger_value"]:
-                            await self.grant_achievement(
-                                str(user_id), ach_id, guild, None
-                            )
+                for ach_id in self.triggers.presence.get(activity.name, ()):
+                    if not self.has_achievement(user_id, ach_id):
+                        self.queue_grant(user_id, ach_id, guild, None)
 
     async def check_forum_achievements(
         self, user_id: str, channel_id: int, guild: discord.Guild
     ):
-        for ach_id, ach_data in config.ACHIEVEMENTS.items():
-            if ach_data["trigger_type"] == "forum_post":
-                if channel_id == ach_data["trigger_value"]:
-                    await self.grant_achievement(str(user_id), ach_id, guild, None)
+        user_id = str(user_id)
+        for ach_id in self.triggers.forum.get(channel_id, ()):
+            if not self.has_achievement(user_id, ach_id):
+                self.queue_grant(user_id, ach_id, guild, None)
 
     async def check_achievement_count(self, user_id: str, guild: discord.Guild):
         user_id = str(user_id)
-        ach_count = len(self.achievements.get(user_id, []))
+        owned = self.owned_achievements(user_id)
 
-        for ach_id, ach_data in config.ACHIEVEMENTS.items():
-            if ach_data["trigger_type"] == "achievement_count":
-                if ach_count >= ach_data["trigger_value"]:
-                    await self.grant_achievement(user_id, ach_id, guild, None)
+        for ach_id in reached(self.triggers.achievement_count, len(owned), owned):
+            self.queue_grant(user_id, ach_id, guild, None)
 
     async def check_inactivity_achievement(self, user_id: str, guild: discord.Guild):
         user_id = str(user_id)
-        last = self.get_last_message(user_id)
-
+        last = self.update_last_message(user_id)
         if not last:
-            self.update_last_message(user_id)
             return
 
-        time_since = datetime.utcnow() - last
+        time_since = time.time() - last
+        owned = self.owned_achievements(user_id)
 
-        for ach_id, ach_data in config.ACHIEVEMENTS.items():
-            if ach_data["trigger_type"] == "inactivity":
-                required_seconds = ach_data["trigger_value"]
-                if time_since.total_seconds() >= required_seconds:
-                    await self.grant_achievement(user_id, ach_id, guild, None)
-
-        self.update_last_message(user_id)
+        for ach_id in reached(self.triggers.inactivity, time_since, owned):
+            self.queue_grant(user_id, ach_id, guild, None)
 
     async def check_reaction_achievements(
         self, user_id: str, emoji: str, guild: discord.Guild
     ):
         user_id = str(user_id)
         count = self.increment_reaction_count(user_id)
-
-        for ach_id, ach_data in config.ACHIEVEMENTS.items():
-            if ach_data["trigger_type"] == "reaction_count":
-                if count >= ach_data["trigger_value"]:
-                    await self.grant_achievement(user_id, ach_id, guild, None)
-
-            elif ach_data["trigger_type"] == "specific_reaction":
-                emoji_name = emoji.name if hasattr(emoji, "name") else str(emoji)
-                if ach_data["trigger_value"] in emoji_name:
-                    await self.grant_achievement(user_id, ach_id, guild, None)
+        owned = self.owned_achievements(user_id)
+
+        earned = reached(self.triggers.reaction_count, count, owned)
+        emoji_name = emoji.name if hasattr(emoji, "name") else str(emoji)
+        earned += [
+            ach_id
+            for name, ach_id in self.triggers.specific_reaction
+            if name in emoji_name and ach_id not in owned
+        ]
+
+        for ach_id in earned:
+            self.queue_grant(user_id, ach_id, guild, None)
 
 
 _achievement_system = None
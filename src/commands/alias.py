@@ -1,32 +1,33 @@
 import discord
 from discord.ext import commands
-import json
-from pathlib import Path
+
+from src.misc import get_data_manager, is_staff
 
 
 class Alias(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.data_file = Path("data/aliases.json")
-        self.data_file.parent.mkdir(exist_ok=True)
+        self.dm = get_data_manager()
 
-        self.aliases = self.load_data()
+        self.aliases = {}
         self.logger = (
             self.bot.get_cog("Logging").logger if self.bot.get_cog("Logging") else None
         )
 
-    def load_data(self):
-        if self.data_file.exists():
-            with open(self.data_file, "r") as f:
-                return json.load(f)
-        return {}
+    async def cog_load(self):
+        self.aliases = await self.load_data()
+
+    def cog_unload(self):
+        self.dm.flush()
+
+    async def load_data(self):
+        return await self.dm.aload("aliases", {})
 
-    def save_data(self):
-        with open(self.data_file, "w") as f:
-            json.dump(self.aliases, f, indent=2)
+    async def save_data(self):
+        await self.dm.asave("aliases", self.aliases)
 
     def has_staff_role(self, member):
-        return discord.utils.get(member.roles, name="staff@hazelrun") is not None
+        return is_staff(member)
 
     def can_modify_alias(self, alias_name, user_id):
         if alias_name not in self.aliases:
@@ -115,7 +116,7 @@ class Alias(commands.Cog):
                 "creator": str(ctx.author.id),
                 "creator_name": ctx.author.name,
             }
-            self.save_data()
+            await self.save_data()
 
             await ctx.send(f"created alias {name}")
 
@@ -148,7 +149,7 @@ class Alias(commands.Cog):
                 return
 
             del self.aliases[name]
-            self.save_data()
+            await self.save_data()
 
             await ctx.send(f"removed alias {name}")
 
@@ -207,7 +208,7 @@ class Alias(commands.Cog):
                 del self.aliases[name]
                 name = new_name
 
-            self.save_data()
+            await self.save_data()
 
             await ctx.send(f"edited alias {name}")
 
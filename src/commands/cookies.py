@@ -8,6 +8,19 @@ from discord.ui.section import Section
 
 from src.achievements.utils import get_achievement_system
 from src.misc import CogHelper, get_data_manager
+from src.misc.db import CookieBalance, TableMirror, cookie_row
+from src.misc.matcher import MultiMatcher
+
+GIVE_ACHIEVEMENTS = (
+    (1, "haveacookie"),
+    (20, "haveacookietray"),
+    (100, "haveacookiemachine"),
+)
+RECEIVE_ACHIEVEMENTS = ((1, "yay"), (20, "cookietray"), (100, "cookiemachine"))
+
+THANKS = MultiMatcher(
+    ["thank you", "thanks", "thank u", "thankyou", "ty", "tysm", "thx"], words=True
+)
 
 
 class CookieGameView(LayoutView):
@@ -106,7 +119,7 @@ class CookieGameView(LayoutView):
         if user.get("cookies", 0) >= 20:
             user["cookies"] = user.get("cookies", 0) - 20
             user["factories"] = user.get("factories", 0) + 1
-            self.cookie_sys.save()
+            await self.cookie_sys.save()
             self.build_view()
             await interaction.response.edit_message(view=self)
         else:
@@ -120,7 +133,7 @@ class CookieGameView(LayoutView):
 
         if not last_collect:
             user["last_collect"] = datetime.utcnow().isoformat()
-            self.cookie_sys.save()
+            await self.cookie_sys.save()
             await interaction.response.send_message("factory started", ephemeral=True)
             return
 
@@ -135,7 +148,7 @@ class CookieGameView(LayoutView):
             earned = self.cookie_sys.apply_multiplier(base_cookies, cakes)
             user["cookies"] = user.get("cookies", 0) + earned
             user["last_collect"] = datetime.utcnow().isoformat()
-            self.cookie_sys.save()
+            await self.cookie_sys.save()
 
             await self.cookie_sys.check_receive_achievements(
                 self.author.id, interaction.guild, interaction.channel
@@ -159,10 +172,10 @@ class CookieGameView(LayoutView):
             user["cakes"] = user.get("cakes", 0) + 1
             user["factories"] = 0
             user["last_collect"] = None
-            self.cookie_sys.save()
+            await self.cookie_sys.save()
 
             if user["cakes"] == 1:
-                await self.cookie_sys.ach.grant_achievement(
+                self.cookie_sys.ach.queue_grant(
                     str(self.author.id),
                     "bakery",
                     interaction.guild,
@@ -186,7 +199,7 @@ class CookieGameView(LayoutView):
             for factory_idx in range(factories):
                 user["cookies"] = user.get("cookies", 0) + multiplier * (1 + cakes)
 
-            self.cookie_sys.save()
+            await self.cookie_sys.save()
             self.build_view()
             await interaction.response.edit_message(view=self)
         else:
@@ -197,7 +210,7 @@ class CookieGameView(LayoutView):
 
         if user.get("cookies", 0) > 0:
             user["cookies"] = user.get("cookies", 0) - 1
-            self.cookie_sys.save()
+            await self.cookie_sys.save()
             self.build_view()
             await interaction.response.edit_message(view=self)
         else:
@@ -222,7 +235,7 @@ class CookieGameView(LayoutView):
 
         user["cookies"] = user.get("cookies", 0) + 1
         user["last_bake"] = datetime.utcnow().isoformat()
-        self.cookie_sys.save()
+        await self.cookie_sys.save()
         self.build_view()
         await interaction.response.edit_message(view=self)
 
@@ -249,10 +262,18 @@ class Cookies(CogHelper, commands.Cog):
         super().__init__(bot)
         self.dm = get_data_manager()
         self.ach = get_achievement_system()
-        self.data = self.dm.load("cookies", {})
+        self.data = {}
+        # indexed copy of the balances for the leaderboard
+        self.table = TableMirror(CookieBalance, self._balance_rows)
+
+    def _balance_rows(self, user_id):
+        user = self.data.get(user_id)
+        return [cookie_row(user_id, user)] if user else []
 
     def get_user_data(self, user_id):
         uid = str(user_id)
+        # callers mutate what they get, so the next save mirrors this user
+        self.table.mark(uid)
         if uid not in self.data:
             self.data[uid] = {
                 "cookies": 0,
@@ -268,8 +289,17 @@ class Cookies(CogHelper, commands.Cog):
     def apply_multiplier(self, base, cakes):
         return base + cakes * base
 
-    def save(self):
-        self.dm.save("cookies", self.data)
+    async def cog_load(self):
+        self.data = await self.dm.aload("cookies", {})
+        await self.table.seed(list(self.data))
+
+    async def save(self):
+        await self.dm.asave("cookies", self.data)
+        await self.table.write()
+
+    def cog_unload(self):
+        self.table.write_now()
+        self.dm.flush()
 
     async def give_cookie(self, giver_id, receiver_id, amount, guild, channel):
         if giver_id == receiver_id:
@@ -284,51 +314,41 @@ class Cookies(CogHelper, commands.Cog):
         giver["cookies"] = giver.get("cookies", 0) - amount
         receiver["cookies"] = receiver.get("cookies", 0) + amount
         receiver["received"] = receiver.get("received", 0) + amount
-        self.save()
+        await self.save()
 
         await self.check_receive_achievements(receiver_id, guild, channel)
         return True
 
-    async def reward_cookie(self, user_id, amount, guild, channel):
+    def add_reward(self, user_id, amount):
+        """credit cookies with the cake multiplier, the caller saves"""
         user = self.get_user_data(user_id)
-        cakes = user.get("cakes", 0)
-        multiplied = self.apply_multiplier(amount, cakes)
+        multiplied = self.apply_multiplier(amount, user.get("cakes", 0))
         user["cookies"] = user.get("cookies", 0) + multiplied
         user["received"] = user.get("received", 0) + multiplied
-        self.save()
+        return multiplied
+
+    async def reward_cookie(self, user_id, amount, guild, channel):
+        multiplied = self.add_reward(user_id, amount)
+        await self.save()
 
         await self.check_receive_achievements(user_id, guild, channel)
         return multiplied
 
-    async def check_give_achievements(self, user_id, guild, channel):
-        user = self.get_user_data(user_id)
-        given = user.get("given", 0)
+    def give_achievements(self, user_id):
+        given = self.get_user_data(user_id).get("given", 0)
+        return [ach_id for count, ach_id in GIVE_ACHIEVEMENTS if given >= count]
 
-        if given >= 1:
-            await self.ach.grant_achievement(
-                str(user_id), "haveacookie", guild, channel
-            )
-        if given >= 20:
-            await self.ach.grant_achievement(
-                str(user_id), "haveacookietray", guild, channel
-            )
-        if given >= 100:
-            await self.ach.grant_achievement(
-                str(user_id), "haveacookiemachine", guild, channel
-            )
+    def receive_achievements(self, user_id):
+        received = self.get_user_data(user_id).get("received", 0)
+        return [ach_id for count, ach_id in RECEIVE_ACHIEVEMENTS if received >= count]
+
+    async def check_give_achievements(self, user_id, guild, channel):
+        for ach_id in self.give_achievements(user_id):
+            self.ach.queue_grant(str(user_id), ach_id, guild, channel)
 
     async def check_receive_achievements(self, user_id, guild, channel):
-        user = self.get_user_data(user_id)
-        received = user.get("received", 0)
-
-        if received >= 1:
-            await self.ach.grant_achievement(str(user_id), "yay", guild, channel)
-        if received >= 20:
-            await self.ach.grant_achievement(str(user_id), "cookietray", guild, channel)
-        if received >= 100:
-            await self.ach.grant_achievement(
-                str(user_id), "cookiemachine", guild, channel
-            )
+        for ach_id in self.receive_achievements(user_id):
+            self.ach.queue_grant(str(user_id), ach_id, guild, channel)
 
     @commands.Cog.listener()
     async def on_message(self, message):
@@ -338,10 +358,7 @@ class Cookies(CogHelper, commands.Cog):
         if not message.mentions:
             return
 
-        content = message.content.lower()
-        thanks = ["thank you", "thanks", "thank u", "thankyou", "ty", "thx"]
-
-        if not any(t in content for t in thanks):
+        if not THANKS.search(message.content):
             return
 
         for mention in message.mentions:
@@ -352,7 +369,7 @@ class Cookies(CogHelper, commands.Cog):
 
             giver = self.get_user_data(message.author.id)
             giver["given"] = giver.get("given", 0) + 1
-            self.save()
+            await self.save()
 
             await self.check_give_achievements(
                 message.author.id, message.guild, message.channel
@@ -1,7 +1,7 @@
 import discord
 from discord.ext import commands
 
-from src.misc import CogHelper, get_data_manager, safe_dm
+from src.misc import CogHelper, get_data_manager, has_role, safe_dm
 
 CATEGORIES = ["installation", "troubleshooting", "configuration", "misc"]
 
@@ -112,15 +112,21 @@ class Guides(CogHelper, commands.Cog):
     def __init__(self, bot):
         super().__init__(bot)
         self.dm = get_data_manager()
-        self.data = self.dm.load("guides", {})
+        self.data = {}
         self.guide_channel_id = 1429678741633634346
         self.pending_guides = {}
 
-    def save(self):
-        self.dm.save("guides", self.data)
+    async def cog_load(self):
+        self.data = await self.dm.aload("guides", {})
+
+    async def save(self):
+        await self.dm.asave("guides", self.data)
+
+    def cog_unload(self):
+        self.dm.flush()
 
     def has_guide_role(self, member):
-        if discord.utils.get(member.roles, name="guide@hazelrun"):
+        if has_role(member, "guide@hazelrun"):
             return True
         if member.guild_permissions.administrator:
             return True
@@ -304,7 +310,7 @@ class Guides(CogHelper, commands.Cog):
             pass
 
         del self.data[name_key]
-        self.save()
+        await self.save()
 
         await self.update_guide_list(ctx.guild)
         await ctx.send(f"removed guide: {guide['name']}")
@@ -381,7 +387,7 @@ class Guides(CogHelper, commands.Cog):
                 "attachments": view.attachments,
                 "citations": view.citations,
             }
-            self.save()
+            await self.save()
 
             await self.update_guide_list(guild)
             await safe_dm(author, f"created guide: {display_name}")
@@ -428,7 +434,7 @@ class Guides(CogHelper, commands.Cog):
                 self.data[name_key]["messages"] = view.guide_messages
                 self.data[name_key]["attachments"] = view.attachments
                 self.data[name_key]["citations"] = view.citations
-                self.save()
+                await self.save()
 
                 await self.update_guide_list(guild)
                 await safe_dm(author, f"updated guide: {display_name}")
@@ -509,11 +515,11 @@ guides can be about installing an operating system, configuring a software, or f
             else:
                 msg = await channel.send(view=view)
                 self.data["_list_message_id"] = msg.id
-                self.save()
+                await self.save()
         except:
             msg = await channel.send(view=view)
             self.data["_list_message_id"] = msg.id
-            self.save()
+            await self.save()
 
     @commands.command(name="gn")
     async def gn_alias(self, ctx, *, name: str):
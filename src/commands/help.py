@@ -19,7 +19,9 @@ class Help(commands.Cog):
         msg += "**shell**\n"
         msg += f"`>connect` - connect to {config.NAME}\n"
         msg += "`>hzsh` - run the shell\n"
-        msg += "`>fetch [--os|--kernel|--host|--uptime|--cpu|--memory|--disk|--user|--stats|--all]`\n\n"
+        msg += "`>put [path]` - upload attached files to your home\n"
+        msg += "`>get [path]` - download a file from your home\n"
+        msg += "`>fetch [--os|--kernel|--host|--uptime|--cpu|--memory|--disk|--user|--stats|--status|--history|--all]`\n\n"
 
         msg += "**wiki**\n"
         msg += "`>aw|gw|man [query]` - linux wiki or manual\n"
@@ -49,6 +51,9 @@ class Help(commands.Cog):
 
         msg += "**social**\n"
         msg += "`>achievements -a|-v` - view achievements\n"
+        msg += "`>achievements stats` - how many members hold each achievement\n"
+        if is_staff(ctx.author):
+            msg += "`>achievements backfill {status}` - count message history\n"
         msg += '`>alias [-a|-r|-e|-L] [-n name] [-c "content"]` - manage aliases\n'
 
         await ctx.send(msg)
@@ -3,15 +3,18 @@ from discord.ext import commands
 import config
 import re
 
+from src.misc import find_role, get_role_index, has_role
+
 
 class UserMod(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
     async def get_user_color_role(self, member):
-        for role in member.roles:
-            if role.name.startswith(f"# {member.name} / "):
-                return role
+        prefix = f"# {member.name} / "
+        for name in get_role_index().role_names(member):
+            if name.startswith(prefix):
+                return find_role(member.guild, name)
         return None
 
     @commands.command(name="usermod", aliases=["um", "hazelprofile", "hzpf", "chfn"])
@@ -54,7 +57,7 @@ class UserMod(commands.Cog):
                 await member.remove_roles(old_role)
                 await old_role.delete(reason="replacing with new color")
 
-            marker = discord.utils.get(guild.roles, name="colors:")
+            marker = find_role(guild, "colors:")
             if not marker:
                 await ctx.send("colors marker role not found")
                 return
@@ -91,27 +94,27 @@ class UserMod(commands.Cog):
 
         role_name = config.USERMOD_MAPPINGS[category][value_lower]
 
+        held = get_role_index().role_names(member)
         existing_roles = [
-            role
-            for role in member.roles
-            if role.name in config.USERMOD_MAPPINGS[category].values()
+            find_role(guild, name)
+            for name in set(config.USERMOD_MAPPINGS[category].values()) & held
         ]
 
-        target_role = discord.utils.get(guild.roles, name=role_name)
+        target_role = find_role(guild, role_name)
 
         if not target_role:
             await ctx.send(f"role {role_name} not found")
             return
 
         if remove_mode:
-            if target_role in member.roles:
+            if has_role(member, role_name):
                 await member.remove_roles(target_role)
                 await ctx.send(f"removed {role_name}")
             else:
                 await ctx.send(f"you dont have the {role_name} role")
             return
 
-        if target_role in member.roles:
+        if has_role(member, role_name):
             await ctx.send(f"you already have the {role_name} role")
             return
 
@@ -1,13 +1,15 @@
+from .roles import Capability, RoleIndex, get_role_index
 from .data import DataManager, get_data_manager
 from .utils import (
     has_role, is_staff, is_mod, is_root,
-    has_shell_access, get_or_create_role,
+    has_shell_access, find_role, get_or_create_role,
     get_logger, CogHelper, safe_send, safe_dm,
 )
 
 __all__ = [
     "DataManager", "get_data_manager",
     "has_role", "is_staff", "is_mod", "is_root",
-    "has_shell_access", "get_or_create_role",
+    "has_shell_access", "find_role", "get_or_create_role",
+    "Capability", "RoleIndex", "get_role_index",
     "get_logger", "CogHelper", "safe_send", "safe_dm",
 ]
@@ -1,75 +1,288 @@
+import asyncio
+import atexit
 import json
+import os
+from collections.abc import MutableMapping
 from pathlib import Path
 from threading import Lock
 from typing import Any, Dict, Optional
 
+import config
+
+
+class JSONEngine:
+    """one json file per data file, rewritten whole on every flush"""
+
+    full_snapshots = True
+
+    def __init__(self, data_dir: Path):
+        self.data_dir = data_dir
+
+    def read(self, filename: str) -> Any:
+        file_path = self.data_dir / f"{filename}.json"
+        if not file_path.exists():
+            return None
+        try:
+            with open(file_path, "r") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, IOError):
+            return None
+
+    def wrap(self, filename: str, data: Any) -> Any:
+        return data
+
+    def snapshot(self, filename: str, data: Any) -> str:
+        # compact output goes through the c encoder, indent falls back to python
+        return json.dumps(data, separators=(",", ":"))
+
+    def write(self, filename: str, payload: str) -> bool:
+        """atomically replace the file"""
+        file_path = self.data_dir / f"{filename}.json"
+        tmp_path = file_path.with_suffix(".json.tmp")
+        try:
+            with open(tmp_path, "w") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, file_path)
+            return True
+        except OSError:
+            return False
+
 
 class DataManager:
-    """centralized data management for all json files"""
+    """centralized data management for all json files
+
+    once `start` is called saves are write-behind: files are marked dirty and
+    a background flusher writes them every `flush_interval` seconds, or
+    sooner after `flush_after` mutations. before that (and in scripts that
+    never start it) saves write through immediately.
+    """
 
-    def __init__(self, data_dir: str = "data"):
+    def __init__(
+        self,
+        data_dir: str = "data",
+        flush_interval: float = 5.0,
+        flush_after: int = 50,
+        engine: str = "json",
+    ):
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(exist_ok=True)
 
+        if engine == "sqlite":
+            from src.misc.kvstore import SQLiteEngine
+
+            self.engine = SQLiteEngine(str(self.data_dir / "data.db"))
+        elif engine == "journal":
+            from src.misc.journal import JournalEngine
+
+            self.engine = JournalEngine(self.data_dir)
+        else:
+            self.engine = JSONEngine(self.data_dir)
+
+        self.flush_interval = flush_interval
+        self.flush_after = flush_after
+
         self._cache = {}
         self._locks = {}
+        self._alocks = {}
         self._autosave_tasks = {}
 
+        self._dirty = {}
+        self._seq = {}
+        self._persisted = {}
+        self._flusher = None
+        self._wake = None
+
+        atexit.register(self.flush)
+
     def _get_lock(self, filename: str) -> Lock:
         """get or create a lock for a specific file"""
-        if filename not in self._locks:
-            self._locks[filename] = Lock()
-        return self._locks[filename]
+        # setdefault so the loop and flusher threads never race on creation
+        return self._locks.setdefault(filename, Lock())
+
+    def _read(self, filename: str, default: Any) -> Any:
+        with self._get_lock(filename):
+            data = self.engine.read(filename)
+            if data is None:
+                data = self.engine.wrap(filename, default if default is not None else {})
+            return data
+
+    def _get_alock(self, filename: str) -> asyncio.Lock:
+        return self._alocks.setdefault(filename, asyncio.Lock())
 
     def load(self, filename: str, default: Any = None) -> Any:
-        """load data from json file with caching"""
+        """load data with caching, values are read lazily by the sqlite engine"""
+        if filename not in self._cache:
+            self._cache[filename] = self._read(filename, default)
+        return self._cache[filename]
+
+    async def aload(self, filename: str, default: Any = None) -> Any:
+        """load without blocking the event loop, reading in a worker thread"""
         if filename in self._cache:
             return self._cache[filename]
 
-        file_path = self.data_dir / f"{filename}.json"
+        async with self._get_alock(filename):
+            if filename not in self._cache:
+                data = await asyncio.to_thread(self._read, filename, default)
+                self._cache.setdefault(filename, data)
+        return self._cache[filename]
 
-        with self._get_lock(filename):
-            if not file_path.exists():
-                self._cache[filename] = default if default is not None else {}
-                return self._cache[filename]
+    def _mark(self, filename: str, data: Any) -> Optional[bool]:
+        """record a mutation, returns True if the flusher will write it"""
+        if data is not None:
+            self._cache[filename] = self.engine.wrap(filename, data)
+        elif filename not in self._cache:
+            return None
 
-            try:
-                with open(file_path, "r") as f:
-                    data = json.load(f)
-                    self._cache[filename] = data
-                    return data
-            except (json.JSONDecodeError, IOError):
-                self._cache[filename] = default if default is not None else {}
-                return self._cache[filename]
+        self._seq[filename] = self._seq.get(filename, 0) + 1
+
+        if (
+            self._flusher is None
+            or self._flusher.done()
+            or getattr(self.engine, "write_through", False)
+        ):
+            return False
+
+        self._dirty[filename] = self._dirty.get(filename, 0) + 1
+        if self._dirty[filename] >= self.flush_after:
+            self._wake.set()
+        return True
 
     def save(self, filename: str, data: Any = None) -> bool:
-        """save data to json file"""
-        if data is not None:
-            self._cache[filename] = data
-        elif filename not in self._cache:
+        """save data, deferred while the flusher is running"""
+        deferred = self._mark(filename, data)
+        if deferred is None:
             return False
+        if deferred:
+            return True
+        return self._write_or_requeue(filename, *self._serialize(filename))
 
-        file_path = self.data_dir / f"{filename}.json"
+    async def asave(self, filename: str, data: Any = None) -> bool:
+        """save data, serializing and writing in a worker thread"""
+        deferred = self._mark(filename, data)
+        if deferred is None:
+            return False
+        if deferred:
+            return True
+        return await self._aflush_file(filename)
 
-        with self._get_lock(filename):
+    def start(self):
+        """start the background flusher, must be called from the event loop"""
+        if self._flusher is None or self._flusher.done():
+            self._wake = asyncio.Event()
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    def stop(self):
+        """stop the flusher and write everything still dirty"""
+        if self._flusher:
+            self._flusher.cancel()
+            self._flusher = None
+        self.flush()
+
+    def flush(self) -> bool:
+        """synchronously write all dirty files"""
+        ok = True
+        for filename in list(self._dirty):
+            self._dirty.pop(filename, None)
+            ok = self._write_or_requeue(filename, *self._serialize(filename)) and ok
+        return ok
+
+    async def _flush_loop(self):
+        while True:
             try:
-                with open(file_path, "w") as f:
-                    json.dump(self._cache[filename], f, indent=2)
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            for filename in list(self._dirty):
+                self._dirty.pop(filename, None)
+                await self._aflush_file(filename)
+
+            if hasattr(self.engine, "needs_compaction"):
+                for filename in list(self._cache):
+                    if self.engine.needs_compaction(filename):
+                        await self._compact(filename)
+
+    async def _aflush_file(self, filename: str) -> bool:
+        seq = self._seq.get(filename, 0)
+        data = self._cache[filename]
+
+        # encode on the loop so the snapshot is one consistent state, only the
+        # finished payload goes to the thread for the slow write and fsync
+        payload = self.engine.snapshot(filename, data)
+
+        async with self._get_alock(filename):
+            ok = await asyncio.to_thread(self._write, filename, seq, payload)
+        if not ok:
+            self._requeue(filename, payload)
+        return ok
+
+    def _write_or_requeue(self, filename: str, seq: int, payload: Any) -> bool:
+        if self._write(filename, seq, payload):
+            return True
+        self._requeue(filename, payload)
+        return False
+
+    def _requeue(self, filename: str, payload: Any):
+        """keep the changes of a failed write for the next flush, on the loop"""
+        data = self._cache.get(filename)
+        if hasattr(data, "requeue"):
+            # delta engines already handed these changes over, take them back
+            data.requeue(payload)
+        self._dirty[filename] = self._dirty.get(filename, 0) + 1
+
+    def _serialize(self, filename: str) -> tuple:
+        return self._seq.get(filename, 0), self.engine.snapshot(
+            filename, self._cache[filename]
+        )
+
+    def _write(self, filename: str, seq: int, payload: Any) -> bool:
+        """write a snapshot, skipping full snapshots older than what's on disk"""
+        with self._get_lock(filename):
+            if (
+                self.engine.full_snapshots
+                and seq
+                and self._persisted.get(filename, 0) >= seq
+            ):
                 return True
-            except IOError:
+            if not self.engine.write(filename, payload):
                 return False
+            self._persisted[filename] = seq
+            return True
+
+    async def _compact(self, filename: str) -> bool:
+        """fold the journal into a new snapshot
+
+        the data is encoded on the loop along with how much of the journal
+        it covers. the thread writes the snapshot without the file lock, saves
+        keep appending meanwhile, and only the journal after that point is
+        kept. replaying what was dropped over the snapshot is harmless, the
+        records are absolute puts.
+        """
+        payload = json.dumps(self._cache[filename].to_dict(), separators=(",", ":"))
+        offset = self.engine.journal_size(filename)
+        return await asyncio.to_thread(self._write_compacted, filename, payload, offset)
+
+    def _write_compacted(self, filename: str, payload: str, offset: int) -> bool:
+        if not self.engine.compact(filename, payload):
+            return False
+        # appends only wait for the copy of the short journal tail
+        with self._get_lock(filename):
+            return self.engine.trim(filename, offset)
 
     def get(self, filename: str, key: str, default: Any = None) -> Any:
         """get a specific key from a data file"""
         data = self.load(filename)
-        if isinstance(data, dict):
+        if isinstance(data, MutableMapping):
             return data.get(key, default)
         return default
 
     def set(self, filename: str, key: str, value: Any) -> bool:
         """set a specific key in a data file"""
         data = self.load(filename)
-        if isinstance(data, dict):
+        if isinstance(data, MutableMapping):
             data[key] = value
             return self.save(filename)
         return False
@@ -77,7 +290,7 @@ class DataManager:
     def delete_key(self, filename: str, key: str) -> bool:
         """delete a specific key from a data file"""
         data = self.load(filename)
-        if isinstance(data, dict) and key in data:
+        if isinstance(data, MutableMapping) and key in data:
             del data[key]
             return self.save(filename)
         return False
@@ -85,7 +298,7 @@ class DataManager:
     def append(self, filename: str, key: str, value: Any) -> bool:
         """append to a list in a data file"""
         data = self.load(filename)
-        if isinstance(data, dict):
+        if isinstance(data, MutableMapping):
             if key not in data:
                 data[key] = []
             if isinstance(data[key], list):
@@ -96,7 +309,7 @@ class DataManager:
     def increment(self, filename: str, key: str, amount: int = 1) -> int:
         """increment a numeric value in a data file"""
         data = self.load(filename)
-        if isinstance(data, dict):
+        if isinstance(data, MutableMapping):
             if key not in data:
                 data[key] = 0
             if isinstance(data[key], (int, float)):
@@ -124,5 +337,5 @@ def get_data_manager() -> DataManager:
     """get or create the global data manager instance"""
     global _data_manager
     if _data_manager is None:
-        _data_manager = DataManager()
+        _data_manager = DataManager(engine=config.DATA_ENGINE)
     return _data_manager
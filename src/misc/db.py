@@ -1,21 +1,39 @@
+import argparse
+import asyncio
+import json
+import logging
+import threading
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from alembic import command
+from alembic.config import Config as AlembicConfig
 from sqlalchemy import (
     BigInteger,
     Boolean,
     Column,
     DateTime,
+    Index,
     Integer,
     String,
     Text,
     create_engine,
+    delete,
+    func,
+    insert,
+    inspect,
+    select,
 )
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import scoped_session, sessionmaker
 
+log = logging.getLogger("discord_bot")
+
 Base = declarative_base()
 
+MIGRATIONS_DIR = Path(__file__).resolve().parents[2] / "migrations"
+
 
 class Infraction(Base):
     __tablename__ = "infractions"
@@ -176,6 +194,65 @@ class ModerationConfig(Base):
         }
 
 
+class CookieBalance(Base):
+    """cookie economy state per user"""
+
+    __tablename__ = "cookie_balances"
+
+    user_id = Column(BigInteger, primary_key=True)
+
+    cookies = Column(Integer, nullable=False, default=0, index=True)
+    cakes = Column(Integer, nullable=False, default=0)
+    given = Column(Integer, nullable=False, default=0)
+    received = Column(Integer, nullable=False, default=0)
+    factories = Column(Integer, nullable=False, default=0)
+
+    last_collect = Column(DateTime, nullable=True)
+    last_bake = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<CookieBalance user={self.user_id} cookies={self.cookies}>"
+
+
+class UserAchievement(Base):
+    """one unlocked achievement, keyed by (user, achievement)"""
+
+    __tablename__ = "user_achievements"
+    __table_args__ = (
+        # rarity stats count holders per achievement
+        Index("ix_user_achievements_achievement_id", "achievement_id"),
+    )
+
+    user_id = Column(BigInteger, primary_key=True)
+    achievement_id = Column(String(64), primary_key=True)
+
+    position = Column(Integer, nullable=False)  # unlock order for the user
+    unlocked_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<UserAchievement {self.achievement_id} for {self.user_id}>"
+
+
+class UserCounter(Base):
+    """per-user counters, `word_<word>` for trigger words and `reactions`"""
+
+    __tablename__ = "user_counters"
+    __table_args__ = (Index("ix_user_counters_counter_count", "counter", "count"),)
+
+    user_id = Column(BigInteger, primary_key=True)
+    counter = Column(String(100), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class Profile(Base):
+    __tablename__ = "profiles"
+
+    user_id = Column(BigInteger, primary_key=True)
+
+    bio = Column(String(200), nullable=True)
+    last_message_at = Column(DateTime, nullable=True)
+
+
 class Database:
     def __init__(self, database_url="sqlite:///data/hazelrun.db"):
         Path("data").mkdir(exist_ok=True)
@@ -186,8 +263,6 @@ class Database:
             pool_pre_ping=True,
         )
 
-        Base.metadata.create_all(self.engine)
-
         session_factory = sessionmaker(bind=self.engine)
         self.Session = scoped_session(session_factory)
 
@@ -199,15 +274,38 @@ class Database:
         """close a database session"""
         session.close()
 
+    def _alembic_config(self):
+        cfg = AlembicConfig()
+        cfg.set_main_option("script_location", str(MIGRATIONS_DIR))
+        return cfg
+
+    def upgrade(self, revision="head"):
+        """run alembic migrations up to revision"""
+        cfg = self._alembic_config()
+
+        with self.engine.begin() as conn:
+            cfg.attributes["connection"] = conn
+            tables = inspect(conn).get_table_names()
+            if "alembic_version" not in tables and "infractions" in tables:
+                # created by create_all before there were migrations
+                command.stamp(cfg, "0001")
+            command.upgrade(cfg, revision)
+
 
 _db = None
+_db_lock = threading.Lock()
 
 
 def get_database():
     """get or create database instance"""
     global _db
-    if _db is None:
-        _db = Database()
+    # mirror writes can get here from worker threads
+    with _db_lock:
+        if _db is None:
+            database = Database()
+            # stamps a schema made by create_all before migrations, then upgrades
+            database.upgrade()
+            _db = database
     return _db
 
 
@@ -215,6 +313,276 @@ def get_session():
     return get_database().get_session()
 
 
+def cookie_leaderboard(session, limit=10, offset=0):
+    """(user_id, cookies) ranked by balance"""
+    return session.execute(
+        select(CookieBalance.user_id, CookieBalance.cookies)
+        .order_by(CookieBalance.cookies.desc(), CookieBalance.user_id)
+        .limit(limit)
+        .offset(offset)
+    ).all()
+
+
+def cookie_rank(session, user_id):
+    """1-based leaderboard position of a user, None if they have no balance"""
+    cookies = session.scalar(
+        select(CookieBalance.cookies).where(CookieBalance.user_id == user_id)
+    )
+    if cookies is None:
+        return None
+    ahead = session.scalar(
+        select(func.count()).where(
+            (CookieBalance.cookies > cookies)
+            | ((CookieBalance.cookies == cookies) & (CookieBalance.user_id < user_id))
+        )
+    )
+    return ahead + 1
+
+
+def cookie_ranked_users(session):
+    return session.scalar(select(func.count()).select_from(CookieBalance))
+
+
+def achievement_holders(session):
+    """{achievement_id: number of users who have it}"""
+    return dict(
+        session.execute(
+            select(UserAchievement.achievement_id, func.count()).group_by(
+                UserAchievement.achievement_id
+            )
+        ).all()
+    )
+
+
+def achievement_population(session):
+    """users with at least one achievement"""
+    return session.scalar(select(func.count(func.distinct(UserAchievement.user_id))))
+
+
+def user_achievements(session, user_id):
+    """achievement ids of a user in unlock order"""
+    return session.scalars(
+        select(UserAchievement.achievement_id)
+        .where(UserAchievement.user_id == user_id)
+        .order_by(UserAchievement.position)
+    ).all()
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.utcfromtimestamp(value)
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _user_rows(data):
+    """(user_id, value) pairs, skipping keys that aren't user ids"""
+    for user_id, value in data.items():
+        if str(user_id).isdigit():
+            yield int(user_id), value
+
+
+def cookie_row(user_id, user):
+    return {
+        "user_id": int(user_id),
+        "cookies": int(user.get("cookies", 0)),
+        "cakes": int(user.get("cakes", 0)),
+        "given": int(user.get("given", 0)),
+        "received": int(user.get("received", 0)),
+        "factories": int(user.get("factories", 0)),
+        "last_collect": _parse_time(user.get("last_collect")),
+        "last_bake": _parse_time(user.get("last_bake")),
+    }
+
+
+def achievement_rows(user_id, unlocked):
+    """rows for (achievement id, unlock time) pairs in unlock order"""
+    return [
+        {
+            "user_id": int(user_id),
+            "achievement_id": ach_id,
+            "position": position,
+            "unlocked_at": _parse_time(unlocked_at),
+        }
+        for position, (ach_id, unlocked_at) in enumerate(unlocked)
+    ]
+
+
+def counter_rows(user_id, counts):
+    return [
+        {"user_id": int(user_id), "counter": counter, "count": count}
+        for counter, count in counts.items()
+    ]
+
+
+def profile_row(user_id, bio=None, last_message=None):
+    return {
+        "user_id": int(user_id),
+        "bio": bio,
+        "last_message_at": _parse_time(last_message),
+    }
+
+
+def replace_user_rows(model, user_ids, rows, database=None, batch_size=1000):
+    """rewrite the rows of some users in one transaction"""
+    database = database or get_database()
+    user_ids = [int(user_id) for user_id in user_ids]
+
+    with database.engine.begin() as conn:
+        for i in range(0, len(user_ids), 500):
+            conn.execute(delete(model).where(model.user_id.in_(user_ids[i : i + 500])))
+        for i in range(0, len(rows), batch_size):
+            conn.execute(insert(model), rows[i : i + batch_size])
+
+
+def has_rows(model, database=None):
+    database = database or get_database()
+    with database.engine.connect() as conn:
+        return conn.execute(select(model.user_id).limit(1)).first() is not None
+
+
+_mirror_lock = None
+
+
+class TableMirror:
+    """keeps one of the user tables in step with DataManager data
+
+    DataManager stays the source of truth, the table only serves indexed
+    reads. owners `mark` the users they change and `write` after saving;
+    rows are built on the loop and written from a worker thread, one write
+    at a time so an older one never lands last. `rows(user_id)` returns
+    the user's current rows, empty once they have none.
+    """
+
+    def __init__(self, model, rows):
+        self.model = model
+        self.rows = rows
+        self.changed = set()
+
+    def mark(self, *user_ids):
+        self.changed.update(u for u in user_ids if str(u).isdigit())
+
+    def _take(self):
+        changed, self.changed = self.changed, set()
+        return changed, [row for user_id in changed for row in self.rows(user_id)]
+
+    async def write(self) -> bool:
+        global _mirror_lock
+        if not self.changed:
+            return True
+        if _mirror_lock is None:
+            _mirror_lock = asyncio.Lock()
+
+        changed, rows = self._take()
+        async with _mirror_lock:
+            try:
+                await asyncio.to_thread(replace_user_rows, self.model, changed, rows)
+                return True
+            except SQLAlchemyError as e:
+                log.warning(f"could not update {self.model.__tablename__}: {e}")
+                self.changed |= changed
+                return False
+
+    def write_now(self) -> bool:
+        """blocking write, for shutdown"""
+        if not self.changed:
+            return True
+        changed, rows = self._take()
+        try:
+            replace_user_rows(self.model, changed, rows)
+            return True
+        except SQLAlchemyError as e:
+            log.warning(f"could not update {self.model.__tablename__}: {e}")
+            self.changed |= changed
+            return False
+
+    async def seed(self, user_ids) -> bool:
+        """fill the table from scratch if it is still empty"""
+        try:
+            if await asyncio.to_thread(has_rows, self.model):
+                return True
+        except SQLAlchemyError as e:
+            log.warning(f"could not read {self.model.__tablename__}: {e}")
+            return False
+        self.mark(*user_ids)
+        return await self.write()
+
+
+def _load_json(data_dir, filename):
+    try:
+        with open(Path(data_dir) / f"{filename}.json", "r") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def import_user_data(data_dir="data", database=None, batch_size=1000):
+    """replace the user data tables with the contents of the json files
+
+    runs in a single transaction, so a failed import leaves the tables as
+    they were. returns the number of rows written per table.
+    """
+    database = database or get_database()
+
+    cookies = [
+        cookie_row(user_id, user)
+        for user_id, user in _user_rows(_load_json(data_dir, "cookies"))
+        if isinstance(user, dict)
+    ]
+
+    achievements = []
+    positions = _load_json(data_dir, "achievement_bits")
+    bits = {bit: ach_id for ach_id, bit in positions.items()}
+    unlocks = _load_json(data_dir, "achievement_unlocks")
+    if unlocks:
+        for user_id, entries in _user_rows(unlocks):
+            achievements += achievement_rows(
+                user_id, [(bits[bit], at) for bit, at in entries or []]
+            )
+    else:
+        # lists of ids from before ownership moved to bitsets
+        for user_id, ach_ids in _user_rows(_load_json(data_dir, "achievements")):
+            # dict.fromkeys drops duplicates but keeps unlock order
+            achievements += achievement_rows(
+                user_id, [(ach_id, None) for ach_id in dict.fromkeys(ach_ids or [])]
+            )
+
+    counters = []
+    for user_id, counts in _user_rows(_load_json(data_dir, "message_counts")):
+        counters += counter_rows(user_id, counts or {})
+    for user_id, count in _user_rows(_load_json(data_dir, "reaction_counts")):
+        counters += counter_rows(user_id, {"reactions": count})
+
+    profiles = {}
+    for user_id, profile in _user_rows(_load_json(data_dir, "profiles")):
+        if isinstance(profile, dict):
+            profiles[user_id] = profile_row(user_id, profile.get("bio"))
+    for user_id, last in _user_rows(_load_json(data_dir, "last_message")):
+        profiles.setdefault(user_id, profile_row(user_id))
+        profiles[user_id]["last_message_at"] = _parse_time(last)
+    profiles = list(profiles.values())
+
+    tables = {
+        CookieBalance: cookies,
+        UserAchievement: achievements,
+        UserCounter: counters,
+        Profile: profiles,
+    }
+
+    with database.engine.begin() as conn:
+        for model, rows in tables.items():
+            conn.execute(delete(model))
+            for i in range(0, len(rows), batch_size):
+                conn.execute(insert(model), rows[i : i + batch_size])
+
+    return {model.__tablename__: len(rows) for model, rows in tables.items()}
+
+
 def parse_duration(duration_str):
     if not duration_str:
         return None
@@ -275,3 +643,23 @@ def get_expiry_time(duration_seconds):
     if duration_seconds is None:
         return None
     return datetime.utcnow() + timedelta(seconds=duration_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="db")
+    parser.add_argument("--url", default="sqlite:///data/hazelrun.db")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("upgrade", help="apply pending migrations")
+    imp = sub.add_parser("import", help="import user data from data/*.json")
+    imp.add_argument("--data", default="data")
+    args = parser.parse_args()
+
+    database = Database(args.url)
+    database.upgrade()
+    if args.command == "import":
+        for table, rows in import_user_data(args.data, database).items():
+            print(f"{table}: {rows} rows")
+
+
+if __name__ == "__main__":
+    main()
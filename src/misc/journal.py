@@ -0,0 +1,174 @@
+"""append-only journal storage engine for DataManager
+
+each data file is a json snapshot (`<name>.json`, same format as the json
+engine) plus a journal of changes since that snapshot (`<name>.journal`).
+every save appends one line holding its changed top-level keys and
+fsyncs, so a write costs the size of the change and survives a crash
+whole or not at all. loading replays the journal over the snapshot; once
+the journal grows past `compact_bytes` the flusher writes a fresh
+snapshot and trims what it covers.
+
+journal lines:
+    ["p", key, value]   put a top-level key
+    ["d", key]          delete a top-level key
+    ["r"]               clear everything (the whole file was replaced)
+    ["b", [records]]    several of the above from one save
+"""
+
+import json
+import os
+import shutil
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Optional
+
+from src.misc.kvstore import RecordDict
+
+
+class JournalEngine:
+    full_snapshots = False
+    write_through = True
+
+    def __init__(self, data_dir: Path, compact_bytes: int = 4 * 1024 * 1024):
+        self.data_dir = Path(data_dir)
+        self.compact_bytes = compact_bytes
+        self._sizes = {}
+
+    def _snapshot_path(self, filename: str) -> Path:
+        return self.data_dir / f"{filename}.json"
+
+    def _journal_path(self, filename: str) -> Path:
+        return self.data_dir / f"{filename}.journal"
+
+    def read(self, filename: str) -> Optional[RecordDict]:
+        snapshot_path = self._snapshot_path(filename)
+        journal_path = self._journal_path(filename)
+
+        if not snapshot_path.exists() and not journal_path.exists():
+            self._sizes[filename] = 0
+            return None
+
+        data = {}
+        if snapshot_path.exists():
+            try:
+                with open(snapshot_path, "r") as f:
+                    data = json.load(f)
+            except (json.JSONDecodeError, IOError):
+                data = {}
+            if not isinstance(data, dict):
+                raise TypeError(f"journal engine can only store objects: {filename}")
+
+        size = 0
+        if journal_path.exists():
+            with open(journal_path, "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # a torn last line from a crash mid-append
+                        break
+                    size += len(line)
+
+                    for op in record[1] if record[0] == "b" else [record]:
+                        if op[0] == "p":
+                            data[op[1]] = op[2]
+                        elif op[0] == "d":
+                            data.pop(op[1], None)
+                        elif op[0] == "r":
+                            data.clear()
+
+            # drop anything after a torn line so new appends start clean
+            if size != journal_path.stat().st_size:
+                with open(journal_path, "r+b") as f:
+                    f.truncate(size)
+
+        self._sizes[filename] = size
+        return RecordDict.loaded(filename, data)
+
+    def wrap(self, filename: str, data: Any) -> RecordDict:
+        if isinstance(data, RecordDict):
+            return data
+        if not isinstance(data, Mapping):
+            raise TypeError(f"journal engine can only store objects, got {type(data)}")
+        return RecordDict.loaded(
+            filename, {str(k): v for k, v in data.items()}, replace=True
+        )
+
+    def snapshot(self, filename: str, data: RecordDict) -> tuple:
+        return data.changes()
+
+    def write(self, filename: str, payload: tuple) -> bool:
+        replace, puts, deletes = payload
+        if not (replace or puts or deletes):
+            return True
+
+        records = []
+        if replace:
+            records.append('["r"]')
+        records.extend(json.dumps(["d", key], separators=(",", ":")) for key in deletes)
+        # values are already serialized, splice them in instead of re-encoding
+        records.extend(f'["p",{json.dumps(key)},{raw}]' for key, raw in puts)
+        # one line per save, a torn append then drops the whole save
+        line = records[0] if len(records) == 1 else f'["b",[{",".join(records)}]]'
+        chunk = (line + "\n").encode()
+
+        journal_path = self._journal_path(filename)
+        size = self._sizes.get(filename)
+        try:
+            with open(journal_path, "ab") as f:
+                if size is not None and f.tell() != size:
+                    # an earlier append failed part way, drop its fragment so
+                    # this line doesn't get glued onto it
+                    f.truncate(size)
+                f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError:
+            # DataManager requeues the changes, cut the fragment off now
+            if size is not None:
+                try:
+                    os.truncate(journal_path, size)
+                except OSError:
+                    pass
+            return False
+
+        self._sizes[filename] = (size or 0) + len(chunk)
+        return True
+
+    def needs_compaction(self, filename: str) -> bool:
+        return self._sizes.get(filename, 0) > self.compact_bytes
+
+    def journal_size(self, filename: str) -> int:
+        return self._sizes.get(filename, 0)
+
+    def compact(self, filename: str, payload: str) -> bool:
+        """replace the snapshot, the journal is left for `trim`"""
+        snapshot_path = self._snapshot_path(filename)
+        tmp_path = snapshot_path.with_suffix(".json.tmp")
+        try:
+            with open(tmp_path, "w") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, snapshot_path)
+        except OSError:
+            return False
+        return True
+
+    def trim(self, filename: str, offset: int) -> bool:
+        """drop the first `offset` bytes of the journal, now in the snapshot"""
+        journal_path = self._journal_path(filename)
+        tmp_path = journal_path.with_suffix(".journal.tmp")
+        try:
+            with open(journal_path, "rb") as src, open(tmp_path, "wb") as dst:
+                src.seek(offset)
+                shutil.copyfileobj(src, dst)
+                dst.flush()
+                os.fsync(dst.fileno())
+                size = dst.tell()
+            os.replace(tmp_path, journal_path)
+        except OSError:
+            return False
+
+        self._sizes[filename] = size
+        return True
@@ -0,0 +1,244 @@
+"""sqlite storage engine for DataManager
+
+every top-level key of a data file is one row, so updating a single user
+rewrites one small json value instead of the whole file. rows are only
+fetched when a key is first read. import existing json files with
+`python -m src.misc.kvstore import`.
+"""
+
+import argparse
+import json
+import sqlite3
+from collections.abc import Mapping, MutableMapping
+from pathlib import Path
+from threading import Lock
+from typing import Any, Optional
+
+
+class RecordDict(MutableMapping):
+    """lazily loaded rows of one data file, tracking which keys changed
+
+    a key is dirty once it is assigned or its mutable value is handed out,
+    and stays dirty until the next flush writes it. a value held across a
+    flush has to be read through the record again (or `touch`ed) before
+    its next save. without a store every value is already in memory.
+    """
+
+    def __init__(
+        self, store: Optional["SQLiteEngine"], filename: str, keys=(), replace=False
+    ):
+        self._store = store
+        self._file = filename
+        self._keys = dict.fromkeys(keys)
+        self._values = {}
+        self._dirty = set()
+        self._deleted = set()
+        self._replace = replace
+
+    @classmethod
+    def loaded(cls, filename: str, data: dict, replace=False) -> "RecordDict":
+        record = cls(None, filename, data.keys(), replace=replace)
+        record._values.update(data)
+        if replace:
+            record._dirty.update(data)
+        return record
+
+    def _fetch(self, keys):
+        if self._store is None:
+            return
+        missing = [k for k in keys if k not in self._values]
+        if not missing:
+            return
+        for key, raw in self._store.fetch(self._file, missing).items():
+            self._values[key] = json.loads(raw)
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        self._fetch([key])
+        value = self._values[key]
+        if isinstance(value, (dict, list)):
+            # the caller can mutate it in place, so write it on the next flush
+            self._dirty.add(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._keys[key] = None
+        self._values[key] = value
+        self._dirty.add(key)
+        self._deleted.discard(key)
+
+    def __delitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        del self._keys[key]
+        self._values.pop(key, None)
+        self._dirty.discard(key)
+        self._deleted.add(key)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(list(self._keys))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def items(self):
+        self._fetch(list(self._keys))
+        return super().items()
+
+    def values(self):
+        self._fetch(list(self._keys))
+        return super().values()
+
+    def touch(self, *keys):
+        """mark keys dirty after mutating a value held across a flush"""
+        self._dirty.update(key for key in keys if key in self._keys)
+
+    def to_dict(self) -> dict:
+        """a shallow copy of every row, without marking anything dirty"""
+        self._fetch(list(self._keys))
+        return {key: self._values[key] for key in self._keys}
+
+    def requeue(self, payload: tuple):
+        """take back changes whose write failed, the next call returns them again"""
+        replace, puts, deletes = payload
+        if replace:
+            self._replace = True
+            self._dirty.update(self._keys)
+        self._dirty.update(key for key, _ in puts if key in self._keys)
+        self._deleted.update(key for key in deletes if key not in self._keys)
+
+    def changes(self) -> tuple:
+        """rows to write since the last call, as (replace, puts, deletes)"""
+        puts = [
+            (key, json.dumps(self._values[key]))
+            for key in self._dirty
+            if key in self._keys
+        ]
+        self._dirty.clear()
+
+        deletes = list(self._deleted)
+        self._deleted.clear()
+
+        replace = self._replace
+        self._replace = False
+        return replace, puts, deletes
+
+
+class SQLiteEngine:
+    full_snapshots = False
+
+    def __init__(self, path: str = "data/data.db"):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = Lock()
+
+        self.conn = sqlite3.connect(
+            str(self.path), check_same_thread=False, isolation_level=None
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            "file TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (file, key)) WITHOUT ROWID"
+        )
+
+    def read(self, filename: str) -> Optional[RecordDict]:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT key FROM kv WHERE file = ?", (filename,)
+            ).fetchall()
+        if not rows:
+            return None
+        return RecordDict(self, filename, (key for (key,) in rows))
+
+    def wrap(self, filename: str, data: Any) -> RecordDict:
+        """turn a plain dict into a record that replaces the stored rows"""
+        if isinstance(data, RecordDict):
+            return data
+        if not isinstance(data, Mapping):
+            raise TypeError(f"sqlite engine can only store objects, got {type(data)}")
+
+        return RecordDict.loaded(
+            filename, {str(k): v for k, v in data.items()}, replace=True
+        )
+
+    def fetch(self, filename: str, keys: list) -> dict:
+        result = {}
+        with self._lock:
+            # stay under sqlite's bound parameter limit
+            for i in range(0, len(keys), 500):
+                batch = keys[i : i + 500]
+                placeholders = ",".join("?" * len(batch))
+                result.update(
+                    self.conn.execute(
+                        f"SELECT key, value FROM kv WHERE file = ? AND key IN ({placeholders})",
+                        (filename, *batch),
+                    ).fetchall()
+                )
+        return result
+
+    def snapshot(self, filename: str, data: RecordDict) -> tuple:
+        return data.changes()
+
+    def write(self, filename: str, payload: tuple) -> bool:
+        replace, puts, deletes = payload
+        if not (replace or puts or deletes):
+            return True
+
+        with self._lock:
+            try:
+                self.conn.execute("BEGIN")
+                if replace:
+                    self.conn.execute("DELETE FROM kv WHERE file = ?", (filename,))
+                self.conn.executemany(
+                    "DELETE FROM kv WHERE file = ? AND key = ?",
+                    ((filename, key) for key in deletes),
+                )
+                self.conn.executemany(
+                    "INSERT INTO kv (file, key, value) VALUES (?, ?, ?) "
+                    "ON CONFLICT (file, key) DO UPDATE SET value = excluded.value",
+                    ((filename, key, raw) for key, raw in puts),
+                )
+                self.conn.execute("COMMIT")
+                return True
+            except sqlite3.Error:
+                self.conn.execute("ROLLBACK")
+                return False
+
+    def import_json(self, data_dir: Path) -> dict:
+        """copy every object-shaped json file in data_dir into the database"""
+        imported = {}
+        for path in sorted(Path(data_dir).glob("*.json")):
+            try:
+                data = json.loads(path.read_text())
+            except (OSError, json.JSONDecodeError):
+                continue
+            if not isinstance(data, dict):
+                continue
+
+            puts = [(str(key), json.dumps(value)) for key, value in data.items()]
+            if self.write(path.stem, (True, puts, [])):
+                imported[path.stem] = len(puts)
+        return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="kvstore")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="import data/*.json into the sqlite store")
+    imp.add_argument("--data", default="data")
+    imp.add_argument("--db", default="data/data.db")
+    args = parser.parse_args()
+
+    engine = SQLiteEngine(args.db)
+    for filename, rows in engine.import_json(Path(args.data)).items():
+        print(f"{filename}: {rows} keys")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ from discord.ext import commands
 from datetime import datetime, timedelta
 from collections import defaultdict
 
+from src.misc.utils import is_staff
+
 
 class RateLimit(commands.Cog):
     def __init__(self, bot):
@@ -56,8 +58,7 @@ class RateLimit(commands.Cog):
         if ctx.author.bot:
             return
 
-        staff_role = discord.utils.get(ctx.author.roles, name="staff@hazelrun")
-        if staff_role:
+        if is_staff(ctx.author):
             return
 
         command_name = ctx.command.name
@@ -0,0 +1,59 @@
+"""find which of many patterns occur in a text with a single scan
+
+all patterns are compiled into one alternation regex wrapped in a
+lookahead, so the regex engine walks the text once and reports the longest
+pattern starting at each position. shorter patterns that are a prefix of a
+longer one are checked on the spot, so nothing hides behind an overlap.
+"""
+
+import re
+from typing import Iterable, Set
+
+
+class MultiMatcher:
+    def __init__(self, patterns: Iterable[str], words: bool = False):
+        """words: patterns only match as whole words (`ty` won't match `pretty`)"""
+        self.words = words
+        self.patterns = sorted({p.lower() for p in patterns if p}, key=len, reverse=True)
+
+        alternatives = [self._pattern(p) for p in self.patterns]
+        self._regex = (
+            re.compile(f"(?=({'|'.join(alternatives)}))") if alternatives else None
+        )
+        self._single = {p: re.compile(a) for p, a in zip(self.patterns, alternatives)}
+        self._prefixes = {
+            p: [q for q in self.patterns if len(q) < len(p) and p.startswith(q)]
+            for p in self.patterns
+        }
+
+    def _pattern(self, pattern: str) -> str:
+        regex = re.escape(pattern)
+        if self.words:
+            # \b is wrong next to punctuation (">help", ":toroplushie:"), so only
+            # require a boundary on the sides that are word characters
+            if re.match(r"\w", pattern):
+                regex = r"(?<!\w)" + regex
+            if re.search(r"\w$", pattern):
+                regex += r"(?!\w)"
+        return regex
+
+    def find(self, text: str) -> Set[str]:
+        """the (lowercased) patterns that occur in text"""
+        if self._regex is None:
+            return set()
+
+        text = text.lower()
+        found = set()
+        for match in self._regex.finditer(text):
+            pattern = match.group(1)
+            if pattern in found:
+                continue
+            found.add(pattern)
+            for prefix in self._prefixes[pattern]:
+                if prefix not in found and self._single[prefix].match(text, match.start()):
+                    found.add(prefix)
+        return found
+
+    def search(self, text: str) -> bool:
+        """whether any pattern occurs in text"""
+        return self._regex is not None and self._regex.search(text.lower()) is not None
@@ -0,0 +1,174 @@
+"""per-guild role index and cached member capabilities
+
+role lookups by name (`discord.utils.get(guild.roles, name=...)`) and
+membership checks (`has_role`, `is_staff`, ...) used to walk the role
+lists on every command and event. the index keeps name -> role id and
+role id -> name per guild, rebuilt whenever a role is created, renamed or
+deleted, and each member's role names and capability flags are worked out
+once and dropped on `on_member_update`. the RoleCache cog feeds it events.
+"""
+
+import enum
+from typing import Dict, FrozenSet, Optional, Tuple
+
+import discord
+from discord.ext import commands
+
+import config
+
+
+class Capability(enum.IntFlag):
+    NONE = 0
+    STAFF = enum.auto()
+    MOD = enum.auto()
+    ROOT = enum.auto()
+    SHELL = enum.auto()
+
+
+def capability_roles() -> Dict[str, Capability]:
+    return {
+        "staff@hazelrun": Capability.STAFF,
+        "mod@hazelrun": Capability.MOD,
+        "root@hazelrun": Capability.ROOT,
+        config.SHELL_ACCESS_ROLE: Capability.SHELL,
+    }
+
+
+MemberEntry = Tuple[FrozenSet[str], Capability]
+EMPTY: MemberEntry = (frozenset(), Capability.NONE)
+
+
+class RoleIndex:
+    def __init__(self):
+        self.capability_roles = capability_roles()
+        self._ids = {}  # guild id -> {role name: role id}
+        self._names = {}  # guild id -> {role id: role name}
+        self._members = {}  # guild id -> {member id: (role names, capabilities)}
+
+    def index_guild(self, guild: discord.Guild):
+        """(re)build a guild's index, dropping its cached members"""
+        ids, names = {}, {}
+        # guild.roles is in position order, keep the first of any duplicate
+        # names so lookups return what discord.utils.get used to
+        for role in guild.roles:
+            names[role.id] = role.name
+            ids.setdefault(role.name, role.id)
+        self._ids[guild.id] = ids
+        self._names[guild.id] = names
+        self._members.pop(guild.id, None)
+
+    def forget_guild(self, guild_id: int):
+        self._ids.pop(guild_id, None)
+        self._names.pop(guild_id, None)
+        self._members.pop(guild_id, None)
+
+    def clear(self):
+        self._ids.clear()
+        self._names.clear()
+        self._members.clear()
+
+    def _role_ids(self, guild: discord.Guild) -> Dict[str, int]:
+        if guild.id not in self._ids:
+            self.index_guild(guild)
+        return self._ids[guild.id]
+
+    def role(self, guild: discord.Guild, name: str) -> Optional[discord.Role]:
+        role_id = self._role_ids(guild).get(name)
+        return guild.get_role(role_id) if role_id is not None else None
+
+    def name_of(self, guild: discord.Guild, role_id: int) -> Optional[str]:
+        self._role_ids(guild)
+        return self._names[guild.id].get(role_id)
+
+    def add_role(self, role: discord.Role):
+        """index a role the bot just created, before its event arrives"""
+        ids = self._role_ids(role.guild)
+        ids.setdefault(role.name, role.id)
+        self._names[role.guild.id][role.id] = role.name
+
+    def member(self, member: discord.Member) -> MemberEntry:
+        """the member's role names and capability flags"""
+        guild = getattr(member, "guild", None)
+        if guild is None:
+            return EMPTY
+
+        self._role_ids(guild)
+        members = self._members.setdefault(guild.id, {})
+        entry = members.get(member.id)
+        if entry is None:
+            names = frozenset(role.name for role in member.roles)
+            flags = Capability.NONE
+            for name, flag in self.capability_roles.items():
+                if name in names:
+                    flags |= flag
+            entry = members[member.id] = (names, flags)
+        return entry
+
+    def role_names(self, member: discord.Member) -> FrozenSet[str]:
+        return self.member(member)[0]
+
+    def capabilities(self, member: discord.Member) -> Capability:
+        return self.member(member)[1]
+
+    def forget_member(self, guild_id: int, member_id: int):
+        members = self._members.get(guild_id)
+        if members:
+            members.pop(member_id, None)
+
+
+_role_index = None
+
+
+def get_role_index() -> RoleIndex:
+    global _role_index
+    if _role_index is None:
+        _role_index = RoleIndex()
+    return _role_index
+
+
+class RoleCache(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.index = get_role_index()
+
+    def cog_unload(self):
+        self.index.clear()
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # members and roles may have changed while disconnected
+        self.index.clear()
+
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild):
+        self.index.index_guild(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.index.forget_guild(guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role):
+        self.index.index_guild(role.guild)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before, after):
+        # position and permission changes don't affect names
+        if before.name != after.name:
+            self.index.index_guild(after.guild)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role):
+        self.index.index_guild(role.guild)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before, after):
+        self.index.forget_member(after.guild.id, after.id)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        self.index.forget_member(member.guild.id, member.id)
+
+
+async def setup(bot):
+    await bot.add_cog(RoleCache(bot))
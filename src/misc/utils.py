@@ -4,37 +4,44 @@ import discord
 from discord.ext import commands
 
 import config
+from src.misc.roles import Capability, get_role_index
 
 
 def has_role(member: discord.Member, role_name: str) -> bool:
-    return discord.utils.get(member.roles, name=role_name) is not None
+    return role_name in get_role_index().role_names(member)
 
 
 def is_staff(member: discord.Member) -> bool:
-    return has_role(member, "staff@hazelrun")
+    return bool(get_role_index().capabilities(member) & Capability.STAFF)
 
 
 def is_mod(member: discord.Member) -> bool:
-    return has_role(member, "mod@hazelrun")
+    return bool(get_role_index().capabilities(member) & Capability.MOD)
 
 
 def is_root(member: discord.Member) -> bool:
-    return has_role(member, "root@hazelrun")
+    return bool(get_role_index().capabilities(member) & Capability.ROOT)
 
 
 def has_shell_access(member: discord.Member) -> bool:
-    return has_role(member, config.SHELL_ACCESS_ROLE)
+    return bool(get_role_index().capabilities(member) & Capability.SHELL)
+
+
+def find_role(guild: discord.Guild, name: str) -> Optional[discord.Role]:
+    return get_role_index().role(guild, name)
 
 
 async def get_or_create_role(
     guild: discord.Guild, name: str, **kwargs
 ) -> Optional[discord.Role]:
-    role = discord.utils.get(guild.roles, name=name)
+    role = find_role(guild, name)
     if not role:
         try:
             role = await guild.create_role(name=name, **kwargs)
         except discord.HTTPException:
             return None
+        # index it now so a second caller doesn't create it again
+        get_role_index().add_role(role)
     return role
 
 
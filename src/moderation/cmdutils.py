@@ -3,6 +3,8 @@ from typing import List, Tuple
 import discord
 from discord.ext import commands
 
+from ..misc.roles import Capability, get_role_index
+
 
 class ModCommandParser:
     @staticmethod
@@ -233,9 +235,8 @@ class ModCommandParser:
                     errors.append(f"cant {action} bots")
                     continue
 
-                if any(
-                    role.name in ["staff@hazelrun", "mod@hazelrun"]
-                    for role in member.roles
+                if get_role_index().capabilities(member) & (
+                    Capability.STAFF | Capability.MOD
                 ):
                     errors.append(f"cant {action} staff members")
                     continue
@@ -10,6 +10,7 @@ from ..misc.db import (
     get_expiry_time,
     get_session,
 )
+from ..misc.roles import Capability, get_role_index
 
 
 class ModerationHelper:
@@ -252,12 +253,13 @@ def is_mod(member: discord.Member) -> bool:
     """check if member is a moderator"""
     config = ModerationHelper.get_config(member.guild.id)
 
+    index = get_role_index()
     if config.mod_role_id:
-        mod_role = member.guild.get_role(config.mod_role_id)
-        if mod_role and mod_role in member.roles:
+        mod_role = index.name_of(member.guild, config.mod_role_id)
+        if mod_role and mod_role in index.role_names(member):
             return True
 
-    return any(role.name in ["mod@hazelrun", "staff@hazelrun"] for role in member.roles)
+    return bool(index.capabilities(member) & (Capability.MOD | Capability.STAFF))
 
 
 def is_op(member: discord.Member) -> bool:
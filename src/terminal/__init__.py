@@ -1,12 +1,27 @@
-from .connect import Useradd
-from .docker import DockerService, get_docker_service
-from .fetch import Hazelfetch
-from .shell import Shell
-
-__all__ = [
-    "Useradd",
-    "Hazelfetch",
-    "DockerService",
-    "get_docker_service",
-    "Shell",
-]
+"""hzsh terminal package
+
+exports load on first access, so `python -m src.terminal.daemon` only
+imports what the daemon uses instead of discord.py and every cog.
+"""
+
+import importlib
+
+_EXPORTS = {
+    "Useradd": ".connect",
+    "Hazelfetch": ".fetch",
+    "DockerService": ".docker",
+    "get_docker_service": ".docker",
+    "SessionClient": ".client",
+    "get_session_client": ".client",
+    "Shell": ".shell",
+    "Watchdog": ".watchdog",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(module, __name__), name)
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Callable, Optional
+
+import config
+
+
+class DaemonUnavailable(Exception):
+    pass
+
+
+class SessionClient:
+    """client for the hzshd session daemon (see src/terminal/daemon.py)"""
+
+    def __init__(self, socket_path: str = config.HZSH_DAEMON_SOCKET):
+        self.socket_path = Path(socket_path)
+        self.reader = None
+        self.writer = None
+        self.on_event: Optional[Callable[[dict], None]] = None
+        self.on_disconnect: Optional[Callable[[], None]] = None
+
+        self._seq = 0
+        self._pending = {}
+        self._connect_lock = asyncio.Lock()
+        self._read_task = None
+
+    @property
+    def connected(self) -> bool:
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def connect(self, spawn: bool = True):
+        """connect to the daemon, starting it if it isnt running"""
+        async with self._connect_lock:
+            if self.connected:
+                return
+
+            try:
+                await self._open()
+            except (ConnectionError, FileNotFoundError, OSError):
+                if not spawn:
+                    raise DaemonUnavailable("hzshd is not running")
+                self._spawn_daemon()
+                await self._wait_for_daemon()
+
+            self._read_task = asyncio.create_task(self._read_loop())
+
+    async def _open(self):
+        self.reader, self.writer = await asyncio.open_unix_connection(
+            str(self.socket_path), limit=1024 * 1024
+        )
+
+    def _spawn_daemon(self):
+        """start hzshd in its own session so it outlives the bot process"""
+        subprocess.Popen(
+            [sys.executable, "-m", "src.terminal.daemon", str(self.socket_path)],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+
+    async def _wait_for_daemon(self, timeout: float = 5.0):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        while loop.time() < deadline:
+            try:
+                await self._open()
+                return
+            except (ConnectionError, FileNotFoundError, OSError):
+                await asyncio.sleep(0.1)
+
+        raise DaemonUnavailable("hzshd did not start")
+
+    async def _read_loop(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+                if "event" in message:
+                    if self.on_event:
+                        self.on_event(message)
+                    continue
+
+                future = self._pending.pop(message.get("seq"), None)
+                if future and not future.done():
+                    future.set_result(message)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._close_connection()
+
+    def _close_connection(self):
+        if self.writer:
+            self.writer.close()
+        self.reader = None
+        self.writer = None
+
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(DaemonUnavailable("connection to hzshd lost"))
+        self._pending.clear()
+
+        if self.on_disconnect:
+            self.on_disconnect()
+
+    async def request(self, op: str, timeout: float = 10.0, **kwargs) -> dict:
+        await self.connect()
+
+        self._seq += 1
+        seq = self._seq
+        future = asyncio.get_running_loop().create_future()
+        self._pending[seq] = future
+
+        payload = {"op": op, "seq": seq, **kwargs}
+        self.writer.write(json.dumps(payload).encode("utf-8") + b"\n")
+        await self.writer.drain()
+
+        try:
+            return await asyncio.wait_for(future, timeout=timeout)
+        finally:
+            self._pending.pop(seq, None)
+
+    async def attach(
+        self,
+        session_id: str,
+        uid: int,
+        working_dir: str,
+        container: str,
+        meta: Optional[dict] = None,
+    ) -> dict:
+        return await self.request(
+            "attach",
+            id=session_id,
+            uid=uid,
+            wd=working_dir,
+            container=container,
+            meta=meta or {},
+        )
+
+    async def send_input(self, session_id: str, data: str) -> bool:
+        response = await self.request("input", id=session_id, data=data)
+        return response.get("ok", False)
+
+    async def detach(self, session_id: str) -> bool:
+        response = await self.request("detach", id=session_id)
+        return response.get("ok", False)
+
+    async def close(self, session_id: str) -> bool:
+        response = await self.request("close", id=session_id)
+        return response.get("ok", False)
+
+    async def list_sessions(self) -> list:
+        response = await self.request("list")
+        return response.get("sessions", [])
+
+
+_session_client = None
+
+
+def get_session_client() -> SessionClient:
+    """get session client singleton"""
+    global _session_client
+    if _session_client is None:
+        _session_client = SessionClient()
+    return _session_client
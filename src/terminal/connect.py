@@ -3,6 +3,8 @@ from discord.ext import commands
 import asyncio
 import config
 
+from src.misc import find_role, has_shell_access
+
 
 class Useradd(commands.Cog):
     def __init__(self, bot):
@@ -12,9 +14,9 @@ class Useradd(commands.Cog):
     async def useradd(self, ctx):
         guild = ctx.guild
         member = ctx.author
-        shell_role = discord.utils.get(guild.roles, name=config.SHELL_ACCESS_ROLE)
+        shell_role = find_role(guild, config.SHELL_ACCESS_ROLE)
 
-        if shell_role in member.roles:
+        if has_shell_access(member):
             await ctx.send("you are already connected.")
             return
 
@@ -0,0 +1,286 @@
+"""hzshd - standalone session daemon for hzsh
+
+owns the `docker exec` shell processes, their terminal state and scrollback,
+so sessions survive bot restarts. run with `python -m src.terminal.daemon`.
+
+the Shell cog talks to it over a unix socket using newline-delimited json:
+    attach  {id, uid, wd, container, meta}  start or resume a session
+    input   {id, data}                      write keystrokes to the shell
+    detach  {id}                            stop receiving frames
+    close   {id}                            terminate the shell
+    list    {}                              list running sessions
+frames are pushed to attached clients as {event: "frame", id, lines, plain, bell}
+and {event: "exit", id} when the shell process ends.
+"""
+
+import asyncio
+import codecs
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+
+import config
+from src.terminal.terminal import Terminal
+
+FRAME_INTERVAL = 0.1
+MAX_CLIENT_BUFFER = 256 * 1024
+
+log = logging.getLogger("hzshd")
+
+
+class Session:
+    def __init__(self, session_id: str, process, meta: dict):
+        self.id = session_id
+        self.process = process
+        self.meta = meta
+        self.screen = Terminal(width=80, height=24, scrollback=1000)
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.subscribers = set()
+        self.last_frame = 0.0
+        self.pending_frame = None
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    def frame(self, bell: bool = False) -> dict:
+        return {
+            "event": "frame",
+            "id": self.id,
+            "lines": self.screen.get_display(show_cursor=True),
+            "plain": self.screen.get_display(show_cursor=False),
+            "bell": bell,
+        }
+
+
+class SessionDaemon:
+    def __init__(self, socket_path: str = config.HZSH_DAEMON_SOCKET):
+        self.socket_path = Path(socket_path)
+        self.sessions = {}
+
+    async def serve(self):
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+
+        # created owner-only, there is no window between bind and chmod
+        # where another local user could connect
+        umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(
+                self.handle_client, path=str(self.socket_path)
+            )
+        finally:
+            os.umask(umask)
+        os.chmod(self.socket_path, 0o600)
+        log.info(f"listening on {self.socket_path}")
+
+        async with server:
+            await server.serve_forever()
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+                try:
+                    response = await self.dispatch(request, writer)
+                except Exception as e:
+                    log.exception(f"error handling {request.get('op')}")
+                    response = {"ok": False, "error": str(e)}
+
+                response["seq"] = request.get("seq")
+                self.send(writer, response)
+
+                if request.get("op") == "attach" and response.get("ok"):
+                    session = self.sessions.get(request["id"])
+                    if session:
+                        self.send(writer, session.frame())
+
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for session in self.sessions.values():
+                session.subscribers.discard(writer)
+            writer.close()
+
+    def send(self, writer, payload: dict, droppable: bool = False) -> bool:
+        """queue a message to a client
+
+        `droppable` messages are skipped while the client is backed up, only
+        frames are sent that way since the next one replaces them. responses
+        and exit events are always queued so a slow client never loses them.
+        """
+        if writer.is_closing():
+            return False
+        if droppable and writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+            return False
+        writer.write(json.dumps(payload).encode("utf-8") + b"\n")
+        return True
+
+    def broadcast(self, session: Session, payload: dict):
+        for writer in list(session.subscribers):
+            if writer.is_closing():
+                session.subscribers.discard(writer)
+                continue
+            self.send(writer, payload, droppable=payload.get("event") == "frame")
+
+    async def dispatch(self, request: dict, writer) -> dict:
+        op = request.get("op")
+        session_id = request.get("id")
+
+        if op == "list":
+            return {
+                "ok": True,
+                "sessions": [
+                    {"id": s.id, "meta": s.meta}
+                    for s in self.sessions.values()
+                    if s.alive
+                ],
+            }
+
+        if not session_id:
+            return {"ok": False, "error": "missing session id"}
+
+        if op == "attach":
+            return await self.attach(request, writer)
+
+        session = self.sessions.get(session_id)
+        if not session:
+            return {"ok": False, "error": "no such session"}
+
+        if op == "input":
+            session.process.stdin.write(request.get("data", "").encode("utf-8"))
+            await session.process.stdin.drain()
+            return {"ok": True}
+
+        if op == "detach":
+            session.subscribers.discard(writer)
+            return {"ok": True}
+
+        if op == "close":
+            await self.close(session)
+            return {"ok": True}
+
+        return {"ok": False, "error": f"unknown op: {op}"}
+
+    async def attach(self, request: dict, writer) -> dict:
+        session_id = request["id"]
+        session = self.sessions.get(session_id)
+        created = False
+
+        if session is None or not session.alive:
+            process = await asyncio.create_subprocess_exec(
+                "docker",
+                "exec",
+                "-i",
+                "-u",
+                str(request["uid"]),
+                "-w",
+                request["wd"],
+                request.get("container", "hzsh_linux"),
+                "env",
+                "TERM=xterm",
+                "COLUMNS=80",
+                "LINES=24",
+                "script",
+                "-qfc",
+                "bash",
+                "/dev/null",
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+            )
+            session = Session(session_id, process, request.get("meta") or {})
+            self.sessions[session_id] = session
+            asyncio.create_task(self._pump(session))
+            created = True
+            log.info(f"started session {session_id} (pid {process.pid})")
+        elif request.get("meta"):
+            session.meta.update(request["meta"])
+
+        session.subscribers.add(writer)
+        return {"ok": True, "created": created, "meta": session.meta}
+
+    async def close(self, session: Session):
+        process = session.process
+        if process.returncode is None:
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), timeout=2.0)
+            except asyncio.TimeoutError:
+                process.kill()
+
+        if self.sessions.get(session.id) is session:
+            del self.sessions[session.id]
+        log.info(f"closed session {session.id}")
+
+    async def _pump(self, session: Session):
+        """read shell output into the session's terminal and push frames"""
+        try:
+            while True:
+                chunk = await session.process.stdout.read(4096)
+                if not chunk:
+                    break
+
+                text = session.decoder.decode(chunk)
+                bell = session.screen.feed(text)
+                self._schedule_frame(session, bell)
+        except Exception as e:
+            log.error(f"error reading session {session.id}: {e}")
+        finally:
+            if session.pending_frame:
+                session.pending_frame.cancel()
+            if self.sessions.get(session.id) is session:
+                del self.sessions[session.id]
+            self.broadcast(session, {"event": "exit", "id": session.id})
+
+    def _schedule_frame(self, session: Session, bell: bool):
+        """throttle frames to one per interval, always flushing the last one"""
+        loop = asyncio.get_running_loop()
+        elapsed = loop.time() - session.last_frame
+
+        if bell or elapsed > FRAME_INTERVAL:
+            if session.pending_frame:
+                session.pending_frame.cancel()
+                session.pending_frame = None
+            self._emit_frame(session, bell)
+        elif session.pending_frame is None:
+            session.pending_frame = loop.call_later(
+                FRAME_INTERVAL - elapsed, self._emit_frame, session, False
+            )
+
+    def _emit_frame(self, session: Session, bell: bool):
+        session.pending_frame = None
+        session.last_frame = asyncio.get_running_loop().time()
+        self.broadcast(session, session.frame(bell))
+
+
+def main():
+    Path("logs").mkdir(exist_ok=True)
+    logging.basicConfig(
+        filename="logs/hzshd.log",
+        level=logging.INFO,
+        format="[%(asctime)s] [%(levelname)s] [%(name)s] %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+    socket_path = sys.argv[1] if len(sys.argv) > 1 else config.HZSH_DAEMON_SOCKET
+    try:
+        asyncio.run(SessionDaemon(socket_path).serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,50 @@
 import asyncio
 import hashlib
+import json
 import subprocess
+import time
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Awaitable, Callable, Optional, Tuple
+
+import config
+from src.terminal.backup import BackupStore
+from src.terminal.health import CircuitBreaker
+from src.terminal.pool import ContainerPool, PoolFull
+from src.terminal.scheduler import ExecScheduler, QueueTimeout
+from src.terminal.telemetry import ContainerTelemetry, format_size
+
+# `docker exec` exits with this when the docker client itself failed, though
+# a user command can exit with it too, so it is only a hint to probe the daemon
+DOCKER_CLIENT_ERROR = 125
+
+INFO_COMMANDS = {
+    "os": "cat /etc/os-release | grep PRETTY_NAME | cut -d'=' -f2 | tr -d '\"'",
+    "kernel": "uname -r",
+    "host": "hostname",
+    "uptime": "uptime -p",
+    "cpu": "lscpu | grep 'Model name' | cut -d':' -f2 | xargs",
+    "memory": "free -h | awk '/^Mem:/ {print $3 \" / \" $2}'",
+    "disk": "df -h / | awk 'NR==2 {print $3 \" / \" $2}'",
+    "user": "whoami",
+}
+STATIC_INFO = {"os", "kernel", "host", "cpu", "user"}
+STATIC_INFO_TTL = 6 * 3600
+DYNAMIC_INFO_TTL = 10
+
+
+def _build_info_script() -> str:
+    """one shell script that prints every INFO_COMMANDS field as a json object"""
+    fields = ",".join(f'"{key}":"%s"' for key in INFO_COMMANDS)
+    values = " ".join(
+        f'"$(j "$({cmd} 2>/dev/null)")"' for cmd in INFO_COMMANDS.values()
+    )
+    escape = r"""j() { printf '%s' "$1" | head -n1 | sed 's/\\/\\\\/g; s/"/\\"/g'; }"""
+    return f"{escape}\nprintf '{{{fields}}}\\n' {values}"
+
+
+INFO_SCRIPT = _build_info_script()
 
 
 @dataclass
@@ -26,11 +66,32 @@ class ProcessInfo:
 
 
 class DockerService:
-    def __init__(self, container_name: str = "hzsh_linux"):
+    def __init__(self, container_name: str = "hzsh_linux", per_user: bool = False):
         self.container_name = container_name
         self.user_id_map = {}
         self.limits = ResourceLimits()
+        self.pool = None
+        if per_user:
+            self.pool = ContainerPool(
+                container_name,
+                Path("hazelrun/home"),
+                run_args=[
+                    "--memory",
+                    f"{self.limits.max_memory_mb}m",
+                    "--cpus",
+                    str(self.limits.max_cpu_percent / 100),
+                    "--pids-limit",
+                    "256",
+                ],
+                max_live=config.HZSH_MAX_CONTAINERS,
+            )
         self.user_processes = {}
+        self.scheduler = ExecScheduler(cpu_probe=self.get_cpu_percent)
+        self.breaker = CircuitBreaker()
+        self.telemetry = ContainerTelemetry(container_name)
+        self.backups = BackupStore()
+        self._info_cache = {}
+        self._info_lock = asyncio.Lock()
 
     def get_uid(self, discord_id: str) -> int:
         if discord_id not in self.user_id_map:
@@ -39,17 +100,87 @@ class DockerService:
         return self.user_id_map[discord_id]
 
     async def check_health(self) -> bool:
+        """probe the container and feed the result to the circuit breaker"""
+        healthy = False
         try:
-            result = subprocess.run(
-                ["docker", "inspect", "-f", "{{.State.Running}}", self.container_name],
-                capture_output=True,
-                text=True,
-                timeout=5,
+            process = await asyncio.create_subprocess_exec(
+                "docker",
+                "inspect",
+                "-f",
+                "{{.State.Running}}",
+                self.container_name,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            try:
+                stdout, _ = await asyncio.wait_for(process.communicate(), timeout=5.0)
+                healthy = process.returncode == 0 and b"true" in stdout
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+        except Exception:
+            pass
+
+        if healthy:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+        return healthy
+
+    async def start_container(self) -> bool:
+        """try to bring the container back up"""
+        try:
+            process = await asyncio.create_subprocess_exec(
+                "docker",
+                "start",
+                self.container_name,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
             )
-            return result.returncode == 0 and "true" in result.stdout
+            await asyncio.wait_for(process.communicate(), timeout=30.0)
+            return process.returncode == 0
         except Exception:
             return False
 
+    async def container_for(
+        self,
+        discord_id: Optional[str],
+        username: Optional[str] = None,
+        lease: bool = False,
+    ) -> str:
+        """container to run a user's commands in, the shared one unless pooled
+
+        with `lease` a pooled container stays up until `release_container`.
+        raises PoolFull when every pooled container is in use.
+        """
+        if self.pool and discord_id:
+            name = await self.pool.acquire(discord_id, username, lease=lease)
+            if name:
+                return name
+        return self.container_name
+
+    def release_container(self, discord_id: Optional[str]):
+        if self.pool and discord_id:
+            self.pool.release(discord_id)
+
+    def track_sessions(self, sessions: dict):
+        """ids with an attached shell, their containers are never evicted"""
+        if self.pool:
+            self.pool.attached = sessions
+
+    def _running_container(self, discord_id: str) -> str:
+        if self.pool:
+            return self.pool.peek(discord_id) or self.container_name
+        return self.container_name
+
+    async def reap_containers(self, busy: set = frozenset()) -> Tuple[int, int]:
+        if not self.pool:
+            return 0, 0
+        return await self.pool.reap(busy)
+
+    def unavailable_message(self) -> str:
+        return f"container unavailable, retry in {int(self.breaker.retry_after()) + 1}s"
+
     async def get_user_processes(self, discord_id: str) -> list[ProcessInfo]:
         """get all processes for user"""
         uid = self.get_uid(discord_id)
@@ -59,7 +190,7 @@ class DockerService:
                 [
                     "docker",
                     "exec",
-                    self.container_name,
+                    self._running_container(discord_id),
                     "ps",
                     "-u",
                     str(uid),
@@ -140,7 +271,14 @@ class DockerService:
 
         try:
             result = subprocess.run(
-                ["docker", "exec", self.container_name, "kill", "-9", str(pid)],
+                [
+                    "docker",
+                    "exec",
+                    self._running_container(discord_id),
+                    "kill",
+                    "-9",
+                    str(pid),
+                ],
                 capture_output=True,
                 timeout=5,
             )
@@ -154,7 +292,15 @@ class DockerService:
 
         try:
             subprocess.run(
-                ["docker", "exec", self.container_name, "pkill", "-9", "-u", str(uid)],
+                [
+                    "docker",
+                    "exec",
+                    self._running_container(discord_id),
+                    "pkill",
+                    "-9",
+                    "-u",
+                    str(uid),
+                ],
                 capture_output=True,
                 timeout=5,
             )
@@ -172,9 +318,65 @@ class DockerService:
         working_dir: Optional[str] = None,
         timeout: float = 30.0,
         check_limits: bool = True,
+        on_queued: Optional[Callable[[int], Awaitable]] = None,
+        spool_path: Optional[Path] = None,
+        spool_limit: int = 0,
+        max_wait: Optional[float] = None,
     ) -> Tuple[str, int]:
-        """execute command in the container"""
+        """execute command in the container, queued fairly per user
+
+        a command waits at most `max_wait` seconds for its turn (default
+        `timeout`) before giving up with a busy message. with `spool_path`
+        set, stdout and stderr are streamed into that file (killing the
+        command once `spool_limit` bytes are written) and only the start of
+        the output is returned.
+        """
+
+        if not self.breaker.allow():
+            return self.unavailable_message(), -1
+
+        # acquire first so a paused container is running for the limit checks,
+        # and lease it so it can't be evicted while the command waits or runs
+        try:
+            container = await self.container_for(discord_id, username, lease=True)
+        except PoolFull:
+            return (
+                "hzsh is full, every user container is in use. "
+                "try again in a moment",
+                -1,
+            )
+
+        try:
+            return await self._exec_in(
+                container,
+                command,
+                username,
+                discord_id,
+                working_dir,
+                timeout,
+                check_limits,
+                on_queued,
+                spool_path,
+                spool_limit,
+                max_wait,
+            )
+        finally:
+            self.release_container(discord_id)
 
+    async def _exec_in(
+        self,
+        container: str,
+        command: str,
+        username: Optional[str],
+        discord_id: Optional[str],
+        working_dir: Optional[str],
+        timeout: float,
+        check_limits: bool,
+        on_queued: Optional[Callable[[int], Awaitable]],
+        spool_path: Optional[Path],
+        spool_limit: int,
+        max_wait: Optional[float],
+    ) -> Tuple[str, int]:
         if check_limits and discord_id:
             allowed, reason = await self.check_resource_limits(discord_id)
             if not allowed:
@@ -189,22 +391,75 @@ class DockerService:
         if working_dir:
             cmd_args.extend(["-w", working_dir])
 
-        cmd_args.extend([self.container_name, "bash", "-c", command])
+        cmd_args.extend([container, "bash", "-c", command])
+
+        if max_wait is None:
+            max_wait = timeout
 
+        try:
+            return await self.scheduler.run(
+                discord_id or "system",
+                lambda: self._run_exec(cmd_args, timeout, spool_path, spool_limit),
+                on_queued=on_queued,
+                max_wait=max_wait,
+            )
+        except QueueTimeout:
+            return (
+                f"hzsh is busy, your command waited {max_wait:g}s in the queue "
+                "without starting. try again in a moment",
+                -1,
+            )
+
+    async def _run_exec(
+        self,
+        cmd_args: list,
+        timeout: float,
+        spool_path: Optional[Path] = None,
+        spool_limit: int = 0,
+    ) -> Tuple[str, int]:
         try:
             process = await asyncio.create_subprocess_exec(
                 *cmd_args,
                 stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-            )
-
-            stdout, stderr = await asyncio.wait_for(
-                process.communicate(), timeout=timeout
+                stderr=(
+                    asyncio.subprocess.STDOUT if spool_path else asyncio.subprocess.PIPE
+                ),
             )
+        except OSError as e:
+            # the docker client couldn't even be started
+            self.breaker.record_failure()
+            return f"error executing command: {str(e)}", -1
 
-            output = stdout.decode("utf-8", errors="replace")
-            error = stderr.decode("utf-8", errors="replace")
-            result = output + error
+        try:
+            try:
+                if spool_path:
+                    output, timed_out = await self._spool_output(
+                        process, spool_path, spool_limit, timeout
+                    )
+                    if timed_out:
+                        return output.strip(), -1
+                else:
+                    stdout, stderr = await asyncio.wait_for(
+                        process.communicate(), timeout=timeout
+                    )
+                    output = stdout.decode("utf-8", errors="replace")
+                    error = stderr.decode("utf-8", errors="replace")
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise
+
+            result = output if spool_path else output + error
+
+            # only the docker client's own failures count, never what the
+            # command printed, or any user could open the circuit for everyone
+            if (
+                process.returncode == DOCKER_CLIENT_ERROR
+                and not await self.daemon_reachable()
+            ):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
 
             return result.strip() if result else "", process.returncode or 0
 
@@ -213,18 +468,107 @@ class DockerService:
         except Exception as e:
             return f"error executing command: {str(e)}", -1
 
+    async def daemon_reachable(self) -> bool:
+        """whether the docker daemon answers, independent of any user command"""
+        try:
+            process = await asyncio.create_subprocess_exec(
+                "docker",
+                "info",
+                "--format",
+                "{{.ServerVersion}}",
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+        except OSError:
+            return False
+
+        try:
+            await asyncio.wait_for(process.wait(), timeout=5.0)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return False
+        return process.returncode == 0
+
+    async def _spool_output(
+        self,
+        process,
+        spool_path: Path,
+        limit: int,
+        timeout: float,
+        preview_size: int = 4096,
+    ) -> Tuple[str, bool]:
+        """stream process output into a file, returning the first few kb
+
+        on timeout the process is killed and a notice is appended to both the
+        file and the preview, returns (preview, timed_out). file writes run
+        in a worker thread so a slow disk doesn't stall the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        preview = b""
+        written = 0
+        timed_out = False
+
+        f = await asyncio.to_thread(open, spool_path, "wb")
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(
+                        process.stdout.read(65536), max(0.0, deadline - loop.time())
+                    )
+                except asyncio.TimeoutError:
+                    timed_out = True
+                    process.kill()
+                    notice = f"\n[command timed out after {timeout}s]\n".encode()
+                    await asyncio.to_thread(f.write, notice)
+                    preview += notice
+                    break
+
+                if not chunk:
+                    break
+
+                if len(preview) < preview_size:
+                    preview += chunk[: preview_size - len(preview)]
+
+                chunk = chunk[: limit - written]
+                await asyncio.to_thread(f.write, chunk)
+                written += len(chunk)
+
+                if written >= limit:
+                    process.kill()
+                    break
+        finally:
+            await asyncio.to_thread(f.close)
+
+        await process.wait()
+        return preview.decode("utf-8", errors="replace"), timed_out
+
     async def ensure_user_exists(
         self, username: str, discord_id: str, home_dir: Path
     ) -> bool:
         """ensure user exists with quotas"""
+        if self.breaker.blocked:
+            return False
+
         uid = self.get_uid(discord_id)
 
         user_home = home_dir / username
         if not user_home.exists():
-            user_home.mkdir(parents=True, exist_ok=True)
+            # bring back the last backup of a home that went missing
+            restored = await asyncio.to_thread(
+                self.backups.restore, f"home/{username}", user_home
+            )
+            if not restored:
+                user_home.mkdir(parents=True, exist_ok=True)
+
+        try:
+            container = await self.container_for(discord_id, username)
+        except PoolFull:
+            return False
 
         result = subprocess.run(
-            ["docker", "exec", self.container_name, "id", "-u", str(uid)],
+            ["docker", "exec", container, "id", "-u", str(uid)],
             capture_output=True,
         )
 
@@ -233,7 +577,7 @@ class DockerService:
                 [
                     "docker",
                     "exec",
-                    self.container_name,
+                    container,
                     "useradd",
                     "-u",
                     str(uid),
@@ -249,7 +593,7 @@ class DockerService:
             [
                 "docker",
                 "exec",
-                self.container_name,
+                container,
                 "chown",
                 "-R",
                 f"{uid}:{uid}",
@@ -302,29 +646,76 @@ class DockerService:
             pass
         return None
 
-    async def get_container_info(self, info_type: str) -> str:
-        """get container info"""
-        commands_map = {
-            "os": "cat /etc/os-release | grep PRETTY_NAME | cut -d'=' -f2 | tr -d '\"'",
-            "kernel": "uname -r",
-            "host": "hostname",
-            "uptime": "uptime -p",
-            "cpu": "lscpu | grep 'Model name' | cut -d':' -f2 | xargs",
-            "memory": "free -h | awk '/^Mem:/ {print $3 \" / \" $2}'",
-            "disk": "df -h / | awk 'NR==2 {print $3 \" / \" $2}'",
+    async def collect_info(self, fields: Optional[set] = None) -> dict:
+        """get container info for hazelfetch in a single exec, with caching
+
+        static fields are cached for hours, dynamic ones for a few seconds.
+        concurrent callers share one refresh.
+        """
+        wanted = set(fields) if fields else set(INFO_COMMANDS)
+        wanted &= set(INFO_COMMANDS)
+
+        if self._info_stale(wanted):
+            async with self._info_lock:
+                if self._info_stale(wanted):
+                    await self._refresh_info()
+
+        return {
+            key: self._info_cache[key][0] if key in self._info_cache else "unavailable"
+            for key in wanted
         }
 
-        cmd = commands_map.get(info_type)
-        if not cmd:
-            return "unknown"
+    def _info_stale(self, fields: set) -> bool:
+        now = time.monotonic()
+        for key in fields:
+            cached = self._info_cache.get(key)
+            ttl = STATIC_INFO_TTL if key in STATIC_INFO else DYNAMIC_INFO_TTL
+            if cached is None or now - cached[1] > ttl:
+                return True
+        return False
 
+    async def _refresh_info(self):
         output, exit_code = await self.exec_command(
-            cmd, timeout=5.0, check_limits=False
+            INFO_SCRIPT, timeout=5.0, check_limits=False
         )
-        return output if exit_code == 0 else "unavailable"
+        if exit_code != 0:
+            return
+
+        try:
+            data = json.loads(output.splitlines()[-1])
+        except (json.JSONDecodeError, IndexError):
+            return
+
+        now = time.monotonic()
+        for key, value in data.items():
+            if key in INFO_COMMANDS:
+                self._info_cache[key] = (value.strip() or "unknown", now)
+
+    async def get_container_info(self, info_type: str) -> str:
+        """get container info"""
+        if info_type not in INFO_COMMANDS:
+            return "unknown"
+
+        info = await self.collect_info({info_type})
+        return info[info_type]
 
     async def get_stats(self) -> dict:
-        """get docker stats"""
+        """get docker stats, from the telemetry stream when it is running"""
+        sample = self.telemetry.latest()
+        if sample:
+            return {
+                "cpu_usage": f"{sample.cpu_percent:.2f}%",
+                "mem_usage": f"{format_size(sample.mem_bytes)} / {format_size(sample.mem_limit)}",
+                "net_io": f"{format_size(sample.net_rx)} / {format_size(sample.net_tx)}",
+            }
+
+        if self.breaker.blocked:
+            return {
+                "cpu_usage": "unavailable",
+                "mem_usage": "unavailable",
+                "net_io": "unavailable",
+            }
+
         try:
             process = await asyncio.create_subprocess_exec(
                 "docker",
@@ -352,6 +743,18 @@ class DockerService:
                 "net_io": "unavailable",
             }
 
+    async def get_cpu_percent(self) -> Optional[float]:
+        """container cpu usage as a number, None if unavailable"""
+        sample = self.telemetry.latest()
+        if sample:
+            return sample.cpu_percent
+
+        stats = await self.get_stats()
+        try:
+            return float(stats["cpu_usage"].rstrip("%"))
+        except ValueError:
+            return None
+
     async def list_users(self) -> list:
         """list all users"""
         try:
@@ -383,5 +786,5 @@ def get_docker_service() -> DockerService:
     """get docker service singleton"""
     global _docker_service
     if _docker_service is None:
-        _docker_service = DockerService()
+        _docker_service = DockerService(per_user=config.HZSH_PER_USER_CONTAINERS)
     return _docker_service
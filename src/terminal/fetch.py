@@ -1,74 +1,40 @@
 from discord.ext import commands
 import asyncio
 
+from src.terminal import get_docker_service
+from src.terminal.telemetry import format_size
+
 
 class Hazelfetch(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.container_name = "hzsh_linux"
-
-    async def get_container_info(self, info_type):
-        commands_map = {
-            "os": "cat /etc/os-release | grep PRETTY_NAME | cut -d'=' -f2 | tr -d '\"'",
-            "kernel": "uname -r",
-            "host": "hostname",
-            "uptime": "uptime -p",
-            "cpu": "lscpu | grep 'Model name' | cut -d':' -f2 | xargs",
-            "memory": "free -h | awk '/^Mem:/ {print $3 \" / \" $2}'",
-            "disk": "df -h / | awk 'NR==2 {print $3 \" / \" $2}'",
-            "user": "whoami",
-        }
-
-        cmd = commands_map.get(info_type)
-        if not cmd:
-            return "unknown"
-
-        try:
-            process = await asyncio.create_subprocess_exec(
-                "docker",
-                "exec",
-                self.container_name,
-                "bash",
-                "-c",
-                cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-            )
-
-            stdout, _ = await asyncio.wait_for(process.communicate(), timeout=5.0)
-
-            return stdout.decode("utf-8", errors="replace").strip()
-
-        except Exception:
-            return "unavailable"
-
-    async def get_docker_stats(self):
-        try:
-            process = await asyncio.create_subprocess_exec(
-                "docker",
-                "stats",
-                self.container_name,
-                "--no-stream",
-                "--format",
-                "{{.CPUPerc}}|{{.MemUsage}}|{{.NetIO}}",
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-            )
-
-            stdout, _ = await asyncio.wait_for(process.communicate(), timeout=5.0)
-
-            stats = stdout.decode("utf-8", errors="replace").strip().split("|")
-            return {
-                "cpu_usage": stats[0] if len(stats) > 0 else "unknown",
-                "mem_usage": stats[1] if len(stats) > 1 else "unknown",
-                "net_io": stats[2] if len(stats) > 2 else "unknown",
-            }
-        except Exception:
-            return {
-                "cpu_usage": "unavailable",
-                "mem_usage": "unavailable",
-                "net_io": "unavailable",
-            }
+        self.docker = get_docker_service()
+
+    def get_container_status(self):
+        breaker = self.docker.breaker
+        if breaker.state == breaker.CLOSED:
+            if self.docker.pool:
+                pool = self.docker.pool.stats()
+                return f"running, {pool['live']}/{pool['max']} user containers ({pool['paused']} paused)"
+            return "running"
+        if breaker.state == breaker.HALF_OPEN:
+            return "recovering"
+        return f"down (retry in {int(breaker.retry_after()) + 1}s)"
+
+    def get_history_lines(self):
+        telemetry = self.docker.telemetry
+        cpu = telemetry.summary("cpu_percent")
+        mem = telemetry.summary("mem_bytes")
+
+        if not cpu or not mem:
+            return ["\x1b[1;36mhistory\x1b[0m: no samples yet"]
+
+        return [
+            f"\x1b[1;36mcpu 1h\x1b[0m: {cpu['min']:.1f}% / {cpu['avg']:.1f}% / {cpu['max']:.1f}% (min/avg/max)",
+            f"  {telemetry.sparkline('cpu_percent')}",
+            f"\x1b[1;36mmem 1h\x1b[0m: {format_size(mem['min'])} / {format_size(mem['avg'])} / {format_size(mem['max'])} (min/avg/max)",
+            f"  {telemetry.sparkline('mem_bytes')}",
+        ]
 
     @commands.command()
     async def hazelfetch(self, ctx, *flags):
@@ -82,6 +48,8 @@ class Hazelfetch(commands.Cog):
             "--disk",
             "--user",
             "--stats",
+            "--status",
+            "--history",
             "--all",
         }
 
@@ -97,6 +65,7 @@ class Hazelfetch(commands.Cog):
                 "--memory",
                 "--disk",
                 "--stats",
+                "--status",
             }
 
         invalid = flags_set - valid_flags
@@ -107,27 +76,25 @@ class Hazelfetch(commands.Cog):
         async with ctx.typing():
             info = {}
 
-            if "--os" in flags_set:
-                info["os"] = await self.get_container_info("os")
-            if "--kernel" in flags_set:
-                info["kernel"] = await self.get_container_info("kernel")
-            if "--host" in flags_set:
-                info["host"] = await self.get_container_info("host")
-            if "--uptime" in flags_set:
-                info["uptime"] = await self.get_container_info("uptime")
-            if "--cpu" in flags_set:
-                info["cpu"] = await self.get_container_info("cpu")
-            if "--memory" in flags_set:
-                info["memory"] = await self.get_container_info("memory")
-            if "--disk" in flags_set:
-                info["disk"] = await self.get_container_info("disk")
-            if "--user" in flags_set:
-                info["user"] = await self.get_container_info("user")
+            fields = {
+                flag[2:]
+                for flag in flags_set
+                if flag not in ("--stats", "--status", "--history", "--all")
+            }
+
+            tasks = []
+            if fields:
+                tasks.append(self.docker.collect_info(fields))
             if "--stats" in flags_set:
-                stats = await self.get_docker_stats()
-                info["cpu_usage"] = stats["cpu_usage"]
-                info["mem_usage"] = stats["mem_usage"]
-                info["net_io"] = stats["net_io"]
+                tasks.append(self.docker.get_stats())
+
+            for result in await asyncio.gather(*tasks):
+                info.update(result)
+
+            if "--status" in flags_set:
+                info["status"] = self.get_container_status()
+            if "--history" in flags_set:
+                info["history"] = self.get_history_lines()
 
         username = ctx.author.name
         hostname = info.get("host", "hazelrun")
@@ -160,6 +127,10 @@ class Hazelfetch(commands.Cog):
             lines.append(f"\x1b[1;36mmem usage\x1b[0m: {info['mem_usage']}")
         if "net_io" in info:
             lines.append(f"\x1b[1;36mnet i/o\x1b[0m: {info['net_io']}")
+        if "status" in info:
+            lines.append(f"\x1b[1;36mcontainer\x1b[0m: {info['status']}")
+        if "history" in info:
+            lines.extend(info["history"])
 
         lines.append("```")
 
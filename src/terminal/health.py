@@ -0,0 +1,65 @@
+import time
+
+
+class CircuitBreaker:
+    """fail fast while the container is down
+
+    opens after `failure_threshold` consecutive failures. once
+    `reset_timeout` has passed a single probe is let through (half-open);
+    a success closes the circuit again, a failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started = 0.0
+
+    @property
+    def blocked(self) -> bool:
+        """true while requests should be rejected, without using up a probe"""
+        if self.state == self.CLOSED:
+            return False
+        return time.monotonic() - self.opened_at < self.reset_timeout
+
+    def retry_after(self) -> float:
+        if self.state == self.CLOSED:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def allow(self) -> bool:
+        """check whether a request may go through, claiming the probe if half-open"""
+        now = time.monotonic()
+
+        if self.state == self.CLOSED:
+            return True
+
+        if self.state == self.OPEN:
+            if now - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self.probe_started = now
+            return True
+
+        # half-open: only one probe at a time, unless the last one never reported
+        if now - self.probe_started >= self.reset_timeout:
+            self.probe_started = now
+            return True
+        return False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
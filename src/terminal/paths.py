@@ -0,0 +1,74 @@
+import os
+import posixpath
+from pathlib import Path
+from typing import Optional, Tuple
+
+
+class HomePathResolver:
+    """resolve container paths inside user homes against the host bind mount
+
+    homes are mounted from `hazelrun/home` to `/home` in the container, so
+    paths inside a user's own home can be answered on the host without a
+    `docker exec`. anything outside the home, or anything that resolves
+    outside it through a symlink, returns None and should go through the
+    container instead.
+    """
+
+    def __init__(self, home_dir: Path, container_home: str = "/home"):
+        self.home_dir = Path(home_dir)
+        self.container_home = container_home
+
+    def user_home(self, username: str) -> str:
+        return posixpath.join(self.container_home, username)
+
+    def normalize(self, username: str, current: str, path: str) -> str:
+        """turn a user supplied path into an absolute container path"""
+        home = self.user_home(username)
+
+        if path == "~":
+            path = home
+        elif path.startswith("~/"):
+            path = posixpath.join(home, path[2:])
+        elif not path.startswith("/"):
+            path = posixpath.join(current, path)
+
+        normalized = posixpath.normpath(path)
+        if normalized.startswith("//"):
+            normalized = "/" + normalized.lstrip("/")
+        return normalized
+
+    def resolve(self, username: str, container_path: str) -> Optional[Tuple[str, Path]]:
+        """map a normalized container path to (container path, host path)"""
+        home = self.user_home(username)
+        if container_path != home and not container_path.startswith(home + "/"):
+            return None
+
+        host_home = self.home_dir / username
+        if not host_home.is_dir():
+            return None
+
+        host_root = os.path.realpath(host_home)
+        relative = posixpath.relpath(container_path, home)
+        host_path = os.path.realpath(os.path.join(host_root, relative))
+
+        # symlinks may point anywhere on the host, only trust them if they
+        # land back inside the same home
+        if host_path != host_root and not host_path.startswith(host_root + os.sep):
+            return None
+
+        return container_path, Path(host_path)
+
+    def list_dir(self, host_path: Path, show_hidden: bool = False) -> list:
+        """list a directory like `ls -p`"""
+        entries = []
+        with os.scandir(host_path) as it:
+            for entry in it:
+                if not show_hidden and entry.name.startswith("."):
+                    continue
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    is_dir = False
+                entries.append(entry.name + "/" if is_dir else entry.name)
+
+        return sorted(entries, key=str.lower)
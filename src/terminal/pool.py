@@ -0,0 +1,251 @@
+import asyncio
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+LABEL = "hzsh.user"
+
+
+class PoolFull(Exception):
+    """every live container is in use, so none can be removed to make room"""
+
+
+class _Pooled:
+    __slots__ = ("name", "paused", "last_used", "leases")
+
+    def __init__(self, name: str, paused: bool = False):
+        self.name = name
+        self.paused = paused
+        self.last_used = time.monotonic()
+        self.leases = 0
+
+
+class ContainerPool:
+    """one sandbox container per user, created from the shared image
+
+    containers are created on first use and unpaused on the next command.
+    idle ones are paused after `pause_after` seconds and removed after
+    `remove_after`; homes live on the host bind mount so nothing is lost.
+    at most `max_live` containers exist at once, the least recently used
+    one that is not in use is removed to make room. a container is in use
+    while an exec holds a lease on it or its user has a shell attached.
+    """
+
+    def __init__(
+        self,
+        base_container: str,
+        home_dir: Path,
+        run_args: Optional[list] = None,
+        max_live: int = 8,
+        pause_after: float = 300.0,
+        remove_after: float = 3600.0,
+    ):
+        self.base_container = base_container
+        self.home_dir = Path(home_dir)
+        self.run_args = run_args or []
+        self.max_live = max_live
+        self.pause_after = pause_after
+        self.remove_after = remove_after
+
+        self.containers = OrderedDict()
+        # discord ids with an attached shell, set by the shell cog
+        self.attached = {}
+        self.image = None
+        self._adopted = False
+        self._lock = asyncio.Lock()
+
+    def container_name(self, discord_id: str) -> str:
+        return f"hzsh_u{discord_id}"
+
+    def peek(self, discord_id: str) -> Optional[str]:
+        """name of the user's container if it is running, without touching it"""
+        pooled = self.containers.get(discord_id)
+        if pooled and not pooled.paused:
+            return pooled.name
+        return None
+
+    def in_use(self, discord_id: str) -> bool:
+        pooled = self.containers.get(discord_id)
+        return discord_id in self.attached or bool(pooled and pooled.leases)
+
+    async def acquire(
+        self, discord_id: str, username: Optional[str], lease: bool = False
+    ) -> Optional[str]:
+        """get the user's container, creating or unpausing it as needed
+
+        with `lease` the container can't be evicted until `release` is called.
+        raises PoolFull when a container is needed but all are in use.
+        """
+        pooled = self.containers.get(discord_id)
+        if self._adopted and pooled and not pooled.paused:
+            pooled.last_used = time.monotonic()
+            pooled.leases += lease
+            self.containers.move_to_end(discord_id)
+            return pooled.name
+
+        async with self._lock:
+            await self._adopt()
+
+            pooled = self.containers.get(discord_id)
+            if pooled:
+                if pooled.paused:
+                    code, _ = await self._docker("unpause", pooled.name)
+                    if code != 0:
+                        await self._remove(discord_id)
+                        pooled = None
+                    else:
+                        pooled.paused = False
+
+            if pooled is None:
+                if not username:
+                    return None
+                pooled = await self._create(discord_id, username)
+                if pooled is None:
+                    return None
+
+            pooled.last_used = time.monotonic()
+            pooled.leases += lease
+            self.containers.move_to_end(discord_id)
+            return pooled.name
+
+    def release(self, discord_id: str):
+        pooled = self.containers.get(discord_id)
+        if pooled and pooled.leases:
+            pooled.leases -= 1
+            pooled.last_used = time.monotonic()
+
+    async def reap(self, busy: set = frozenset()) -> Tuple[int, int]:
+        """pause and remove idle containers, returns (paused, removed)"""
+        paused = removed = 0
+        now = time.monotonic()
+
+        async with self._lock:
+            for discord_id, pooled in list(self.containers.items()):
+                if discord_id in busy or self.in_use(discord_id):
+                    pooled.last_used = now
+                    continue
+
+                idle = now - pooled.last_used
+                if idle >= self.remove_after:
+                    await self._remove(discord_id)
+                    removed += 1
+                elif idle >= self.pause_after and not pooled.paused:
+                    # mark first so the lock-free path in acquire backs off
+                    pooled.paused = True
+                    code, _ = await self._docker("pause", pooled.name)
+                    if code == 0:
+                        paused += 1
+                    else:
+                        pooled.paused = False
+
+        return paused, removed
+
+    def stats(self) -> dict:
+        return {
+            "live": len(self.containers),
+            "paused": sum(1 for p in self.containers.values() if p.paused),
+            "max": self.max_live,
+        }
+
+    async def _create(self, discord_id: str, username: str) -> Optional[_Pooled]:
+        if not self.image:
+            code, out = await self._docker(
+                "inspect", "-f", "{{.Config.Image}}", self.base_container
+            )
+            if code != 0 or not out:
+                return None
+            self.image = out
+
+        while len(self.containers) >= self.max_live:
+            # least recently used first, never one that is in use
+            idle = next(
+                (other for other in self.containers if not self.in_use(other)), None
+            )
+            if idle is None:
+                raise PoolFull()
+            await self._remove(idle)
+
+        home = (self.home_dir / username).resolve()
+        home.mkdir(parents=True, exist_ok=True)
+
+        name = self.container_name(discord_id)
+        await self._docker("rm", "-f", name)
+
+        code, _ = await self._docker(
+            "run",
+            "-d",
+            "--name",
+            name,
+            "--hostname",
+            "hazelrun",
+            "--label",
+            f"{LABEL}={discord_id}",
+            "-v",
+            f"{home}:/home/{username}",
+            *self.run_args,
+            self.image,
+            "tail",
+            "-f",
+            "/dev/null",
+            timeout=60.0,
+        )
+        if code != 0:
+            return None
+
+        pooled = _Pooled(name)
+        self.containers[discord_id] = pooled
+        return pooled
+
+    async def _remove(self, discord_id: str):
+        pooled = self.containers.pop(discord_id, None)
+        if pooled:
+            await self._docker("rm", "-f", pooled.name)
+
+    async def _adopt(self):
+        """pick up containers left running by a previous bot process"""
+        if self._adopted:
+            return
+        self._adopted = True
+
+        code, out = await self._docker(
+            "ps",
+            "-a",
+            "--filter",
+            f"label={LABEL}",
+            "--format",
+            f'{{{{.Names}}}} {{{{.Label "{LABEL}"}}}} {{{{.State}}}}',
+        )
+        if code != 0:
+            return
+
+        for line in out.splitlines():
+            parts = line.split()
+            if len(parts) != 3:
+                continue
+            name, discord_id, state = parts
+
+            if state in ("running", "paused"):
+                self.containers[discord_id] = _Pooled(name, paused=state == "paused")
+            else:
+                await self._docker("rm", "-f", name)
+
+    async def _docker(self, *args, timeout: float = 15.0) -> Tuple[int, str]:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                "docker",
+                *args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            try:
+                stdout, _ = await asyncio.wait_for(
+                    process.communicate(), timeout=timeout
+                )
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                return -1, ""
+            return process.returncode, stdout.decode("utf-8", errors="replace").strip()
+        except OSError:
+            return -1, ""
@@ -0,0 +1,202 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Optional
+
+
+class QueueTimeout(Exception):
+    """a job waited longer than its max_wait for a slot and was dropped"""
+
+
+class _Job:
+    __slots__ = ("func", "future", "started", "task")
+
+    def __init__(self, func, future, started):
+        self.func = func
+        self.future = future
+        self.started = started
+        self.task = None
+
+
+class ExecScheduler:
+    """fair-share scheduler for container commands
+
+    every user gets their own fifo queue and queues are served round-robin,
+    so one user spamming commands only ever delays their own work. the
+    number of commands running at once adapts to exec latency and container
+    cpu: it backs off multiplicatively when either is over target and grows
+    by one while there is a backlog and the container keeps up.
+    """
+
+    def __init__(
+        self,
+        min_concurrency: int = 1,
+        max_concurrency: int = 8,
+        initial_concurrency: int = 3,
+        target_latency: float = 5.0,
+        target_cpu: float = 45.0,
+        adjust_interval: float = 2.0,
+        cpu_interval: float = 15.0,
+        cpu_probe: Optional[Callable[[], Awaitable[Optional[float]]]] = None,
+    ):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.limit = initial_concurrency
+        self.target_latency = target_latency
+        self.target_cpu = target_cpu
+        self.adjust_interval = adjust_interval
+        self.cpu_interval = cpu_interval
+        self.cpu_probe = cpu_probe
+
+        self.queues = OrderedDict()
+        self.running = 0
+        self.latency = None
+        self.cpu_percent = None
+
+        self._last_adjust = 0.0
+        self._last_cpu_sample = 0.0
+        self._cpu_task = None
+
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for q in self.queues.values())
+
+    def position(self, key: str) -> int:
+        """estimated position of the user's newest job under round-robin"""
+        queue = self.queues.get(key)
+        if not queue:
+            return 0
+
+        depth = len(queue)
+        ahead = sum(min(len(q), depth) for k, q in self.queues.items() if k != key)
+        return ahead + depth
+
+    async def run(
+        self,
+        key: str,
+        func: Callable[[], Awaitable],
+        on_queued: Optional[Callable[[int], Awaitable]] = None,
+        max_wait: Optional[float] = None,
+    ):
+        """run func once it is this user's turn and a slot is free
+
+        raises QueueTimeout if the job is still queued after max_wait seconds.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_wait if max_wait is not None else None
+        job = _Job(func, loop.create_future(), loop.create_future())
+        self.queues.setdefault(key, deque()).append(job)
+        self._dispatch()
+
+        if job.task is None and on_queued:
+            try:
+                await on_queued(self.position(key))
+            except Exception:
+                pass
+
+        try:
+            if job.task is None and deadline is not None:
+                try:
+                    await asyncio.wait_for(
+                        asyncio.shield(job.started), max(0.0, deadline - loop.time())
+                    )
+                except asyncio.TimeoutError:
+                    if job.task is None:
+                        self._discard(key, job)
+                        raise QueueTimeout(f"still queued after {max_wait:g}s")
+            return await asyncio.shield(job.future)
+        except asyncio.CancelledError:
+            if job.task is None:
+                self._discard(key, job)
+            else:
+                job.task.cancel()
+            raise
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "running": self.running,
+            "queued": self.queued,
+            "users": len(self.queues),
+            "latency": self.latency,
+            "cpu_percent": self.cpu_percent,
+        }
+
+    def _discard(self, key: str, job: _Job):
+        queue = self.queues.get(key)
+        if queue and job in queue:
+            queue.remove(job)
+            if not queue:
+                del self.queues[key]
+
+    def _dispatch(self):
+        while self.running < self.limit and self.queues:
+            key, queue = next(iter(self.queues.items()))
+            job = queue.popleft()
+
+            if queue:
+                self.queues.move_to_end(key)
+            else:
+                del self.queues[key]
+
+            self.running += 1
+            job.task = asyncio.create_task(self._execute(job))
+            job.started.set_result(None)
+
+    async def _execute(self, job: _Job):
+        started = time.monotonic()
+        try:
+            result = await job.func()
+            if not job.future.done():
+                job.future.set_result(result)
+        except asyncio.CancelledError:
+            job.future.cancel()
+            raise
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        finally:
+            self.running -= 1
+            self._observe(time.monotonic() - started)
+            self._dispatch()
+
+    def _observe(self, latency: float):
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = 0.8 * self.latency + 0.2 * latency
+
+        now = time.monotonic()
+        self._maybe_sample_cpu(now)
+
+        if now - self._last_adjust < self.adjust_interval:
+            return
+        self._last_adjust = now
+
+        overloaded = self.latency > self.target_latency or (
+            self.cpu_percent is not None and self.cpu_percent > self.target_cpu
+        )
+
+        if overloaded:
+            self.limit = max(
+                self.min_concurrency, min(self.limit - 1, int(self.limit * 0.75))
+            )
+        elif self.queues:
+            self.limit = min(self.max_concurrency, self.limit + 1)
+
+    def _maybe_sample_cpu(self, now: float):
+        if not self.cpu_probe or now - self._last_cpu_sample < self.cpu_interval:
+            return
+        if self._cpu_task and not self._cpu_task.done():
+            return
+
+        self._last_cpu_sample = now
+        self._cpu_task = asyncio.create_task(self._sample_cpu())
+
+    async def _sample_cpu(self):
+        try:
+            value = await self.cpu_probe()
+        except Exception:
+            value = None
+        if value is not None:
+            self.cpu_percent = value
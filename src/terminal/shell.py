@@ -3,12 +3,16 @@ import re
 from pathlib import Path
 
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 
 import config
 from src.achievements.utils import get_achievement_system
-from src.misc import CogHelper, has_shell_access
+from src.misc import CogHelper, get_data_manager, has_shell_access
 from src.terminal import get_docker_service
+from src.terminal.client import DaemonUnavailable, get_session_client
+from src.terminal.paths import HomePathResolver
+from src.terminal.pool import PoolFull
+from src.terminal.spool import OutputSpool
 from src.terminal.terminal import Terminal
 
 
@@ -17,25 +21,66 @@ class Shell(CogHelper, commands.Cog):
         super().__init__(bot)
         self.docker = get_docker_service()
         self.achievements = get_achievement_system()
+        self.dm = get_data_manager()
+        self.client = get_session_client()
         self.home_dir = Path("hazelrun/home")
-        self.working_dirs = {}
+        self.paths = HomePathResolver(self.home_dir)
+        self.spool = OutputSpool()
+        self.working_dirs = self.dm.load("working_dirs", {})
         self.sessions = {}
+        self.docker.track_sessions(self.sessions)
+
+        self.client.on_event = self._on_daemon_event
+        self.client.on_disconnect = self._on_daemon_disconnect
 
         if not self.home_dir.exists():
             self.home_dir.mkdir(parents=True, exist_ok=True)
 
-    async def exec_cmd(self, username: str, discord_id: str, command: str, ctx=None):
-        """execute command in container as user"""
+        self.cleanup_spool.start()
+
+    async def cog_load(self):
+        asyncio.create_task(self._restore_sessions())
+
+    async def cog_unload(self):
+        self.cleanup_spool.cancel()
+        for discord_id, session in list(self.sessions.items()):
+            session["active"] = False
+            session["dirty"].set()
+            try:
+                await self.client.detach(discord_id)
+            except (DaemonUnavailable, asyncio.TimeoutError):
+                pass
+        self.sessions.clear()
+        self.dm.flush()
+
+    @tasks.loop(minutes=5)
+    async def cleanup_spool(self):
+        self.spool.cleanup()
+
+    def set_working_dir(self, discord_id: str, path: str):
+        self.working_dirs[discord_id] = path
+        self.dm.save("working_dirs", self.working_dirs)
+
+    async def exec_cmd(
+        self, username: str, discord_id: str, command: str, ctx=None, spool=None
+    ):
+        """execute command in container as user, optionally into a spool entry"""
         await self.docker.ensure_user_exists(username, discord_id, self.home_dir)
 
         wd = self.working_dirs.get(discord_id, f"/home/{username}")
 
+        async def on_queued(position):
+            await ctx.send(f"-# queued, position {position}")
+
         output, exit_code = await self.docker.exec_command(
             f"cd {wd} && {command}",
             username=username,
             discord_id=discord_id,
             working_dir=wd,
             timeout=30.0,
+            on_queued=on_queued if ctx else None,
+            spool_path=spool.path if spool else None,
+            spool_limit=self.spool.max_bytes,
         )
 
         if ctx:
@@ -58,226 +103,141 @@ class Shell(CogHelper, commands.Cog):
             await ctx.send("youre already connected")
             return
 
+        if self.docker.breaker.blocked:
+            await ctx.send(f"hzsh: {self.docker.unavailable_message()}")
+            return
+
         await self.docker.ensure_user_exists(username, discord_id, self.home_dir)
 
         uid = self.docker.get_uid(discord_id)
         wd = self.working_dirs.get(discord_id, f"/home/{username}")
 
-        process = await asyncio.create_subprocess_exec(
-            "docker",
-            "exec",
-            "-i",
-            "-u",
-            str(uid),
-            "-w",
-            wd,
-            self.docker.container_name,
-            "env",
-            "TERM=xterm",
-            "COLUMNS=80",
-            "LINES=24",
-            "script",
-            "-qfc",
-            "bash",
-            "/dev/null",
-            stdin=asyncio.subprocess.PIPE,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.STDOUT,
-        )
-
         screen = Terminal(width=80, height=24, scrollback=1000)
         content = (
             "```ansi\n" + "\n".join(screen.get_display(show_cursor=False)) + "\n```"
         )
         msg = await ctx.send(content)
 
-        self.sessions[discord_id] = {
-            "channel": ctx.channel.id,
-            "active": True,
-            "username": username,
-            "process": process,
-            "screen_msg": msg,
-            "screen": screen,
-            "last_update": 0,
-        }
+        self._track_session(discord_id, ctx.channel.id, username, msg)
 
-        asyncio.create_task(self._read_output(discord_id))
+        try:
+            response = await self.client.attach(
+                discord_id,
+                uid,
+                wd,
+                await self.docker.container_for(discord_id, username),
+                meta={"channel": ctx.channel.id, "message": msg.id, "username": username},
+            )
+        except (DaemonUnavailable, asyncio.TimeoutError) as e:
+            self.sessions.pop(discord_id, None)
+            self.log_error(f"could not reach hzshd: {e}")
+            await ctx.send("shell system unavailable")
+            return
+        except PoolFull:
+            self.sessions.pop(discord_id, None)
+            await ctx.send(
+                "hzsh is full, every user container is in use. try again later"
+            )
+            return
 
-        await self.achievements.grant_achievement(
-            discord_id, "thestart", ctx.guild, ctx.channel
-        )
+        if not response.get("ok"):
+            self.sessions.pop(discord_id, None)
+            await ctx.send(f"hzsh: {response.get('error', 'failed to start shell')}")
+            return
 
-    async def _read_output(self, discord_id):
-        """read output from shell process"""
-        if discord_id not in self.sessions:
+        self.achievements.queue_grant(discord_id, "thestart", ctx.guild, ctx.channel)
+
+    def _on_daemon_event(self, event):
+        """handle frames and exits pushed by hzshd"""
+        discord_id = event.get("id")
+        session = self.sessions.get(discord_id)
+        if not session:
             return
 
-        session = self.sessions[discord_id]
-        process = session["process"]
-        screen = session["screen"]
+        if event["event"] == "frame":
+            session["frame"] = event
+            session["flash"] = session["flash"] or event.get("bell", False)
+            session["dirty"].set()
+        elif event["event"] == "exit":
+            session["active"] = False
+            session["dirty"].set()
+
+    def _on_daemon_disconnect(self):
+        for session in self.sessions.values():
+            session["active"] = False
+            session["dirty"].set()
+        self.sessions.clear()
+
+    def _track_session(self, discord_id, channel_id, username, screen_msg):
+        session = {
+            "channel": channel_id,
+            "active": True,
+            "username": username,
+            "screen_msg": screen_msg,
+            "frame": None,
+            "flash": False,
+            "dirty": asyncio.Event(),
+        }
+        self.sessions[discord_id] = session
+        session["task"] = asyncio.create_task(self._render_loop(discord_id))
+        return session
+
+    async def _render_loop(self, discord_id):
+        """redraw the terminal message whenever hzshd pushes a new frame"""
+        session = self.sessions.get(discord_id)
+        if not session:
+            return
 
         try:
             while session["active"]:
-                try:
-                    chunk = await asyncio.wait_for(
-                        process.stdout.read(4096), timeout=0.05
-                    )
+                await session["dirty"].wait()
+                session["dirty"].clear()
 
-                    if not chunk:
-                        break
+                if session["frame"] is None:
+                    continue
 
-                    text = chunk.decode("utf-8", errors="replace")
-                    bell_triggered = self._process_output(screen, text)
+                flash = session["flash"]
+                session["flash"] = False
+                await self._update(discord_id, flash=flash)
+        except Exception as e:
+            self.log_error(f"error rendering shell output: {e}")
+        finally:
+            if self.sessions.get(discord_id) is session and not session["active"]:
+                del self.sessions[discord_id]
 
-                    current = asyncio.get_event_loop().time()
-                    if current - session["last_update"] > 0.1:
-                        await self._update(discord_id, flash=bell_triggered)
-                        session["last_update"] = current
-                    elif bell_triggered:
-                        await self._update(discord_id, flash=True)
-                        session["last_update"] = current
+    async def _restore_sessions(self):
+        """reattach to sessions that survived a bot restart"""
+        await self.bot.wait_until_ready()
 
-                except asyncio.TimeoutError:
-                    continue
+        try:
+            running = await self.client.list_sessions()
+        except (DaemonUnavailable, asyncio.TimeoutError):
+            return
 
-        except Exception as e:
-            self.log_error(f"error reading shell output: {e}")
-            if discord_id in self.sessions:
-                self.sessions[discord_id]["active"] = False
-
-    def _process_output(self, screen, text):
-        """process terminal output - same as before"""
-        i = 0
-        bell_triggered = False
-        while i < len(text):
-            char = text[i]
-
-            if char == "\r":
-                screen.carriage_return()
-            elif char == "\n":
-                screen.newline()
-            elif char == "\b":
-                screen.backspace()
-            elif char == "\x1b":
-                seq_len = self._handle_escape(screen, text[i:])
-                i += seq_len - 1
-            elif char == "\x07":
-                bell_triggered = True
-            elif char in ["\x0e", "\x0f", "\x00"]:
-                pass
-            elif ord(char) >= 32 or char == "\t":
-                if char == "\t":
-                    spaces = 8 - (screen.cursor_x % 8)
-                    for _ in range(spaces):
-                        screen.write_char(" ")
-                else:
-                    screen.write_char(char)
-
-            i += 1
-
-        return bell_triggered
-
-    def _handle_escape(self, screen, text):
-        """handle ANSI escape sequences"""
-        if len(text) < 2:
-            return 1
-
-        if text[1] == "[":
-            match = re.match(r"\x1b\[([0-9;?]*)([a-zA-Z@])", text)
-            if match:
-                params_str = match.group(1).replace("?", "")
-                command = match.group(2)
-                params = (
-                    [int(p) if p else 0 for p in params_str.split(";")]
-                    if params_str
-                    else []
-                )
+        for info in running:
+            discord_id = info["id"]
+            meta = info.get("meta") or {}
+            channel = self.bot.get_channel(meta.get("channel", 0))
+            if discord_id in self.sessions or not channel or not meta.get("message"):
+                continue
 
-                if command == "A":
-                    n = params[0] if params else 1
-                    screen.move_cursor(y=max(0, screen.cursor_y - n))
-                elif command == "B":
-                    n = params[0] if params else 1
-                    screen.move_cursor(y=min(screen.height - 1, screen.cursor_y + n))
-                elif command == "C":
-                    n = params[0] if params else 1
-                    screen.move_cursor(x=min(screen.width - 1, screen.cursor_x + n))
-                elif command == "D":
-                    n = params[0] if params else 1
-                    screen.move_cursor(x=max(0, screen.cursor_x - n))
-                elif command in ["H", "f"]:
-                    row = (params[0] - 1) if params and params[0] > 0 else 0
-                    col = (params[1] - 1) if len(params) > 1 and params[1] > 0 else 0
-                    screen.move_cursor(x=col, y=row)
-
-                elif command == "J":
-                    screen.clear_screen(params[0] if params else 0)
-                elif command == "K":
-                    screen.clear_line(params[0] if params else 0)
-
-                elif command == "S":
-                    screen.scroll_up(params[0] if params else 1)
-                elif command == "T":
-                    screen.scroll_down(params[0] if params else 1)
-
-                elif command == "m":
-                    if not params:
-                        params = [0]
-
-                    ansi_parts = []
-                    i = 0
-                    while i < len(params):
-                        param = params[i]
-                        if param == 0:
-                            screen.current_style = ""
-                        elif param in [1, 2, 3, 4, 5, 7, 8, 9]:
-                            ansi_parts.append(str(param))
-                        elif 30 <= param <= 37 or param == 39:
-                            ansi_parts.append(str(param))
-                        elif 40 <= param <= 47 or param == 49:
-                            ansi_parts.append(str(param))
-                        elif 90 <= param <= 97 or 100 <= param <= 107:
-                            ansi_parts.append(str(param))
-                        elif param == 38:
-                            if i + 2 < len(params) and params[i + 1] == 5:
-                                ansi_parts.append(f"38;5;{params[i + 2]}")
-                                i += 2
-                            elif i + 4 < len(params) and params[i + 1] == 2:
-                                ansi_parts.append(
-                                    f"38;2;{params[i + 2]};{params[i + 3]};{params[i + 4]}"
-                                )
-                                i += 4
-                        elif param == 48:
-                            if i + 2 < len(params) and params[i + 1] == 5:
-                                ansi_parts.append(f"48;5;{params[i + 2]}")
-                                i += 2
-                            elif i + 4 < len(params) and params[i + 1] == 2:
-                                ansi_parts.append(
-                                    f"48;2;{params[i + 2]};{params[i + 3]};{params[i + 4]}"
-                                )
-                                i += 4
-                        i += 1
-
-                    screen.current_style = (
-                        f"\x1b[{';'.join(ansi_parts)}m" if ansi_parts else ""
-                    )
-
-                elif command == "s":
-                    screen.saved_cursor = (screen.cursor_x, screen.cursor_y)
-                elif command == "u":
-                    screen.cursor_x, screen.cursor_y = screen.saved_cursor
-
-                return len(match.group(0))
-
-        elif text[1] == "]":
-            match = re.match(r"\x1b\][^\x07\x1b]*(\x07|\x1b\\)", text)
-            if match:
-                return len(match.group(0))
-
-        elif text[1] in ["7", "8", "M", "D", "E", "H", "c"]:
-            return 2
-
-        return 2
+            screen_msg = channel.get_partial_message(meta["message"])
+            self._track_session(
+                discord_id, channel.id, meta.get("username"), screen_msg
+            )
+
+            try:
+                await self.client.attach(
+                    discord_id,
+                    self.docker.get_uid(discord_id),
+                    self.working_dirs.get(
+                        discord_id, f"/home/{meta.get('username')}"
+                    ),
+                    await self.docker.container_for(discord_id, meta.get("username")),
+                )
+                self.log_info(f"reattached hzsh session for {discord_id}")
+            except (DaemonUnavailable, asyncio.TimeoutError, PoolFull):
+                self.sessions.pop(discord_id, None)
 
     async def _update(self, discord_id, flash=False):
         """update the displayed terminal"""
@@ -285,9 +245,9 @@ class Shell(CogHelper, commands.Cog):
             return
 
         session = self.sessions[discord_id]
-        screen = session["screen"]
+        frame = session["frame"]
 
-        lines = screen.get_display(show_cursor=True)
+        lines = frame["lines"]
 
         if flash:
             inverted_lines = [f"\x1b[7m{line}\x1b[27m" for line in lines]
@@ -302,7 +262,7 @@ class Shell(CogHelper, commands.Cog):
         content = "```ansi\n" + "\n".join(lines) + "\n```"
 
         if len(content) > 1990:
-            lines = screen.get_display(show_cursor=False)
+            lines = frame["plain"]
             content = "```ansi\n" + "\n".join(lines) + "\n```"
 
             if len(content) > 1990:
@@ -345,15 +305,14 @@ class Shell(CogHelper, commands.Cog):
         content = message.content
 
         if content == "[EXIT]":
-            process = session["process"]
-            process.terminate()
+            session["active"] = False
+            session["dirty"].set()
             try:
-                await asyncio.wait_for(process.wait(), timeout=2.0)
-            except Exception:
-                process.kill()
+                await self.client.close(discord_id)
+            except (DaemonUnavailable, asyncio.TimeoutError) as e:
+                self.log_error(f"error closing shell session: {e}")
 
-            screen = session["screen"]
-            screen.clear()
+            screen = Terminal(width=80, height=24)
 
             text = "shell session closed"
             row = screen.height // 2
@@ -371,7 +330,7 @@ class Shell(CogHelper, commands.Cog):
             except Exception:
                 pass
 
-            del self.sessions[discord_id]
+            self.sessions.pop(discord_id, None)
 
             try:
                 await message.delete()
@@ -388,8 +347,6 @@ class Shell(CogHelper, commands.Cog):
             discord_id, content, None, message.guild, message.channel
         )
 
-        process = session["process"]
-
         translated = content
         translated = translated.replace("[<]", "\b")
         translated = re.sub(r"\[<(\d+)\]", lambda m: "\b" * int(m.group(1)), translated)
@@ -432,9 +389,8 @@ class Shell(CogHelper, commands.Cog):
             translated = "".join(result)
 
         try:
-            process.stdin.write(translated.encode("utf-8"))
-            await process.stdin.drain()
-        except Exception as e:
+            await self.client.send_input(discord_id, translated)
+        except (DaemonUnavailable, asyncio.TimeoutError) as e:
             self.log_error(f"error writing to shell stdin: {e}")
 
 
@@ -0,0 +1,148 @@
+import shutil
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+
+@dataclass
+class SpoolEntry:
+    id: str
+    owner: str
+    path: Path
+    created: float
+    size: int = 0
+    truncated: bool = False
+    offsets: list = field(default_factory=list)
+
+    @property
+    def pages(self) -> int:
+        return max(1, len(self.offsets) - 1)
+
+
+class OutputSpool:
+    """bounded per-user spool files for large command output
+
+    output is written straight to disk by the exec, then indexed into
+    page offsets so a page can be read without loading the whole file.
+    each user keeps at most `max_per_user` spools of `max_bytes` each and
+    spools expire after `ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        spool_dir: str = "data/spool",
+        max_bytes: int = 2 * 1024 * 1024,
+        max_per_user: int = 3,
+        ttl: float = 1800.0,
+        page_bytes: int = 1800,
+        page_lines: int = 40,
+    ):
+        self.spool_dir = Path(spool_dir)
+        self.max_bytes = max_bytes
+        self.max_per_user = max_per_user
+        self.ttl = ttl
+        self.page_bytes = page_bytes
+        self.page_lines = page_lines
+        self.entries = {}
+
+        # spools from a previous run have no index, start clean
+        if self.spool_dir.exists():
+            shutil.rmtree(self.spool_dir, ignore_errors=True)
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+
+    def create(self, owner: str) -> SpoolEntry:
+        owned = sorted(
+            (e for e in self.entries.values() if e.owner == owner),
+            key=lambda e: e.created,
+        )
+        for old in owned[: max(0, len(owned) - self.max_per_user + 1)]:
+            self.discard(old)
+
+        user_dir = self.spool_dir / owner
+        user_dir.mkdir(parents=True, exist_ok=True)
+
+        spool_id = uuid.uuid4().hex[:12]
+        entry = SpoolEntry(
+            id=spool_id,
+            owner=owner,
+            path=user_dir / f"{spool_id}.out",
+            created=time.time(),
+        )
+        self.entries[spool_id] = entry
+        return entry
+
+    def get(self, spool_id: str) -> Optional[SpoolEntry]:
+        entry = self.entries.get(spool_id)
+        if entry and time.time() - entry.created > self.ttl:
+            self.discard(entry)
+            return None
+        return entry
+
+    def finalize(self, entry: SpoolEntry) -> SpoolEntry:
+        """index page boundaries once the exec has finished writing"""
+        if not entry.path.exists():
+            entry.size = 0
+            entry.offsets = [0, 0]
+            return entry
+
+        entry.size = entry.path.stat().st_size
+        entry.truncated = entry.size >= self.max_bytes
+
+        offsets = [0]
+        page_start = 0
+        page_lines = 0
+        position = 0
+
+        with open(entry.path, "rb") as f:
+            for line in f:
+                # split lines longer than a page into page sized pieces
+                while len(line) > self.page_bytes:
+                    if position > page_start:
+                        offsets.append(position)
+                        page_start = position
+                        page_lines = 0
+                    position += self.page_bytes
+                    line = line[self.page_bytes :]
+                    offsets.append(position)
+                    page_start = position
+
+                if (
+                    position + len(line) - page_start > self.page_bytes
+                    or page_lines >= self.page_lines
+                ):
+                    offsets.append(position)
+                    page_start = position
+                    page_lines = 0
+
+                position += len(line)
+                page_lines += 1
+
+        if offsets[-1] != position:
+            offsets.append(position)
+        entry.offsets = offsets
+        return entry
+
+    def read_page(self, entry: SpoolEntry, page: int) -> str:
+        page = max(0, min(page, entry.pages - 1))
+        if len(entry.offsets) < 2:
+            return ""
+
+        start, end = entry.offsets[page], entry.offsets[page + 1]
+        with open(entry.path, "rb") as f:
+            f.seek(start)
+            data = f.read(end - start)
+        return data.decode("utf-8", errors="replace").rstrip("\n")
+
+    def discard(self, entry: SpoolEntry):
+        self.entries.pop(entry.id, None)
+        entry.path.unlink(missing_ok=True)
+
+    def cleanup(self) -> int:
+        """remove expired spools"""
+        now = time.time()
+        expired = [e for e in self.entries.values() if now - e.created > self.ttl]
+        for entry in expired:
+            self.discard(entry)
+        return len(expired)
@@ -0,0 +1,210 @@
+import asyncio
+import json
+import re
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+SIZE_PATTERN = re.compile(r"([\d.]+)\s*([a-zA-Z]*)")
+SIZE_UNITS = {
+    "": 1,
+    "b": 1,
+    "kb": 1000,
+    "kib": 1024,
+    "mb": 1000**2,
+    "mib": 1024**2,
+    "gb": 1000**3,
+    "gib": 1024**3,
+    "tb": 1000**4,
+    "tib": 1024**4,
+}
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+
+@dataclass(slots=True)
+class StatsSample:
+    timestamp: float
+    cpu_percent: float
+    mem_bytes: int
+    mem_limit: int
+    net_rx: int
+    net_tx: int
+    block_read: int
+    block_write: int
+    pids: int
+
+
+def parse_size(text: str) -> int:
+    """parse docker sizes like 1.5MiB or 20kB into bytes"""
+    match = SIZE_PATTERN.match(text.strip())
+    if not match:
+        return 0
+    value, unit = match.groups()
+    return int(float(value) * SIZE_UNITS.get(unit.lower(), 1))
+
+
+def parse_pair(text: str) -> tuple:
+    left, _, right = text.partition("/")
+    return parse_size(left), parse_size(right)
+
+
+def format_size(value: float) -> str:
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if abs(value) < 1024:
+            return f"{value:.1f}{unit}" if unit != "B" else f"{int(value)}B"
+        value /= 1024
+    return f"{value:.1f}TiB"
+
+
+def sparkline(values: list, width: int = 30) -> str:
+    if not values:
+        return ""
+
+    # average into `width` buckets so an hour of samples fits one line
+    if len(values) > width:
+        step = len(values) / width
+        values = [
+            sum(chunk) / len(chunk)
+            for chunk in (
+                values[int(i * step) : max(int((i + 1) * step), int(i * step) + 1)]
+                for i in range(width)
+            )
+        ]
+
+    low, high = min(values), max(values)
+    span = high - low or 1
+    return "".join(
+        SPARK_CHARS[int((v - low) / span * (len(SPARK_CHARS) - 1))] for v in values
+    )
+
+
+class ContainerTelemetry:
+    """background subscriber to `docker stats` keeping a ring of samples
+
+    one long-lived stats stream replaces the ~2s `--no-stream` call per read.
+    samples are kept at most every `interval` seconds for `history` seconds.
+    """
+
+    def __init__(
+        self,
+        container_name: str = "hzsh_linux",
+        interval: float = 5.0,
+        history: float = 3600.0,
+    ):
+        self.container_name = container_name
+        self.interval = interval
+        self.samples = deque(maxlen=int(history / interval))
+        self._task = None
+        self._process = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._process and self._process.returncode is None:
+            self._process.kill()
+
+    def latest(self, max_age: float = 15.0) -> Optional[StatsSample]:
+        if not self.samples:
+            return None
+        sample = self.samples[-1]
+        if time.time() - sample.timestamp > max_age:
+            return None
+        return sample
+
+    def window(self, seconds: float = 3600.0) -> list:
+        cutoff = time.time() - seconds
+        return [s for s in self.samples if s.timestamp >= cutoff]
+
+    def summary(self, field: str, seconds: float = 3600.0) -> Optional[dict]:
+        """min/avg/max of a sample field over the last `seconds`"""
+        values = [getattr(s, field) for s in self.window(seconds)]
+        if not values:
+            return None
+        return {
+            "min": min(values),
+            "avg": sum(values) / len(values),
+            "max": max(values),
+            "samples": len(values),
+        }
+
+    def sparkline(self, field: str, seconds: float = 3600.0, width: int = 30) -> str:
+        return sparkline([getattr(s, field) for s in self.window(seconds)], width)
+
+    async def _run(self):
+        backoff = 1.0
+        while True:
+            started = time.monotonic()
+            try:
+                await self._stream()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+
+            if time.monotonic() - started > 60:
+                backoff = 1.0
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    async def _stream(self):
+        self._process = await asyncio.create_subprocess_exec(
+            "docker",
+            "stats",
+            self.container_name,
+            "--format",
+            "{{json .}}",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+
+        try:
+            while True:
+                line = await self._process.stdout.readline()
+                if not line:
+                    break
+                self._ingest(line.decode("utf-8", errors="replace"))
+        finally:
+            if self._process.returncode is None:
+                self._process.kill()
+                await self._process.wait()
+
+    def _ingest(self, line: str):
+        line = ANSI_ESCAPE.sub("", line).strip()
+        if not line.startswith("{"):
+            return
+
+        try:
+            raw = json.loads(line)
+        except json.JSONDecodeError:
+            return
+
+        now = time.time()
+        if self.samples and now - self.samples[-1].timestamp < self.interval:
+            return
+
+        try:
+            mem, mem_limit = parse_pair(raw.get("MemUsage", ""))
+            net_rx, net_tx = parse_pair(raw.get("NetIO", ""))
+            block_read, block_write = parse_pair(raw.get("BlockIO", ""))
+            sample = StatsSample(
+                timestamp=now,
+                cpu_percent=float(raw.get("CPUPerc", "0").rstrip("%") or 0),
+                mem_bytes=mem,
+                mem_limit=mem_limit,
+                net_rx=net_rx,
+                net_tx=net_tx,
+                block_read=block_read,
+                block_write=block_write,
+                pids=int(raw.get("PIDs", 0) or 0),
+            )
+        except ValueError:
+            return
+
+        self.samples.append(sample)
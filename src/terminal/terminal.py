@@ -1,3 +1,6 @@
+import re
+
+
 class Terminal:
 
     def __init__(self, width=80, height=24, scrollback=1000):
@@ -172,3 +175,137 @@ class Terminal:
             )
 
         return lines
+
+    def feed(self, text):
+        """process raw shell output, returns True if a bell was rung"""
+        i = 0
+        bell_triggered = False
+        while i < len(text):
+            char = text[i]
+
+            if char == "\r":
+                self.carriage_return()
+            elif char == "\n":
+                self.newline()
+            elif char == "\b":
+                self.backspace()
+            elif char == "\x1b":
+                seq_len = self._handle_escape(text[i:])
+                i += seq_len - 1
+            elif char == "\x07":
+                bell_triggered = True
+            elif char in ["\x0e", "\x0f", "\x00"]:
+                pass
+            elif ord(char) >= 32 or char == "\t":
+                if char == "\t":
+                    spaces = 8 - (self.cursor_x % 8)
+                    for _ in range(spaces):
+                        self.write_char(" ")
+                else:
+                    self.write_char(char)
+
+            i += 1
+
+        return bell_triggered
+
+    def _handle_escape(self, text):
+        """handle ANSI escape sequences"""
+        if len(text) < 2:
+            return 1
+
+        if text[1] == "[":
+            match = re.match(r"\x1b\[([0-9;?]*)([a-zA-Z@])", text)
+            if match:
+                params_str = match.group(1).replace("?", "")
+                command = match.group(2)
+                params = (
+                    [int(p) if p else 0 for p in params_str.split(";")]
+                    if params_str
+                    else []
+                )
+
+                if command == "A":
+                    n = params[0] if params else 1
+                    self.move_cursor(y=max(0, self.cursor_y - n))
+                elif command == "B":
+                    n = params[0] if params else 1
+                    self.move_cursor(y=min(self.height - 1, self.cursor_y + n))
+                elif command == "C":
+                    n = params[0] if params else 1
+                    self.move_cursor(x=min(self.width - 1, self.cursor_x + n))
+                elif command == "D":
+                    n = params[0] if params else 1
+                    self.move_cursor(x=max(0, self.cursor_x - n))
+                elif command in ["H", "f"]:
+                    row = (params[0] - 1) if params and params[0] > 0 else 0
+                    col = (params[1] - 1) if len(params) > 1 and params[1] > 0 else 0
+                    self.move_cursor(x=col, y=row)
+
+                elif command == "J":
+                    self.clear_screen(params[0] if params else 0)
+                elif command == "K":
+                    self.clear_line(params[0] if params else 0)
+
+                elif command == "S":
+                    self.scroll_up(params[0] if params else 1)
+                elif command == "T":
+                    self.scroll_down(params[0] if params else 1)
+
+                elif command == "m":
+                    if not params:
+                        params = [0]
+
+                    ansi_parts = []
+                    i = 0
+                    while i < len(params):
+                        param = params[i]
+                        if param == 0:
+                            self.current_style = ""
+                        elif param in [1, 2, 3, 4, 5, 7, 8, 9]:
+                            ansi_parts.append(str(param))
+                        elif 30 <= param <= 37 or param == 39:
+                            ansi_parts.append(str(param))
+                        elif 40 <= param <= 47 or param == 49:
+                            ansi_parts.append(str(param))
+                        elif 90 <= param <= 97 or 100 <= param <= 107:
+                            ansi_parts.append(str(param))
+                        elif param == 38:
+                            if i + 2 < len(params) and params[i + 1] == 5:
+                                ansi_parts.append(f"38;5;{params[i + 2]}")
+                                i += 2
+                            elif i + 4 < len(params) and params[i + 1] == 2:
+                                ansi_parts.append(
+                                    f"38;2;{params[i + 2]};{params[i + 3]};{params[i + 4]}"
+                                )
+                                i += 4
+                        elif param == 48:
+                            if i + 2 < len(params) and params[i + 1] == 5:
+                                ansi_parts.append(f"48;5;{params[i + 2]}")
+                                i += 2
+                            elif i + 4 < len(params) and params[i + 1] == 2:
+                                ansi_parts.append(
+                                    f"48;2;{params[i + 2]};{params[i + 3]};{params[i + 4]}"
+                                )
+                                i += 4
+                        i += 1
+
+                    self.current_style = (
+                        f"\x1b[{';'.join(ansi_parts)}m" if ansi_parts else ""
+                    )
+
+                elif command == "s":
+                    self.saved_cursor = (self.cursor_x, self.cursor_y)
+                elif command == "u":
+                    self.cursor_x, self.cursor_y = self.saved_cursor
+
+                return len(match.group(0))
+
+        elif text[1] == "]":
+            match = re.match(r"\x1b\][^\x07\x1b]*(\x07|\x1b\\)", text)
+            if match:
+                return len(match.group(0))
+
+        elif text[1] in ["7", "8", "M", "D", "E", "H", "c"]:
+            return 2
+
+        return 2
@@ -0,0 +1,167 @@
+"""moving files between discord and user homes on the host bind mount
+
+homes are writable by their container user, who can swap any file or
+directory for a symlink at any moment. so nothing here touches a home path
+by name: every component is opened relative to its parent's fd with
+O_NOFOLLOW, and files are checked with fstat on the fd that is then used.
+"""
+
+import os
+import stat
+import uuid
+from pathlib import Path
+from typing import Optional, Tuple
+
+CHUNK_SIZE = 64 * 1024
+
+_DIR_FLAGS = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW | os.O_CLOEXEC
+
+
+class TransferError(Exception):
+    pass
+
+
+def directory_size(path: Path) -> int:
+    """total size of regular files under path, without following symlinks"""
+    total = 0
+    stack = [str(path)]
+
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            total += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+    return total
+
+
+def safe_filename(name: str) -> str:
+    name = os.path.basename(name.replace("\\", "/")).strip()
+    if name in ("", ".", ".."):
+        raise TransferError("invalid file name")
+    return name
+
+
+def _parts(relative: str) -> list:
+    parts = [p for p in relative.split("/") if p not in ("", ".")]
+    if ".." in parts:
+        raise TransferError("invalid path")
+    return parts
+
+
+def open_dir(home: Path, relative: str) -> int:
+    """fd of a directory inside home, refusing a symlink at every step"""
+    fd = os.open(home, _DIR_FLAGS)
+    try:
+        for part in _parts(relative):
+            child = os.open(part, _DIR_FLAGS, dir_fd=fd)
+            os.close(fd)
+            fd = child
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
+
+
+def open_file(home: Path, relative: str) -> int:
+    """read-only fd of a regular file inside home, without following symlinks"""
+    parent, _, name = relative.rpartition("/")
+    if name in ("", ".", ".."):
+        raise TransferError("not a file")
+
+    dir_fd = open_dir(home, parent)
+    try:
+        return open_child_file(dir_fd, name)
+    finally:
+        os.close(dir_fd)
+
+
+def open_child_file(dir_fd: int, name: str) -> int:
+    """read-only fd of a regular file in an open directory, no symlinks"""
+    # O_NONBLOCK so a fifo can't hang the open, fstat rejects it below
+    fd = os.open(
+        name,
+        os.O_RDONLY | os.O_NOFOLLOW | os.O_NONBLOCK | os.O_CLOEXEC,
+        dir_fd=dir_fd,
+    )
+    if not stat.S_ISREG(os.fstat(fd).st_mode):
+        os.close(fd)
+        raise TransferError("not a regular file")
+    return fd
+
+
+def open_target(home: Path, relative: str, single: bool) -> Tuple[int, Optional[str]]:
+    """directory fd to upload into and the file name to write
+
+    a directory target keeps each attachment's own name (None), a single
+    upload may also name a new file inside an existing directory.
+    """
+    try:
+        return open_dir(home, relative), None
+    except OSError:
+        parent, _, name = relative.rpartition("/")
+        if not single or name in ("", ".", ".."):
+            raise
+        return open_dir(home, parent), name
+
+
+async def stream_to_file(
+    session,
+    url: str,
+    dir_fd: int,
+    name: str,
+    max_bytes: int,
+    owner: Optional[int] = None,
+) -> int:
+    """download url into `name` inside the directory dir_fd, aborting past max_bytes
+
+    data goes to a hidden temp file next to it first and is renamed over it
+    once complete, so a failed transfer never leaves a half written file.
+    the file is chowned to `owner` through its fd where permitted.
+    """
+    partial = f".{name}.{uuid.uuid4().hex[:8]}.part"
+    written = 0
+
+    # O_EXCL so a symlink planted at the temp name is never followed
+    fd = os.open(
+        partial,
+        os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW | os.O_CLOEXEC,
+        0o644,
+        dir_fd=dir_fd,
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if owner is not None:
+                try:
+                    os.fchown(f.fileno(), owner, owner)
+                except OSError:
+                    pass
+
+            async with session.get(url) as resp:
+                if resp.status != 200:
+                    raise TransferError(f"download failed ({resp.status})")
+
+                async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                    written += len(chunk)
+                    if written > max_bytes:
+                        raise TransferError("file too large")
+                    f.write(chunk)
+
+        # rename replaces a symlink at `name` rather than following it
+        os.replace(partial, name, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+    except BaseException:
+        try:
+            os.unlink(partial, dir_fd=dir_fd)
+        except FileNotFoundError:
+            pass
+        raise
+
+    return written
@@ -1,13 +1,125 @@
+import asyncio
+import os
+import posixpath
+import shlex
+
+import aiohttp
 import discord
 from discord.ext import commands
 
 import config
-from src.misc import has_shell_access
+from src.misc import find_role, has_shell_access
+from src.terminal.telemetry import format_size
+from src.terminal.transfer import (
+    TransferError,
+    directory_size,
+    open_file,
+    open_target,
+    safe_filename,
+    stream_to_file,
+)
+
+MB = 1024 * 1024
+
+
+class SpoolView(discord.ui.View):
+    def __init__(self, author, spool, entry):
+        super().__init__(timeout=300.0)
+        self.author = author
+        self.spool = spool
+        self.entry = entry
+        self.page = 0
+        self.message = None
+        self.update_buttons()
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.author.id:
+            await interaction.response.send_message("not your output", ephemeral=True)
+            return False
+        if self.spool.get(self.entry.id) is None:
+            await interaction.response.send_message(
+                "this output has expired", ephemeral=True
+            )
+            return False
+        return True
+
+    def render(self) -> str:
+        text = self.spool.read_page(self.entry, self.page)
+        footer = f"-# page {self.page + 1}/{self.entry.pages} | {format_size(self.entry.size)}"
+        if self.entry.truncated:
+            footer += " | output truncated"
+        return f"```ansi\n{text}\n```\n{footer}"
+
+    def update_buttons(self):
+        self.prev_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= self.entry.pages - 1
+
+    async def show(self, interaction: discord.Interaction, page: int):
+        self.page = max(0, min(page, self.entry.pages - 1))
+        self.update_buttons()
+        await interaction.response.edit_message(content=self.render(), view=self)
+
+    @discord.ui.button(label="<", style=discord.ButtonStyle.secondary)
+    async def prev_page(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ):
+        await self.show(interaction, self.page - 1)
+
+    @discord.ui.button(label=">", style=discord.ButtonStyle.secondary)
+    async def next_page(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ):
+        await self.show(interaction, self.page + 1)
+
+    @discord.ui.button(label="jump", style=discord.ButtonStyle.secondary)
+    async def jump(self, interaction: discord.Interaction, button: discord.ui.Button):
+        modal = discord.ui.Modal(title="jump to page")
+        page_input = discord.ui.TextInput(
+            label=f"page (1-{self.entry.pages})",
+            max_length=6,
+            required=True,
+        )
+        modal.add_item(page_input)
+
+        async def modal_callback(modal_interaction: discord.Interaction):
+            value = page_input.value.strip()
+            if not value.isdigit():
+                await modal_interaction.response.send_message(
+                    "page must be a number", ephemeral=True
+                )
+                return
+            await self.show(modal_interaction, int(value) - 1)
+
+        modal.on_submit = modal_callback
+        await interaction.response.send_modal(modal)
+
+    @discord.ui.button(label="download", style=discord.ButtonStyle.blurple)
+    async def download(
+        self, interaction: discord.Interaction, button: discord.ui.Button
+    ):
+        await interaction.response.send_message(
+            file=discord.File(self.entry.path, filename="output.txt"), ephemeral=True
+        )
+
+    async def on_timeout(self):
+        self.spool.discard(self.entry)
+        for item in self.children:
+            item.disabled = True
+        if self.message:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
 
 
 class hzshUtils(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.session = aiohttp.ClientSession()
+
+    async def cog_unload(self):
+        if self.session:
+            await self.session.close()
 
     @commands.command(name="sh")
     async def sh(self, ctx, *, command: str):
@@ -20,15 +132,26 @@ class hzshUtils(commands.Cog):
             await ctx.send(f"you are not connected to `{config.NAME}`.")
             return
 
+        spool = shell_cog.spool.create(str(ctx.author.id))
+
         async with ctx.typing():
             result = await shell_cog.exec_cmd(
-                ctx.author.name, str(ctx.author.id), command, ctx
+                ctx.author.name, str(ctx.author.id), command, ctx, spool=spool
             )
+            entry = await asyncio.to_thread(shell_cog.spool.finalize, spool)
 
-        if len(result) > 1900:
-            result = result[:1900] + "\n... output truncated"
+        # output that fits in one message doesnt need the pager
+        if entry.size == 0 or entry.pages == 1:
+            shell_cog.spool.discard(entry)
+
+            if len(result) > 1900:
+                result = result[:1900] + "\n... output truncated"
 
-        await ctx.send(f"```ansi\n{result}\n```")
+            await ctx.send(f"```ansi\n{result}\n```")
+            return
+
+        view = SpoolView(ctx.author, shell_cog.spool, entry)
+        view.message = await ctx.send(view.render(), view=view)
 
     @commands.command(name="cd")
     async def cd(self, ctx, *, path: str = "~"):
@@ -43,30 +166,225 @@ class hzshUtils(commands.Cog):
 
         username = ctx.author.name
         discord_id = str(ctx.author.id)
-        shell_cog.ensure_home(username, discord_id)
 
         current = shell_cog.working_dirs.get(discord_id, f"/home/{username}")
+        new_path = shell_cog.paths.normalize(username, current, path)
 
-        if path == "~":
-            new_path = f"/home/{username}"
-        elif path.startswith("/"):
-            new_path = path
-        else:
-            new_path = f"{current}/{path}"
+        resolved = shell_cog.paths.resolve(username, new_path)
+        if resolved:
+            wd, host_path = resolved
+            if not host_path.exists():
+                await ctx.send(f"```\ncd: {path}: No such file or directory\n```")
+            elif not host_path.is_dir():
+                await ctx.send(f"```\ncd: {path}: Not a directory\n```")
+            else:
+                shell_cog.set_working_dir(discord_id, wd)
+                await ctx.send(f"```\n{wd}\n```")
+            return
 
         result = await shell_cog.exec_cmd(
-            username, discord_id, f"cd '{new_path}' && pwd"
+            username, discord_id, f"cd {shlex.quote(new_path)} && pwd"
         )
 
         if (
             "no such file or directory" not in result.lower()
             and "not a directory" not in result.lower()
         ):
-            shell_cog.working_dirs[discord_id] = result.strip()
+            shell_cog.set_working_dir(discord_id, result.strip())
             await ctx.send(f"```\n{shell_cog.working_dirs[discord_id]}\n```")
         else:
             await ctx.send(f"```\n{result}\n```")
 
+    @commands.command(name="ls", aliases=["dir"])
+    async def ls(self, ctx, *args):
+        shell_cog = self.bot.get_cog("Shell")
+        if not shell_cog:
+            await ctx.send("shell system unavailable")
+            return
+
+        if not has_shell_access(ctx.author):
+            await ctx.send(f"you are not connected to `{config.NAME}`.")
+            return
+
+        show_hidden = any(a in ["-a", "--all"] for a in args)
+        paths = [a for a in args if not a.startswith("-")]
+        path = paths[0] if paths else "."
+
+        username = ctx.author.name
+        discord_id = str(ctx.author.id)
+
+        current = shell_cog.working_dirs.get(discord_id, f"/home/{username}")
+        target = shell_cog.paths.normalize(username, current, path)
+
+        resolved = shell_cog.paths.resolve(username, target)
+        if resolved:
+            _, host_path = resolved
+            if not host_path.exists():
+                result = f"ls: cannot access '{path}': No such file or directory"
+            elif not host_path.is_dir():
+                result = path
+            else:
+                try:
+                    entries = shell_cog.paths.list_dir(host_path, show_hidden)
+                    result = "\n".join(entries) if entries else "(empty)"
+                except OSError as e:
+                    result = f"ls: cannot open directory '{path}': {e.strerror}"
+        else:
+            flags = "-pA" if show_hidden else "-p"
+            result = await shell_cog.exec_cmd(
+                username, discord_id, f"ls {flags} {shlex.quote(target)}"
+            )
+
+        if len(result) > 1900:
+            result = result[:1900] + "\n... output truncated"
+
+        await ctx.send(f"```\n{result}\n```")
+
+    @commands.command(name="put", aliases=["upload"])
+    async def put(self, ctx, *, path: str = "."):
+        shell_cog = self.bot.get_cog("Shell")
+        if not shell_cog:
+            await ctx.send("shell system unavailable")
+            return
+
+        if not has_shell_access(ctx.author):
+            await ctx.send(f"you are not connected to `{config.NAME}`.")
+            return
+
+        attachments = ctx.message.attachments
+        if not attachments:
+            await ctx.send("put: attach the file(s) to upload")
+            return
+
+        username = ctx.author.name
+        discord_id = str(ctx.author.id)
+        docker = shell_cog.docker
+
+        await docker.ensure_user_exists(username, discord_id, shell_cog.home_dir)
+
+        current = shell_cog.working_dirs.get(discord_id, f"/home/{username}")
+        target = shell_cog.paths.normalize(username, current, path)
+
+        resolved = shell_cog.paths.resolve(username, target)
+        if not resolved:
+            await ctx.send("```\nput: can only write inside your home directory\n```")
+            return
+
+        # uploads go through a directory fd opened without following symlinks,
+        # the user can change their home while the upload runs
+        home = shell_cog.home_dir / username
+        relative = posixpath.relpath(target, shell_cog.paths.user_home(username))
+        try:
+            dir_fd, dest_name = open_target(home, relative, len(attachments) == 1)
+        except (TransferError, OSError):
+            await ctx.send(f"```\nput: {path}: No such directory\n```")
+            return
+        container_path = posixpath.dirname(target) if dest_name else target
+
+        max_file = docker.limits.max_file_size_mb * MB
+        used = await asyncio.to_thread(directory_size, home)
+        budget = docker.limits.max_disk_mb * MB - used
+        uid = docker.get_uid(discord_id)
+
+        results = []
+        try:
+            async with ctx.typing():
+                for attachment in attachments:
+                    try:
+                        name = safe_filename(attachment.filename)
+                    except TransferError as e:
+                        results.append(f"put: {attachment.filename}: {e}")
+                        continue
+
+                    dest = dest_name or name
+                    dest_path = posixpath.join(container_path, dest)
+
+                    if attachment.size > max_file:
+                        results.append(
+                            f"put: {name}: file too large (max {docker.limits.max_file_size_mb}mb)"
+                        )
+                        continue
+                    if attachment.size > budget:
+                        results.append(f"put: {name}: disk quota exceeded")
+                        continue
+
+                    try:
+                        written = await stream_to_file(
+                            self.session,
+                            attachment.url,
+                            dir_fd,
+                            dest,
+                            min(max_file, budget),
+                            owner=uid,
+                        )
+                        written_stat = os.stat(dest, dir_fd=dir_fd, follow_symlinks=False)
+                    except (TransferError, aiohttp.ClientError, OSError) as e:
+                        results.append(f"put: {name}: {e}")
+                        continue
+
+                    budget -= written
+
+                    if written_stat.st_uid != uid:
+                        # not running as root, let the container fix ownership
+                        await docker.exec_command(
+                            f"chown -h {uid}:{uid} {shlex.quote(dest_path)}",
+                            check_limits=False,
+                        )
+
+                    results.append(f"{dest_path} ({format_size(written)})")
+        finally:
+            os.close(dir_fd)
+
+        output = "\n".join(results)
+        await ctx.send(f"```\n{output}\n```")
+
+    @commands.command(name="get", aliases=["download"])
+    async def get(self, ctx, *, path: str):
+        shell_cog = self.bot.get_cog("Shell")
+        if not shell_cog:
+            await ctx.send("shell system unavailable")
+            return
+
+        if not has_shell_access(ctx.author):
+            await ctx.send(f"you are not connected to `{config.NAME}`.")
+            return
+
+        username = ctx.author.name
+        discord_id = str(ctx.author.id)
+
+        current = shell_cog.working_dirs.get(discord_id, f"/home/{username}")
+        target = shell_cog.paths.normalize(username, current, path)
+
+        resolved = shell_cog.paths.resolve(username, target)
+        if not resolved:
+            await ctx.send("```\nget: can only read files inside your home directory\n```")
+            return
+
+        # opened once without following symlinks, and that same fd is what
+        # gets checked and uploaded, so the file can't be swapped in between
+        relative = posixpath.relpath(target, shell_cog.paths.user_home(username))
+        try:
+            fd = open_file(shell_cog.home_dir / username, relative)
+        except (TransferError, OSError):
+            await ctx.send(f"```\nget: {path}: No such file\n```")
+            return
+
+        f = os.fdopen(fd, "rb")
+        size = os.fstat(fd).st_size
+        limit = shell_cog.docker.limits.max_file_size_mb * MB
+        if ctx.guild:
+            limit = min(limit, ctx.guild.filesize_limit)
+
+        if size > limit:
+            f.close()
+            await ctx.send(
+                f"```\nget: {path}: file too large ({format_size(size)} > {format_size(limit)})\n```"
+            )
+            return
+
+        # discord.File reads the upload from the handle in chunks and closes it
+        await ctx.send(file=discord.File(f, filename=posixpath.basename(target)))
+
     @commands.command()
     async def pwd(self, ctx):
         shell_cog = self.bot.get_cog("Shell")
@@ -74,8 +392,7 @@ class hzshUtils(commands.Cog):
             await ctx.send("shell system unavailable")
             return
 
-        shell_role = discord.utils.get(ctx.guild.roles, name=config.SHELL_ACCESS_ROLE)
-        if not shell_role or shell_role not in ctx.author.roles:
+        if not has_shell_access(ctx.author):
             await ctx.send(f"you are not connected to `{config.NAME}`.")
             return
 
@@ -92,7 +409,7 @@ class hzshUtils(commands.Cog):
             await ctx.send("shell system unavailable")
             return
 
-        shell_role = discord.utils.get(ctx.guild.roles, name=config.SHELL_ACCESS_ROLE)
+        shell_role = find_role(ctx.guild, config.SHELL_ACCESS_ROLE)
         if not shell_role:
             await ctx.send("no users connected")
             return
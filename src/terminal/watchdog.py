@@ -0,0 +1,135 @@
+import asyncio
+import json
+import sys
+import time
+
+from discord.ext import commands, tasks
+
+import config
+from src.misc import CogHelper, get_data_manager
+from src.terminal import get_docker_service
+from src.terminal.telemetry import format_size
+
+
+class Watchdog(CogHelper, commands.Cog):
+    """keeps an eye on the container and drives the docker circuit breaker"""
+
+    def __init__(self, bot):
+        super().__init__(bot)
+        self.docker = get_docker_service()
+        self.dm = get_data_manager()
+        self.down_since = None
+        self.last_restart = 0.0
+        self.restart_interval = 120
+        self.check_container.start()
+        self.docker.telemetry.start()
+        if self.docker.pool:
+            self.reap_containers.start()
+        if config.HZSH_BACKUP_HOURS > 0:
+            self.backup_homes.change_interval(hours=config.HZSH_BACKUP_HOURS)
+            self.backup_homes.start()
+
+    def cog_unload(self):
+        self.check_container.cancel()
+        self.reap_containers.cancel()
+        self.backup_homes.cancel()
+        self.docker.telemetry.stop()
+
+    async def report(self, message, level="INFO"):
+        logging_cog = self.bot.get_cog("Logger")
+        if logging_cog:
+            await logging_cog.log_to_channel(message, level)
+
+    @tasks.loop(seconds=15)
+    async def check_container(self):
+        healthy = await self.docker.check_health()
+        state = self.docker.breaker.state
+
+        if healthy:
+            if self.down_since is not None:
+                downtime = int(time.monotonic() - self.down_since)
+                self.log_info(f"container {self.docker.container_name} is back up")
+                await self.report(
+                    f"container {self.docker.container_name} recovered after {downtime}s",
+                    "HEALTH",
+                )
+            self.down_since = None
+        elif state == self.docker.breaker.OPEN and self.down_since is None:
+            self.down_since = time.monotonic()
+            self.log_warning(f"container {self.docker.container_name} is down")
+            await self.report(
+                f"container {self.docker.container_name} is down, circuit open",
+                "HEALTH",
+            )
+
+        if (
+            not healthy
+            and config.HZSH_AUTO_RESTART
+            and state == self.docker.breaker.OPEN
+            and time.monotonic() - self.last_restart > self.restart_interval
+        ):
+            self.last_restart = time.monotonic()
+            started = await self.docker.start_container()
+            await self.report(
+                f"auto-restart of {self.docker.container_name} "
+                + ("succeeded" if started else "failed"),
+                "HEALTH",
+            )
+
+    @check_container.before_loop
+    async def before_check_container(self):
+        await self.bot.wait_until_ready()
+
+    @tasks.loop(seconds=60)
+    async def reap_containers(self):
+        shell_cog = self.bot.get_cog("Shell")
+        busy = set(shell_cog.sessions) if shell_cog else set()
+
+        paused, removed = await self.docker.reap_containers(busy)
+        if paused or removed:
+            self.log_info(f"paused {paused} and removed {removed} idle user containers")
+
+    @reap_containers.before_loop
+    async def before_reap_containers(self):
+        await self.bot.wait_until_ready()
+
+    @tasks.loop(hours=6)
+    async def backup_homes(self):
+        # the backup runs in its own low priority process, off the event loop
+        process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-m",
+            "src.terminal.backup",
+            "snapshot",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await process.communicate()
+
+        if process.returncode != 0:
+            self.log_error(f"home backup failed: {stderr.decode(errors='replace')[-500:]}")
+            await self.report("home backup failed, see logs/backup.log", "ERROR")
+            return
+
+        self.dm.save("backup_state", {"last": time.time()})
+
+        if stdout.strip():
+            totals = json.loads(stdout)
+            self.log_info(
+                f"backed up {totals['homes']} homes, {totals['reused']}/{totals['files']} "
+                f"files unchanged, {format_size(totals['new_bytes'])} new"
+            )
+
+    @backup_homes.before_loop
+    async def before_backup_homes(self):
+        await self.bot.wait_until_ready()
+
+        # a restart shouldn't trigger a backup, wait out the rest of the interval
+        last = self.dm.load("backup_state", {}).get("last", 0)
+        remaining = last + config.HZSH_BACKUP_HOURS * 3600 - time.time()
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+
+
+async def setup(bot):
+    await bot.add_cog(Watchdog(bot))